@@ -0,0 +1,175 @@
+"""
+Compare the sync views behind WSGI workers with the async views under ASGI
+while every database query is delayed by a simulated network round trip.
+
+    python -m benchmarks.async_views --latency 20 --concurrency 50
+
+The sync stack serves at most --workers requests at a time (the Procfile's
+two sync gunicorn workers), so throughput is capped by how long each
+request waits on the database. The ASGI stack runs each request's queries
+in a thread of its own and keeps serving others meanwhile.
+"""
+import argparse
+import asyncio
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks.utils import print_table, test_database
+
+from django.contrib import admin
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from django.urls import path
+
+from blog import async_views, views
+from blog.models import Author, Post
+from blog.urls import blog_urlpatterns
+
+
+def seed(total):
+    author = Author.objects.create(first_name='Bench', last_name='Mark', email_address='bench@example.com')
+    Post.objects.bulk_create([
+        Post(
+            title=f'Post {i}',
+            excerpt=f'Excerpt {i}',
+            slug=f'post-{i}',
+            content=f'Content for post {i}',
+            content_html=f'<p>Content for post {i}</p>',
+            author=author,
+            image=f'posts/post-{i}.jpg',
+        )
+        for i in range(total)
+    ])
+
+
+def urlconf(blog_views):
+    module = types.ModuleType(f'benchmark_urls_{blog_views.__name__}')
+    module.urlpatterns = [path('admin/', admin.site.urls), *blog_urlpatterns(blog_views)]
+    return module
+
+
+def add_latency(seconds):
+    """Delay every query on every connection, current and future, by ``seconds``."""
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    for connection in connections.all():
+        install(connection)
+    connection_created.connect(install, weak=False)
+
+
+def wsgi_get(application, url):
+    environ = {'PATH_INFO': url, 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    statuses = []
+    response = application(environ, lambda status, headers: statuses.append(status))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+async def asgi_get(application, url):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': url,
+        'raw_path': url.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+    requested = False
+    statuses = []
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Django listens for a disconnect until the response is sent.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await application(scope, receive, send)
+    return statuses[0]
+
+
+def run_wsgi(urls, workers):
+    application = get_wsgi_application()
+    with ThreadPoolExecutor(workers) as pool:
+        start = time.perf_counter()
+        statuses = list(pool.map(lambda url: wsgi_get(application, url), urls))
+    return statuses, time.perf_counter() - start
+
+
+def run_asgi(urls, concurrency):
+    application = get_asgi_application()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def get(url):
+        async with limit:
+            return await asgi_get(application, url)
+
+    async def run():
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(get(url) for url in urls))
+        return statuses, time.perf_counter() - start
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=20, help='Simulated round trip per query, in ms.')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once.')
+    parser.add_argument('--workers', type=int, default=2, help='Sync workers serving the WSGI stack.')
+    args = parser.parse_args()
+
+    with test_database():
+        seed(20)
+        add_latency(args.latency / 1000)
+        paths = ['/', '/posts/', '/posts/post-1', '/posts/post-2', '/read-later']
+        urls = list(islice(cycle(paths), args.requests))
+
+        stacks = [
+            (f'sync views, {args.workers} WSGI workers', views, lambda: run_wsgi(urls, args.workers)),
+            (f'async views, ASGI, {args.concurrency} in flight', async_views, lambda: run_asgi(urls, args.concurrency)),
+        ]
+        rows = []
+        for name, blog_views, run in stacks:
+            with override_settings(
+                ROOT_URLCONF=urlconf(blog_views), ALLOWED_HOSTS=['*'], DEBUG=False,
+                BLOG_PAGE_CACHE=False, BLOG_READ_REPLICA='',
+            ):
+                statuses, seconds = run()
+            assert set(statuses) == {200}, sorted(set(statuses))
+            rows.append((name, f'{seconds:.2f}', f'{len(urls) / seconds:.1f}'))
+
+    print(f'{len(urls)} GETs of {", ".join(paths)} with {args.latency:g} ms per query')
+    print_table(('stack', 'seconds', 'req/s'), rows)
+
+
+if __name__ == '__main__':
+    main()
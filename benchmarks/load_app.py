@@ -0,0 +1,61 @@
+"""
+The site's WSGI and ASGI applications, wrapped to report how many database
+queries each request ran in an ``X-Queries`` response header. Served by the
+gunicorn workers that benchmarks/load_test.py starts.
+"""
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+
+from my_site.asgi import application as asgi_application
+from my_site.wsgi import application as wsgi_application
+
+# A one-item list per request, shared with the threads the ASGI handler runs
+# the request's queries in.
+_queries = ContextVar('load_test_queries', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+connection_created.connect(install_counter)
+
+
+def wsgi(environ, start_response):
+    counter = [0]
+    token = _queries.set(counter)
+
+    def start_response_with_count(status, headers, exc_info=None):
+        return start_response(status, [*headers, ('X-Queries', str(counter[0]))], exc_info)
+
+    try:
+        return wsgi_application(environ, start_response_with_count)
+    finally:
+        _queries.reset(token)
+
+
+async def asgi(scope, receive, send):
+    if scope['type'] != 'http':
+        return await asgi_application(scope, receive, send)
+
+    counter = [0]
+    token = _queries.set(counter)
+
+    async def send_with_count(message):
+        if message['type'] == 'http.response.start':
+            message = {**message, 'headers': [*message['headers'], (b'x-queries', str(counter[0]).encode())]}
+        await send(message)
+
+    try:
+        await asgi_application(scope, receive, send_with_count)
+    finally:
+        _queries.reset(token)
@@ -0,0 +1,341 @@
+"""
+Load-test every blog route over HTTP and compare with a stored baseline.
+
+    python -m benchmarks.load_test --duration 20 --concurrency 16
+    python -m benchmarks.load_test --asgi
+    python -m benchmarks.load_test --save-baseline
+
+Seeds a throw-away test database with generate_scale_data, starts gunicorn
+on it through gunicorn.conf.py (sync workers, or the uvicorn worker and the
+async views with --asgi) and drives it with a mix of page views, comment
+posts and read-later toggles from --concurrency clients. Reports requests
+per second, p50/p95/p99 latency and queries per request for every route,
+and the resident memory of each worker afterwards.
+
+Results are compared with benchmarks/baselines/load_test.json: a route
+regresses when its throughput drops or its p95 rises by more than
+--tolerance, or when it runs more queries than it used to. The script then
+exits with status 1. Timings depend on the machine the baseline was saved
+on; queries per request do not.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+from pathlib import Path
+from urllib.parse import urlencode
+
+from benchmarks.utils import print_table, test_database
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+
+from blog.models import Post
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).resolve().parent / 'baselines' / 'load_test.json'
+
+# (route, weight) of the traffic mix.
+MIX = (
+    ('starting_page', 20),
+    ('posts_page', 20),
+    ('post_detail_page', 35),
+    ('read_later_page', 10),
+    ('read_later_toggle', 5),
+    ('comment', 10),
+)
+
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class Client:
+    """One visitor: a keep-alive connection and a cookie jar."""
+
+    def __init__(self, port, posts, rng):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        self.cookies = {}
+        self.posts = posts
+        self.rng = rng
+        self.csrf_token = None
+
+    def request(self, method, url, fields=None):
+        headers = {'Host': '127.0.0.1'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        body = None
+        if fields is not None:
+            body = urlencode(fields)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.connection.request(method, url, body, headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        if response.getheader('Connection', '').lower() == 'close':
+            self.connection.close()
+        return response.status, int(response.getheader('X-Queries', 0)), content
+
+    def token(self):
+        if self.csrf_token is None:
+            _, _, content = self.request('GET', '/read-later/state')
+            self.csrf_token = json.loads(content)['csrf_token']
+        return self.csrf_token
+
+    def visit(self, route):
+        post_id, slug = self.rng.choice(self.posts)
+        if route == 'starting_page':
+            return self.request('GET', '/')
+        if route == 'posts_page':
+            return self.request('GET', f'/posts/?page={self.rng.randint(1, 5)}')
+        if route == 'post_detail_page':
+            status, queries, content = self.request('GET', f'/posts/{slug}')
+            match = CSRF_INPUT_RE.search(content.decode())
+            if match:
+                self.csrf_token = match.group(1)
+            return status, queries, content
+        if route == 'read_later_page':
+            return self.request('GET', '/read-later')
+        if route == 'read_later_toggle':
+            return self.request('POST', '/read-later', {'csrfmiddlewaretoken': self.token(), 'post_id': post_id})
+        return self.request('POST', f'/posts/{slug}', {
+            'csrfmiddlewaretoken': self.token(),
+            'user_name': 'Load Test',
+            'user_mail': 'load@example.com',
+            'text': 'A comment written by the load test.',
+        })
+
+
+class Results:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {route: [] for route, _ in MIX}
+        self.queries = {route: [] for route, _ in MIX}
+        self.errors = {route: 0 for route, _ in MIX}
+
+    def add(self, route, seconds, status, queries):
+        with self.lock:
+            if status >= 400:
+                self.errors[route] += 1
+            else:
+                self.latencies[route].append(seconds * 1000)
+                self.queries[route].append(queries)
+
+
+def drive(port, posts, seconds, concurrency, seed, results=None):
+    """Run the traffic mix for ``seconds`` from ``concurrency`` client threads."""
+    routes, weights = zip(*MIX)
+    deadline = time.monotonic() + seconds
+
+    def run_client(number):
+        rng = random.Random(f'{seed}-{number}')
+        client = Client(port, posts, rng)
+        while time.monotonic() < deadline:
+            route = rng.choices(routes, weights)[0]
+            start = time.perf_counter()
+            try:
+                status, queries, _ = client.visit(route)
+            except (OSError, http.client.HTTPException):
+                status, queries = 599, 0
+            if results is not None:
+                results.add(route, time.perf_counter() - start, status, queries)
+
+    threads = [threading.Thread(target=run_client, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def percentile(samples, percent):
+    return statistics.quantiles(samples, n=100, method='inclusive')[percent - 1] if len(samples) > 1 else sum(samples)
+
+
+def summarize(results, seconds):
+    summary = {}
+    for route, _ in MIX:
+        latencies = results.latencies[route]
+        summary[route] = {
+            'requests': len(latencies),
+            'errors': results.errors[route],
+            'rps': round(len(latencies) / seconds, 1),
+            'p50': round(percentile(latencies, 50), 1),
+            'p95': round(percentile(latencies, 95), 1),
+            'p99': round(percentile(latencies, 99), 1),
+            'queries': round(statistics.mean(results.queries[route]), 1) if latencies else 0,
+        }
+    return summary
+
+
+def worker_memory(master_pid):
+    """Resident memory in MB of each gunicorn worker, read from /proc."""
+    memory = []
+    for stat in Path('/proc').glob('[0-9]*/stat'):
+        try:
+            fields = stat.read_text().rsplit(')', 1)[1].split()
+            if int(fields[1]) != master_pid:
+                continue
+            status = (stat.parent / 'status').read_text()
+        except (OSError, IndexError):
+            continue
+        rss_kb = int(re.search(r'VmRSS:\s+(\d+)', status).group(1))
+        memory.append(round(rss_kb / 1024, 1))
+    return sorted(memory)
+
+
+def start_server(args, port):
+    database = connection.settings_dict
+    env = {
+        **os.environ,
+        'DATABASE_ENGINE': database['ENGINE'],
+        'DATABASE_NAME': str(database['NAME']),
+        'DATABASE_USER': database['USER'] or '',
+        'DATABASE_PASSWORD': database['PASSWORD'] or '',
+        'DATABASE_HOST': database['HOST'] or '',
+        'DATABASE_PORT': str(database['PORT'] or ''),
+        'IS_DEVELOPMENT': '',  # DEBUG off, as in production.
+        'APP_HOST': '127.0.0.1',
+        'PORT': str(port),
+        'WEB_CONCURRENCY': str(args.workers),
+        'GUNICORN_WORKER_CLASS': 'uvicorn_worker.UvicornWorker' if args.asgi else args.worker_class,
+        'GUNICORN_MAX_REQUESTS': '0',
+        'BLOG_ASYNC_VIEWS': str(args.asgi),
+        'DATABASE_STATS_SECONDS': '0',
+    }
+    env.setdefault('SECRET_KEY', 'load-test')
+    app = 'benchmarks.load_app:asgi' if args.asgi else 'benchmarks.load_app:wsgi'
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--log-level', 'warning', app],
+        cwd=BASE_DIR, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            probe = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            probe.request('GET', '/', headers={'Host': '127.0.0.1'})
+            if probe.getresponse().status == 200:
+                return server
+        except OSError:
+            pass
+        if server.poll() is not None:
+            raise SystemExit('gunicorn exited during startup.')
+        time.sleep(0.2)
+    server.terminate()
+    raise SystemExit('gunicorn did not answer within 30s.')
+
+
+def compare(summary, baseline, tolerance):
+    """Table rows comparing ``summary`` with ``baseline``, and whether anything regressed."""
+    rows, regressed = [], False
+    for route, result in summary.items():
+        before = baseline.get(route)
+        if not before:
+            rows.append((route, f"{result['rps']}", '', f"{result['p95']}", '', f"{result['queries']}", '', 'new'))
+            continue
+        problems = []
+        if result['rps'] < before['rps'] * (1 - tolerance):
+            problems.append('throughput')
+        if result['p95'] > before['p95'] * (1 + tolerance):
+            problems.append('p95')
+        # Averages, which a cache miss or a comment page boundary can move a little.
+        if result['queries'] > before['queries'] + 0.5:
+            problems.append('queries')
+        regressed = regressed or bool(problems)
+        rows.append((
+            route, result['rps'], before['rps'], result['p95'], before['p95'],
+            result['queries'], before['queries'], ', '.join(problems) or 'ok',
+        ))
+    return rows, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--asgi', action='store_true', help='Serve the async views with the uvicorn worker.')
+    parser.add_argument('--worker-class', default='sync', help='Gunicorn worker class without --asgi, e.g. gthread.')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=16, help='Clients sending requests at once.')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds of measured traffic.')
+    parser.add_argument('--warmup', type=float, default=3, help='Seconds of unmeasured traffic first.')
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--comments', type=int, default=50_000)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', type=Path, default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative throughput/p95 change.')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline.')
+    args = parser.parse_args()
+    stack = 'asgi' if args.asgi else args.worker_class
+    run_options = {name: getattr(args, name) for name in ('workers', 'concurrency', 'duration', 'posts', 'comments')}
+
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite':
+            # The server runs in other processes, so the database needs a file.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'load_test.sqlite3')
+        with test_database(), override_settings(MEDIA_ROOT=directory):
+            call_command(
+                'generate_scale_data', posts=args.posts, comments=args.comments,
+                authors=20, tags=30, images=5, seed=args.seed, verbosity=0, stdout=open(os.devnull, 'w'),
+            )
+            posts = list(Post.objects.values_list('pk', 'slug'))
+            connection.close()
+
+            server = start_server(args, args.port)
+            try:
+                drive(args.port, posts, args.warmup, args.concurrency, args.seed)
+                results = Results()
+                drive(args.port, posts, args.duration, args.concurrency, args.seed, results)
+                memory = worker_memory(server.pid)
+            finally:
+                server.terminate()
+                server.wait()
+
+    summary = summarize(results, args.duration)
+    total = sum(result['requests'] for result in summary.values())
+    print(f'{stack}: {args.workers} workers, {args.concurrency} clients, {args.duration:g}s, '
+          f'{args.posts} posts, {args.comments} comments')
+    print_table(
+        ('route', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'),
+        [(route, *result.values()) for route, result in summary.items()],
+    )
+    print(f'total {total / args.duration:.1f} req/s; worker RSS MB: {", ".join(map(str, memory)) or "n/a"}')
+
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.save_baseline:
+        baselines[stack] = {'options': run_options, 'routes': summary, 'worker_rss_mb': memory}
+        args.baseline.parent.mkdir(exist_ok=True)
+        args.baseline.write_text(json.dumps(baselines, indent=2) + '\n')
+        print(f'Saved the {stack} baseline to {args.baseline}.')
+        return
+    if stack not in baselines:
+        print(f'No {stack} baseline in {args.baseline}; store one with --save-baseline.')
+        return
+
+    if baselines[stack]['options'] != run_options:
+        print(f"The baseline was saved with {baselines[stack]['options']}; timings may not be comparable.")
+    rows, regressed = compare(summary, baselines[stack]['routes'], args.tolerance)
+    print(f'\nCompared with {args.baseline.name} (tolerance {args.tolerance:.0%}):')
+    print_table(('route', 'req/s', 'was', 'p95 ms', 'was', 'queries', 'was', 'result'), rows)
+    if any(result['errors'] for result in summary.values()):
+        print('Some requests failed.')
+        regressed = True
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
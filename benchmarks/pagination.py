@@ -0,0 +1,80 @@
+"""
+Compare OFFSET and keyset pagination of the post listing at increasing depth.
+
+    python -m benchmarks.pagination --posts 100000
+
+OFFSET pages get slower the deeper they are (and pay for a COUNT every
+time); keyset pages should stay flat.
+"""
+import argparse
+import datetime
+
+from benchmarks.utils import print_table, test_database, timed
+
+from django.core.paginator import Paginator
+
+from blog.models import Author, Post
+from blog.pagination import KeysetPaginator
+
+
+def seed(total, batch_size=5000):
+    author = Author.objects.create(first_name='Bench', last_name='Mark', email_address='bench@example.com')
+    today = datetime.date.today()
+    for start in range(0, total, batch_size):
+        posts = Post.objects.bulk_create([
+            Post(
+                title=f'Post {i}',
+                excerpt=f'Excerpt {i}',
+                slug=f'post-{i}',
+                content=f'Content for post {i}',
+                author=author,
+                image=f'posts/post-{i}.jpg',
+            )
+            for i in range(start, min(start + batch_size, total))
+        ])
+        # Spread posts over the days so the date ordering is meaningful.
+        day = today - datetime.timedelta(days=start // batch_size)
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(date=day)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with test_database():
+        seed(args.posts)
+        queryset = Post.objects.for_listing()
+        keyset = KeysetPaginator(queryset, args.per_page)
+        last_page = args.posts // args.per_page
+
+        rows = []
+        page_number = 1
+        while page_number <= last_page:
+            def offset_page():
+                page = Paginator(queryset, args.per_page).page(page_number)
+                list(page.object_list)
+
+            cursor = None
+            if page_number > 1:
+                anchor = queryset[(page_number - 1) * args.per_page - 1]
+                cursor = keyset.encode_cursor(anchor)
+
+            def keyset_page():
+                list(keyset.page(cursor))
+
+            rows.append((
+                page_number,
+                f'{timed(offset_page, args.repeat):.2f}',
+                f'{timed(keyset_page, args.repeat):.2f}',
+            ))
+            page_number *= 10
+
+        print(f'{args.posts} posts, {args.per_page} per page, median ms over {args.repeat} runs')
+        print_table(('page', 'offset_ms', 'keyset_ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
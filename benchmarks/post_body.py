@@ -0,0 +1,57 @@
+"""
+Compare rendering a post body per request with the stored content_html.
+
+    python -m benchmarks.post_body --size 50000
+
+No database is needed: both variants render the same unsaved post through
+the template engine, as post-detail.html does.
+"""
+import argparse
+import random
+
+from benchmarks.utils import print_table, timed
+
+from django.template import Context, Template
+
+from blog.models import Post
+from blog.rendering import render_content
+
+PER_REQUEST = Template('{{ post.content|linebreaks }}')
+STORED = Template('{{ post.content_html|safe }}')
+
+
+def make_content(size):
+    words = ['mountain', 'forest', 'river', 'code', 'python', 'django', 'walk', '<b>bold</b>', '&', 'dawn']
+    rng = random.Random(0)
+    paragraphs, length = [], 0
+    while length < size:
+        lines = [' '.join(rng.choice(words) for _ in range(rng.randint(8, 20))) for _ in range(rng.randint(1, 4))]
+        paragraph = '\n'.join(lines)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return '\n\n'.join(paragraphs)[:size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=50000, help='Body size in characters.')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    post = Post(content=make_content(args.size))
+    post.content_html = render_content(post.content)
+    context = Context({'post': post})
+    assert PER_REQUEST.render(context) == STORED.render(context)
+
+    per_request = timed(lambda: PER_REQUEST.render(context), args.repeat)
+    stored = timed(lambda: STORED.render(context), args.repeat)
+
+    print(f'{len(post.content)} character body, median ms over {args.repeat} renders')
+    print_table(('variant', 'ms', 'speedup'), [
+        ('content|linebreaks', f'{per_request:.3f}', '1.0x'),
+        ('content_html', f'{stored:.3f}', f'{per_request / stored:.1f}x'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -3,16 +3,45 @@ from .models import Author, Post, Tag, Comment
 
 # Register your models here.
 
+class CommentCountFilter(admin.SimpleListFilter):
+    title = 'comments'
+    parameter_name = 'comments'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('none', 'No comments'),
+            ('some', '1 to 10'),
+            ('many', 'More than 10'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'none':
+            return queryset.filter(comment_count=0)
+        if self.value() == 'some':
+            return queryset.filter(comment_count__range=(1, 10))
+        if self.value() == 'many':
+            return queryset.filter(comment_count__gt=10)
+        return queryset
+
+
 class PostAdmin(admin.ModelAdmin):
-    list_display = ('title', 'date', 'author',)
-    list_filter = ('date', 'author', 'tags',)
+    list_display = ('title', 'date', 'author', 'comment_count',)
+    list_filter = ('date', 'author', 'tags', CommentCountFilter,)
+    list_select_related = ('author',)
+    # The order of blog_post_date_id_idx, so pages are read off the index.
+    ordering = ('-date', '-id')
     prepopulated_fields = {'slug': ('title',)}
 
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('caption', 'post_count',)
+    ordering = ('-post_count',)
+
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('user_name', 'post')
+    list_select_related = ('post',)
     
 
 admin.site.register(Author)
 admin.site.register(Post, PostAdmin)
-admin.site.register(Tag)
+admin.site.register(Tag, TagAdmin)
 admin.site.register(Comment, CommentAdmin)
\ No newline at end of file
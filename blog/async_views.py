@@ -0,0 +1,161 @@
+"""
+Async versions of the listing, post and read-later views.
+
+They are routed instead of the views in blog/views.py when
+BLOG_ASYNC_VIEWS is set, which only pays off under an ASGI server (see
+my_site/asgi.py): there a request waiting on the database no longer holds
+a worker, so one process serves many slow queries at once. The views read
+through the async ORM and session API; the remaining views have no slow
+path worth converting and are shared with the sync stack.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage, Paginator
+from django.http import Http404, HttpResponseRedirect
+from django.shortcuts import aget_object_or_404, render
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from .cache import CachedPageMixin
+from .conditional import alisting_etag, alisting_last_modified, apost_detail_etag, aread_later_etag
+from .decorators import async_condition, async_method_decorator, csrf_protect_public_form
+from .forms import CommentForm
+from .models import Post
+from .pagination import CommentPage, KeysetPaginator
+from .views import PostCommentsView, ReadLaterStateView, SearchView, page_urls  # noqa: F401
+
+listing_condition = async_condition(etag_func=alisting_etag, last_modified_func=alisting_last_modified)
+
+
+async def is_post_saved(request, post_id):
+    return post_id in (await request.session.aget('stored_posts') or [])
+
+
+@async_method_decorator(listing_condition, 'get')
+class StartingPageView(CachedPageMixin, View):
+
+    async def get(self, request):
+        posts = [post async for post in Post.objects.for_listing()[:3]]
+        return render(request, 'blog/index.html', {'posts': posts})
+
+
+@async_method_decorator(listing_condition, 'get')
+class PostsView(CachedPageMixin, View):
+    paginate_by = 10
+    cache_query_params = ('page', 'cursor')
+
+    async def paginate(self, queryset):
+        if settings.BLOG_KEYSET_PAGINATION:
+            paginator = KeysetPaginator(queryset, self.paginate_by)
+            return paginator, await paginator.apage(self.request.GET.get('cursor'))
+
+        paginator = Paginator(queryset, self.paginate_by)
+        # Paginator.count would run a blocking COUNT query.
+        paginator.count = await queryset.acount()
+        number = self.request.GET.get('page') or 1
+        if number == 'last':
+            number = paginator.num_pages
+        try:
+            page = paginator.page(number)
+        except InvalidPage:
+            raise Http404('Invalid page')
+        page.object_list = [post async for post in page.object_list]
+        return paginator, page
+
+    async def get(self, request):
+        paginator, page = await self.paginate(Post.objects.for_listing())
+        context = {
+            'posts': page.object_list,
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+            **page_urls(page),
+        }
+        return render(request, 'blog/all-posts.html', context)
+
+
+# The CSRF check is made by csrf_protect_public_form on the async handler;
+# exempting dispatch is what tells CsrfViewMiddleware to leave it alone.
+@method_decorator(csrf_exempt, name='dispatch')
+@async_method_decorator(csrf_protect_public_form, 'post')
+@async_method_decorator(async_condition(etag_func=apost_detail_etag), 'get')
+class PostDetailView(View):
+
+    async def render_detail(self, request, post, comment_form):
+        context = {
+            'post': post,
+            'post_tags': post.tags.all(),
+            'comment_form': comment_form,
+            'comments': CommentPage(post.comments.all(), settings.BLOG_COMMENTS_PER_PAGE),
+        }
+
+        if settings.BLOG_PUBLIC_POST_DETAIL:
+            context['public_page'] = True
+        else:
+            context['is_saved'] = await is_post_saved(request, post.id)
+
+        # The comments are only queried if their cached fragment is missing,
+        # which the template finds out while rendering, so render in a thread.
+        return await sync_to_async(render)(request, 'blog/post-detail.html', context)
+
+    async def get(self, request, slug):
+        post = await aget_object_or_404(Post.objects.for_detail(), slug=slug)
+        response = await self.render_detail(request, post, CommentForm())
+
+        if settings.BLOG_PUBLIC_POST_DETAIL:
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=0,
+                s_maxage=settings.BLOG_PUBLIC_CACHE_MAX_AGE,
+                stale_while_revalidate=settings.BLOG_PUBLIC_CACHE_STALE_WHILE_REVALIDATE,
+            )
+
+        return response
+
+    async def post(self, request, slug):
+        comment_form = CommentForm(request.POST)
+        post = await aget_object_or_404(Post.objects.for_detail(), slug=slug)
+
+        if comment_form.is_valid():
+            comment = comment_form.save(commit=False)
+            comment.post = post
+            await comment.asave()
+            return HttpResponseRedirect(reverse('post_detail_page', args=[slug]))
+
+        return await self.render_detail(request, post, comment_form)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+@async_method_decorator(csrf_protect_public_form, 'post')
+@async_method_decorator(async_condition(etag_func=aread_later_etag), 'get')
+class ReadLaterView(View):
+
+    async def post(self, request):
+        stored_posts = await request.session.aget('stored_posts') or []
+        post_id = int(request.POST['post_id'])
+
+        if post_id not in stored_posts:
+            stored_posts.append(post_id)
+        else:
+            stored_posts.remove(post_id)
+
+        await request.session.aset('stored_posts', stored_posts)
+        return HttpResponseRedirect('/')
+
+    async def get(self, request):
+        stored_posts = await request.session.aget('stored_posts')
+        context = {}
+
+        if not stored_posts:
+            context['stored_posts'] = []
+            context['has_posts'] = False
+        else:
+            posts = Post.objects.filter(id__in=stored_posts).only('title', 'slug')
+            context['posts'] = [post async for post in posts]
+            context['has_posts'] = True
+
+        return render(request, 'blog/stored-posts.html', context)
@@ -0,0 +1,177 @@
+"""
+Full-page cache for the public post listings.
+
+Cached pages are keyed on the site-wide ContentVersion that the signal
+handlers in blog/signals.py bump whenever a Post, Tag or Author changes, so
+stale pages are never served and never have to be deleted one by one: they
+are simply no longer looked up and age out of the cache backend. The version
+is kept in the database rather than the cache, so that a write handled by
+one worker process also retires the pages cached by all the others, even on
+a per-process backend like locmem; a cache hit costs that one lookup by
+primary key.
+"""
+import hashlib
+import threading
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .metrics import count_page_cache
+from .models import ContentVersion
+
+
+class PageCache:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    @property
+    def cache(self):
+        return caches[settings.BLOG_PAGE_CACHE_ALIAS]
+
+    def count(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+        count_page_cache(outcome)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'bypasses': self.bypasses}
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.bypasses = 0
+
+    def content_version(self):
+        return ContentVersion.current()
+
+    async def acontent_version(self):
+        return await ContentVersion.acurrent()
+
+    def bump_version(self, using=None):
+        ContentVersion.bump(using)
+
+    def make_key(self, request, version, query_params=()):
+        # Only the query parameters the view reads: any others leave the page
+        # as it is, and would otherwise let a visitor fill the cache with
+        # copies of it.
+        query = urlencode([(name, request.GET[name]) for name in query_params if name in request.GET])
+        path = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+        return f'blog:page:{version}:{path}'
+
+    def key(self, request, query_params=()):
+        return self.make_key(request, self.content_version(), query_params)
+
+    async def akey(self, request, query_params=()):
+        return self.make_key(request, await self.acontent_version(), query_params)
+
+    def is_cacheable(self, request):
+        # Visitors with a session may see output that depends on it, so only
+        # requests without a session cookie share cached pages.
+        return (
+            request.method in ('GET', 'HEAD')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        )
+
+    def to_response(self, cached):
+        if cached is None:
+            return None
+        content, headers = cached
+        response = HttpResponse(content)
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def from_response(self, response):
+        if response.status_code != 200 or response.cookies or response.streaming:
+            return None
+        headers = {
+            header: response[header]
+            for header in ('Content-Type', 'ETag', 'Last-Modified')
+            if response.has_header(header)
+        }
+        return (response.content, headers)
+
+    def get(self, key):
+        return self.to_response(self.cache.get(key))
+
+    async def aget(self, key):
+        return self.to_response(await self.cache.aget(key))
+
+    def set(self, key, response):
+        cached = self.from_response(response)
+        if cached is not None:
+            self.cache.set(key, cached, settings.BLOG_PAGE_CACHE_TIMEOUT)
+
+    async def aset(self, key, response):
+        cached = self.from_response(response)
+        if cached is not None:
+            await self.cache.aset(key, cached, settings.BLOG_PAGE_CACHE_TIMEOUT)
+
+
+page_cache = PageCache()
+
+
+class CachedPageMixin:
+    """Serve the view from the page cache to visitors without a session."""
+    # The query parameters that change the page, part of its cache key.
+    cache_query_params = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if not settings.BLOG_PAGE_CACHE:
+            return super().dispatch(request, *args, **kwargs)
+
+        if not page_cache.is_cacheable(request):
+            page_cache.count('bypasses')
+            return super().dispatch(request, *args, **kwargs)
+
+        if self.view_is_async:
+            return self.adispatch_cached(request, *args, **kwargs)
+
+        # The key is built once, before rendering: if the content version is
+        # bumped while this page renders, the page is stored under the old
+        # version and never served.
+        key = page_cache.key(request, self.cache_query_params)
+        response = page_cache.get(key)
+        if response is not None:
+            return self.cache_hit(request, response)
+
+        page_cache.count('misses')
+        response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        page_cache.set(key, response)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def adispatch_cached(self, request, *args, **kwargs):
+        key = await page_cache.akey(request, self.cache_query_params)
+        response = await page_cache.aget(key)
+        if response is not None:
+            return self.cache_hit(request, response)
+
+        page_cache.count('misses')
+        response = await super().dispatch(request, *args, **kwargs)
+        await page_cache.aset(key, response)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def cache_hit(self, request, response):
+        page_cache.count('hits')
+        # The stored validators are still current, since any change that
+        # would alter them also moves the page to a new key.
+        response = get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+            response=response,
+        )
+        response['X-Cache'] = 'HIT'
+        return response
@@ -0,0 +1,132 @@
+"""
+Validators for conditional GET requests to the blog views.
+
+Each function is cheap to compute from an aggregate query or the session and
+is passed to django.views.decorators.http.condition, so a matching
+If-None-Match / If-Modified-Since is answered with a 304 before the view
+renders anything.
+
+Listings send both an ETag and a Last-Modified, both taken from the
+ContentVersion that every Post, Tag and Author change bumps: one lookup by
+primary key, however many posts there are. Post pages also fold it into
+their ETag, since they show the post's author and tag captions. Pages that
+depend on comments or the session only send an ETag, because no timestamp
+covers those.
+
+The ``a``-prefixed coroutines compute the same validators with the async ORM
+and session API for the views in blog/async_views.py.
+"""
+import hashlib
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.middleware.csrf import get_token
+
+from .models import Comment, ContentVersion, Post
+
+
+def make_etag(*parts):
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def version_state(version):
+    # The version is the time_ns() of the last change, or 0 before the first.
+    last_modified = datetime.fromtimestamp(version / 1e9, timezone.utc) if version else None
+    return {'version': version, 'last_modified': last_modified}
+
+
+def posts_state(request):
+    """The content version and its time, looked up once per request."""
+    if not hasattr(request, '_blog_posts_state'):
+        request._blog_posts_state = version_state(ContentVersion.current())
+    return request._blog_posts_state
+
+
+async def aposts_state(request):
+    if not hasattr(request, '_blog_posts_state'):
+        request._blog_posts_state = version_state(await ContentVersion.acurrent())
+    return request._blog_posts_state
+
+
+def make_listing_etag(request, state):
+    return make_etag(request.get_full_path(), state['version'])
+
+
+def listing_etag(request, *args, **kwargs):
+    return make_listing_etag(request, posts_state(request))
+
+
+async def alisting_etag(request, *args, **kwargs):
+    return make_listing_etag(request, await aposts_state(request))
+
+
+def listing_last_modified(request, *args, **kwargs):
+    return posts_state(request)['last_modified']
+
+
+async def alisting_last_modified(request, *args, **kwargs):
+    return (await aposts_state(request))['last_modified']
+
+
+def post_state(slug):
+    content_version = ContentVersion.objects.filter(pk=ContentVersion.SITE).values('version')[:1]
+    # Edits keep a comment's id and the count, but not its updated_at.
+    comments_updated_at = Comment.objects.filter(post=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+    return Post.objects.filter(slug=slug).with_latest_comment_id().annotate(
+        content_version=Subquery(content_version), comments_updated_at=Subquery(comments_updated_at)
+    ).values('id', 'updated_at', 'latest_comment_id', 'comment_count', 'comments_updated_at', 'content_version')
+
+
+def make_post_detail_etag(request, post, stored_posts):
+    if post is None:
+        # Let the view raise its 404.
+        return None
+
+    parts = [
+        post['id'], post['updated_at'], post['latest_comment_id'], post['comment_count'],
+        post['comments_updated_at'], post['content_version'],
+    ]
+    if not settings.BLOG_PUBLIC_POST_DETAIL:
+        # Private pages embed the visitor's CSRF token and read-later state.
+        # get_token() creates the CSRF secret now if the visitor has none yet,
+        # so the ETag matches the cookie that this response is going to set.
+        get_token(request)
+        parts += [request.META['CSRF_COOKIE'], post['id'] in (stored_posts or [])]
+    return make_etag(*parts)
+
+
+def post_detail_etag(request, slug):
+    post = post_state(slug).first()
+    stored_posts = None if settings.BLOG_PUBLIC_POST_DETAIL else request.session.get('stored_posts')
+    return make_post_detail_etag(request, post, stored_posts)
+
+
+async def apost_detail_etag(request, slug):
+    post = await post_state(slug).afirst()
+    stored_posts = None if settings.BLOG_PUBLIC_POST_DETAIL else await request.session.aget('stored_posts')
+    return make_post_detail_etag(request, post, stored_posts)
+
+
+def stored_posts_aggregates():
+    return {'last_modified': Max('updated_at'), 'count': Count('id')}
+
+
+def make_read_later_etag(stored_posts, state):
+    return make_etag('read-later', stored_posts, state['last_modified'], state['count'])
+
+
+def read_later_etag(request, *args, **kwargs):
+    stored_posts = sorted(request.session.get('stored_posts') or [])
+    if not stored_posts:
+        return make_etag('read-later')
+    state = Post.objects.filter(id__in=stored_posts).aggregate(**stored_posts_aggregates())
+    return make_read_later_etag(stored_posts, state)
+
+
+async def aread_later_etag(request, *args, **kwargs):
+    stored_posts = sorted(await request.session.aget('stored_posts') or [])
+    if not stored_posts:
+        return make_etag('read-later')
+    state = await Post.objects.filter(id__in=stored_posts).aaggregate(**stored_posts_aggregates())
+    return make_read_later_etag(stored_posts, state)
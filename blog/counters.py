@@ -0,0 +1,48 @@
+"""
+Denormalized counters: ``Post.comment_count`` and ``Tag.post_count``.
+
+The signal handlers in blog/signals.py keep them current with F() updates,
+so concurrent writers never lose an increment, and Post.save() and
+Tag.save() leave them out unless update_fields names them, so a stale
+instance never writes its old count back. Writes that skip signals,
+such as bulk_create(), raw SQL or changing the post of an existing comment,
+can make them drift; ``repair_counters`` recomputes them in bulk.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Post, Tag
+
+
+def change_comment_count(post_id, delta, using):
+    Post.objects.using(using).filter(pk=post_id).update(comment_count=F('comment_count') + delta)
+
+
+def change_post_count(tag_ids, delta, using):
+    if tag_ids:
+        Tag.objects.using(using).filter(pk__in=tag_ids).update(post_count=F('post_count') + delta)
+
+
+def actual_comment_count():
+    comments = Comment.objects.filter(post=OuterRef('pk')).values('post').annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(comments), 0)
+
+
+def actual_post_count():
+    posts = Post.tags.through.objects.filter(tag=OuterRef('pk')).values('tag').annotate(
+        total=Count('id')
+    ).values('total')
+    return Coalesce(Subquery(posts), 0)
+
+
+def find_drift(using='default'):
+    """Number of posts and tags whose stored counter is wrong."""
+    posts = Post.objects.using(using).alias(actual=actual_comment_count()).exclude(comment_count=F('actual'))
+    tags = Tag.objects.using(using).alias(actual=actual_post_count()).exclude(post_count=F('actual'))
+    return {'posts': posts.count(), 'tags': tags.count()}
+
+
+def repair_counters(using='default'):
+    """Recompute every counter with one UPDATE per table."""
+    Post.objects.using(using).update(comment_count=actual_comment_count())
+    Tag.objects.using(using).update(post_count=actual_post_count())
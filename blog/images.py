@@ -0,0 +1,199 @@
+"""
+Responsive derivatives of post images.
+
+Each uploaded ``Post.image`` gets downscaled copies at DERIVATIVE_WIDTHS in
+WebP and JPEG, stored next to the original under ``<dir>/derived/``. They are
+built in a pool of worker processes once the upload has been committed, so
+the admin request that saved the post never waits for Pillow. When a post's
+derivatives are ready their widths are recorded in ``Post.image_widths``,
+which the ``responsive_image`` template tag uses to build ``srcset``. The
+web process then bumps the page cache's content version, and logs builds
+that failed to the ``blog.images`` logger.
+
+Uploads are also described once, when they are saved: their dimensions,
+dominant colour and a tiny blurred placeholder are stored on the post so that
+pages can reserve the image's space and paint something before it loads.
+"""
+import base64
+import logging
+import multiprocessing
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger('blog.images')
+
+DERIVATIVE_WIDTHS = (320, 640, 1280)
+
+# File extension, Pillow format and save options of every derivative format.
+DERIVATIVE_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+# Width of the placeholder image inlined into pages as a data: URI.
+PLACEHOLDER_WIDTH = 16
+
+_executor = None
+
+
+def derivative_name(name, width, extension):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'derived', f'{stem}-{width}w.{extension}')
+
+
+def image_storage():
+    """The storage of Post.image, which holds the derivatives too."""
+    from .models import Post
+
+    return Post._meta.get_field('image').storage
+
+
+def derivative_widths(original_width):
+    """The derivative widths that are not upscales of an image this wide."""
+    widths = [width for width in DERIVATIVE_WIDTHS if width < original_width]
+    # Images narrower than the smallest size still get one re-encoded copy.
+    return widths or [original_width]
+
+
+def open_image(file):
+    """Open an image file upright and in a mode every output format accepts."""
+    image = Image.open(file)
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    return image
+
+
+def describe_image(image):
+    """The Post fields that describe an opened image."""
+    red, green, blue = image.convert('RGB').resize((1, 1), Image.BOX).getpixel((0, 0))
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    buffer = BytesIO()
+    image.resize((PLACEHOLDER_WIDTH, height), Image.BOX).save(buffer, 'WEBP', quality=40)
+    return {
+        'image_width': image.width,
+        'image_height': image.height,
+        'image_color': f'#{red:02x}{green:02x}{blue:02x}',
+        'image_placeholder': 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode(),
+    }
+
+
+def generate_derivatives(name, force=False, image=None):
+    """
+    Write every derivative of the stored image ``name`` and return their widths.
+
+    Existing derivatives are kept unless ``force`` is set: upload names are
+    never reused, so a derivative that exists was made from this original.
+    ``image`` may be given when the original has already been opened.
+    """
+    storage = image_storage()
+    if image is None:
+        with storage.open(name, 'rb') as original:
+            image = open_image(original)
+
+    widths = derivative_widths(image.width)
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = None
+        for extension, image_format, options in DERIVATIVE_FORMATS:
+            target = derivative_name(name, width, extension)
+            if not force and storage.exists(target):
+                continue
+            if resized is None:
+                resized = image.resize((width, height), Image.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, image_format, **options)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+    return widths
+
+
+def build_post_derivatives(post_id, name, using='default', force=False):
+    """
+    Build one post's derivatives and record their widths on the post. The
+    image's description is stored again too, which fills it in for posts
+    saved before descriptions were.
+
+    Return whether the post still had this image and was updated; the
+    caller then bumps the page cache's content version.
+    """
+    # Imported here because worker processes import this module to find
+    # _initialize_worker, before Django has been set up.
+    from django.utils import timezone
+
+    from .models import Post
+
+    with image_storage().open(name, 'rb') as original:
+        image = open_image(original)
+    widths = generate_derivatives(name, force=force, image=image)
+
+    # Only record them if the post still has this image. Bumping updated_at
+    # moves the post's cached card on.
+    updated = Post.objects.using(using).filter(pk=post_id, image=name).update(
+        image_widths=widths, updated_at=timezone.now(), **describe_image(image)
+    )
+    return bool(updated)
+
+
+def build_in_worker(post_id, name, using='default', force=False):
+    from django.db import connections
+
+    try:
+        return build_post_derivatives(post_id, name, using, force)
+    finally:
+        # Workers live on between tasks; do not leave a connection idling.
+        connections.close_all()
+
+
+def _initialize_worker():
+    import django
+    django.setup()
+
+
+def make_executor(max_workers):
+    # Spawned rather than forked workers: they start from a clean interpreter
+    # instead of inheriting the web worker's threads and open connections.
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_initialize_worker,
+    )
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = make_executor(settings.BLOG_IMAGE_WORKERS)
+    return _executor
+
+
+def derivatives_built(future, name, using='default'):
+    """Done-callback of a scheduled build, run in the web process."""
+    from django.db import connections
+
+    from .cache import page_cache
+
+    error = future.exception()
+    if error is not None:
+        logger.error('Could not build the derivatives of %s', name, exc_info=error)
+        return
+    if future.result():
+        try:
+            page_cache.bump_version(using)
+        finally:
+            # The executor's management thread runs the callbacks.
+            connections.close_all()
+
+
+def schedule_derivatives(post_id, name, using='default'):
+    future = get_executor().submit(build_in_worker, post_id, name, using)
+    future.add_done_callback(lambda future: derivatives_built(future, name, using))
+    return future
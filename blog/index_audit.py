@@ -0,0 +1,186 @@
+"""
+An audit of the indexes behind the blog's hot queries, run by
+``manage.py audit_indexes``.
+
+Each query shape is run the way a view or admin changelist runs it, against
+rows sampled from the database: the statements it sends are captured and
+timed, and the plan of each SELECT is read back with EXPLAIN. A plan that
+reads a whole table or sorts rows itself, rather than walking an index in
+order, is flagged, unless every table it reads is small enough for that to
+be the cheaper plan anyway. Run it against the scale dataset (``manage.py
+generate_scale_data``), since the database only uses the indexes on tables
+large enough to need them. On SQLite a scan in primary key order under a
+LIMIT is flagged as well, though it stops after the page's rows.
+"""
+import re
+import statistics
+import time
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import RequestFactory
+
+from .conditional import post_state, stored_posts_aggregates
+from .models import Comment, ContentVersion, Post, Tag
+from .pagination import CommentPage, KeysetPaginator
+from .slow_queries import explain, normalize
+
+PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+# (pattern, problem) per vendor, matched against each line of a plan.
+PLAN_PROBLEMS = {
+    'sqlite': [
+        (re.compile(r'\bSCAN (\S+)$'), 'full scan of {}'),
+        (re.compile(r'USE TEMP B-TREE FOR (.+)$'), 'sort for {}'),
+    ],
+    'postgresql': [
+        (re.compile(r'Seq Scan on (\S+)'), 'full scan of {}'),
+        (re.compile(r'(?:^|-> +)((?:Incremental )?Sort)  \('), '{}'),
+    ],
+}
+
+
+# The tables a plan reads, per vendor.
+PLAN_TABLES = {
+    'sqlite': re.compile(r'\b(?:SCAN|SEARCH) (\S+)'),
+    'postgresql': re.compile(r' on (\S+)'),
+}
+
+
+def plan_problems(plan, vendor=None):
+    """What the plan does without an index: full table scans and sorts."""
+    patterns = PLAN_PROBLEMS.get(vendor or connection.vendor, [])
+    problems = []
+    for line in plan.splitlines():
+        for pattern, problem in patterns:
+            match = pattern.search(line.strip())
+            if match:
+                problems.append(problem.format(match[1]))
+    return problems
+
+
+class TableSizes:
+    """Row counts of the database's tables, counted when first asked for."""
+
+    def __init__(self):
+        self.tables = set(connection.introspection.table_names())
+        self.rows = {}
+
+    def __getitem__(self, table):
+        if table not in self.rows:
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                self.rows[table] = cursor.fetchone()[0]
+        return self.rows[table]
+
+    def all_small(self, plan, min_rows):
+        """Whether every table the plan reads has fewer than ``min_rows`` rows."""
+        pattern = PLAN_TABLES.get(connection.vendor)
+        tables = set(pattern.findall(plan)) if pattern else set()
+        # Aliases and subqueries are not tables, and count as large.
+        return bool(tables) and all(table in self.tables and self[table] < min_rows for table in tables)
+
+
+def changelist(model, **params):
+    """Runs the queries of the model's admin changelist, as a superuser would."""
+    request = RequestFactory().get('/', params)
+    request.user = User(is_active=True, is_staff=True, is_superuser=True)
+
+    def run():
+        return list(admin.site._registry[model].get_changelist_instance(request).result_list)
+    return run
+
+
+def query_shapes():
+    """``(name, callable)`` pairs running the queries of each view and admin changelist."""
+    post = Post.objects.only('id', 'slug', 'date', 'author_id').order_by('id')[Post.objects.count() // 2]
+    busiest = Post.objects.only('id').order_by('-comment_count').first()
+    older_comment = Comment.objects.filter(post=busiest).order_by('-id').values_list('id', flat=True)[
+        COMMENTS_PER_PAGE * 5:COMMENTS_PER_PAGE * 5 + 1
+    ].first()
+    stored_posts = list(Post.objects.filter(id__gte=post.id).order_by('id').values_list('id', flat=True)[:10])
+    tag = Tag.objects.order_by('-post_count').first()
+    middle_page = max(Paginator(Post.objects.for_listing(), PER_PAGE).num_pages // 2, 1)
+    cursor = KeysetPaginator(Post.objects.for_listing(), PER_PAGE).encode_cursor(post)
+
+    return [
+        ('starting_page', lambda: list(Post.objects.for_listing()[:3])),
+        ('listing validators', ContentVersion.current),
+        ('posts_page', lambda: list(Paginator(Post.objects.for_listing(), PER_PAGE).page(1))),
+        (
+            f'posts_page?page={middle_page}',
+            lambda: list(Paginator(Post.objects.for_listing(), PER_PAGE).page(middle_page)),
+        ),
+        (
+            'posts_page?cursor=<middle>',
+            lambda: list(KeysetPaginator(Post.objects.for_listing(), PER_PAGE).page_queryset(cursor)),
+        ),
+        ('post_detail_page validator', lambda: post_state(post.slug).first()),
+        ('post_detail_page', lambda: Post.objects.for_detail().get(slug=post.slug)),
+        (
+            'post_detail_page comments',
+            lambda: CommentPage(Comment.objects.filter(post_id=busiest.id), COMMENTS_PER_PAGE).object_list,
+        ),
+        (
+            'post_comments_page?before=<older>',
+            lambda: CommentPage(
+                Comment.objects.filter(post_id=busiest.id), COMMENTS_PER_PAGE, older_comment
+            ).object_list,
+        ),
+        ('read_later_page validator', lambda: Post.objects.filter(id__in=stored_posts).aggregate(
+            **stored_posts_aggregates()
+        )),
+        ('read_later_page', lambda: list(Post.objects.filter(id__in=stored_posts).only('title', 'slug'))),
+        ('admin:blog_post_changelist', changelist(Post)),
+        (
+            'admin:blog_post_changelist?date=<month>',
+            changelist(Post, date__gte=post.date.replace(day=1), date__lt=post.date.replace(day=28)),
+        ),
+        ('admin:blog_post_changelist?author=<id>', changelist(Post, author__id__exact=post.author_id)),
+        ('admin:blog_post_changelist?tags=<id>', changelist(Post, tags__id__exact=tag.id)),
+        ('admin:blog_post_changelist?comments=many', changelist(Post, comments='many')),
+        ('admin:blog_tag_changelist', changelist(Tag)),
+        ('admin:blog_comment_changelist', changelist(Comment)),
+    ]
+
+
+def capture_statements(run):
+    statements = []
+
+    def capture(execute, sql, params, many, context):
+        statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(capture):
+        run()
+    return statements
+
+
+def audit(shapes, repeat=5, min_rows=1000):
+    """Times every shape and flags the plans of its SELECTs, one dict per shape."""
+    sizes = TableSizes()
+    results = []
+    for name, run in shapes:
+        statements = capture_statements(run)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        plans = []
+        for sql, params in statements:
+            plan = explain(connection, sql, params)
+            if plan is not None:
+                problems = [] if sizes.all_small(plan, min_rows) else plan_problems(plan)
+                plans.append({'shape': normalize(sql), 'plan': plan, 'problems': problems})
+        results.append({
+            'name': name,
+            'ms': statistics.median(timings),
+            'queries': len(statements),
+            'plans': plans,
+        })
+    return results
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.index_audit import audit, query_shapes
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the queries of each view and admin changelist through EXPLAIN, time them and flag the '
+        'ones that scan a whole table or sort without an index. Use the scale dataset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Runs of each query shape to take the median of.')
+        parser.add_argument('--only', help='Only audit the query shapes whose name contains this.')
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Do not flag the plans of statements that only read tables with fewer rows than this.'
+        )
+
+    def handle(self, *args, **options):
+        if not Post.objects.exists():
+            raise CommandError('There are no posts to audit with; run generate_scale_data first.')
+
+        shapes = [
+            (name, run) for name, run in query_shapes()
+            if not options['only'] or options['only'] in name
+        ]
+        flagged = 0
+        for result in audit(shapes, options['repeat'], options['min_rows']):
+            problems = sorted({problem for plan in result['plans'] for problem in plan['problems']})
+            flagged += bool(problems)
+            line = f"{result['name']:<45} {result['ms']:9.2f} ms  {result['queries']:>2} queries"
+            if problems:
+                line = self.style.WARNING(f"{line}  {', '.join(problems)}")
+            self.stdout.write(line)
+
+            for plan in result['plans']:
+                # Flagged plans are shown, and with -v 2 all of them.
+                if options['verbosity'] >= 2 or (options['verbosity'] == 1 and plan['problems']):
+                    self.stdout.write(f"    {plan['shape'][:150]}")
+                    for plan_line in plan['plan'].splitlines():
+                        self.stdout.write(f'      {plan_line}')
+
+        self.stdout.write(f'{flagged} of {len(shapes)} query shape(s) flagged.')
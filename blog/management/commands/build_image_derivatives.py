@@ -0,0 +1,61 @@
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from blog.cache import page_cache
+from blog.images import build_in_worker, build_post_derivatives, make_executor
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the resized WebP and JPEG copies and the stored description of '
+        'post images that do not have them yet, in parallel worker processes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to read posts from.')
+        parser.add_argument(
+            '--workers', type=int, default=settings.BLOG_IMAGE_WORKERS,
+            help='Worker processes to use; 1 builds them in this process.'
+        )
+        parser.add_argument('--force', action='store_true', help='Rebuild every derivative.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        force = options['force']
+        posts = Post.objects.using(using).exclude(image='').exclude(image__isnull=True)
+        if not force:
+            posts = posts.filter(Q(image_widths=[]) | Q(image_width__isnull=True))
+        jobs = list(posts.values_list('id', 'image'))
+
+        built = failed = 0
+        if options['workers'] <= 1:
+            for post_id, name in jobs:
+                try:
+                    build_post_derivatives(post_id, name, using, force)
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                else:
+                    built += 1
+        else:
+            with make_executor(options['workers']) as executor:
+                futures = {
+                    executor.submit(build_in_worker, post_id, name, using, force): name
+                    for post_id, name in jobs
+                }
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except OSError as error:
+                        failed += 1
+                        self.stderr.write(f'{futures[future]}: {error}')
+                    else:
+                        built += 1
+
+        if built:
+            page_cache.bump_version(using)
+        self.stdout.write(self.style.SUCCESS(f'Built derivatives for {built} image(s), {failed} failed.'))
@@ -0,0 +1,63 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from blog.models import Post
+from blog.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete content-addressed post images, and their derivatives, that no '
+        'post refers to any more.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Database alias whose posts keep images alive; repeat for several. Defaults to "default".'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Keep images younger than this many seconds, which may belong to a post being saved.'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted.')
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError('Post.image does not use content-addressed storage; set BLOG_CONTENT_ADDRESSED_MEDIA.')
+
+        # Listed before reading the posts: a blob uploaded in between is then
+        # either referenced already or too young to delete.
+        upload_to = Post._meta.get_field('image').upload_to
+        blobs = list(storage.blobs(upload_to)) if storage.exists(upload_to) else []
+
+        referenced = set()
+        for using in options['databases'] or ['default']:
+            referenced.update(Post.objects.using(using).exclude(image='').values_list('image', flat=True))
+
+        cutoff = timezone.now() - timedelta(seconds=options['min_age'])
+        deleted = 0
+        for name in blobs:
+            if name in referenced or storage.get_modified_time(name) > cutoff:
+                continue
+            deleted += 1
+            self.stdout.write(f'Deleting {name}')
+            if not options['dry_run']:
+                self.delete_blob(storage, name)
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {deleted} of {len(blobs)} image(s).'))
+
+    def delete_blob(self, storage, name):
+        directory, filename = posixpath.split(name)
+        digest = posixpath.splitext(filename)[0]
+        derived = posixpath.join(directory, 'derived')
+        if storage.exists(derived):
+            for derivative in storage.listdir(derived)[1]:
+                if derivative.startswith(f'{digest}-'):
+                    storage.delete(posixpath.join(derived, derivative))
+        storage.delete(name)
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.models import Post
+from blog.scale_data import generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill an empty database with generated authors, tags, posts (with images) '
+        'and comments at production volumes, for load tests and benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to fill, e.g. "backup".')
+        parser.add_argument('--authors', type=int, default=100)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--comments', type=int, default=5_000_000)
+        parser.add_argument('--tags-per-post', type=int, default=3)
+        parser.add_argument('--images', type=int, default=20, help='Distinct generated images shared by the posts.')
+        parser.add_argument('--days', type=int, default=3650, help='Spread the posts over this many days up to today.')
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Zipf exponent of the comments per post: 0 spreads them evenly, higher piles them on fewer posts.'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='The same seed and options give the same rows.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert.')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Processes writing comments. Only Postgres takes concurrent writers; keep 1 on SQLite.'
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if Post.objects.using(using).exists():
+            raise CommandError(f'The "{using}" database already has posts; generate into an empty one.')
+        if options['skew'] < 0:
+            raise CommandError('--skew cannot be negative.')
+
+        start = last = time.perf_counter()
+
+        def progress(phase, rows):
+            nonlocal last
+            now = time.perf_counter()
+            seconds, last = now - last, now
+            rate = rows / seconds if seconds else 0
+            self.stdout.write(f'{phase}: {rows} in {seconds:.2f}s ({rate:.0f} rows/s)')
+
+        generate(using, options, progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated the blog data in "{using}" in {time.perf_counter() - start:.2f}s.'
+        ))
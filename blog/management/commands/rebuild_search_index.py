@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the full-text search index of every post. Only needed after '
+        'writes that skip model signals, such as bulk_create() or update().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to rebuild.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        with transaction.atomic(using=using):
+            get_search_backend(using).rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the search index on "{using}".'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import Post
+from blog.rendering import render_content
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-render Post.content_html for every post, e.g. after changing '
+        'blog.rendering or importing posts with bulk_create().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to render posts in.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        batch_size = options['batch_size']
+        posts = Post.objects.using(using).only('id', 'content', 'content_html').order_by('id')
+
+        rendered = changed = 0
+        batch = []
+        with transaction.atomic(using=using):
+            for post in posts.iterator(chunk_size=batch_size):
+                rendered += 1
+                html = render_content(post.content)
+                if html == post.content_html:
+                    continue
+                post.content_html = html
+                batch.append(post)
+                if len(batch) == batch_size:
+                    changed += Post.objects.using(using).bulk_update(batch, ['content_html'])
+                    batch = []
+            changed += Post.objects.using(using).bulk_update(batch, ['content_html'])
+
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} post(s), {changed} changed.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.counters import find_drift, repair_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute Post.comment_count and Tag.post_count and report how many had drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to repair.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drift.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+
+        with transaction.atomic(using=using):
+            drift = find_drift(using)
+            self.stdout.write(f"{drift['posts']} post(s) and {drift['tags']} tag(s) have drifted.")
+            if options['dry_run'] or not any(drift.values()):
+                return
+            repair_counters(using)
+
+        self.stdout.write(self.style.SUCCESS('Counters repaired.'))
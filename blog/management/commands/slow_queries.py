@@ -0,0 +1,70 @@
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand
+
+from blog.slow_queries import read_log
+
+ORDERS = {
+    'total': lambda shape: shape['total_ms'],
+    'count': lambda shape: shape['count'],
+    'mean': lambda shape: shape['total_ms'] / shape['count'],
+    'max': lambda shape: shape['max_ms'],
+}
+
+
+def summarize(entries, view=None):
+    """The logged statements grouped by shape, with their timings and where they came from."""
+    shapes = defaultdict(lambda: {
+        'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'views': Counter(), 'sites': Counter(), 'plan': None,
+    })
+    for entry in entries:
+        if view and entry.get('view') != view:
+            continue
+        shape = shapes[entry['shape']]
+        shape['shape'] = entry['shape']
+        shape['count'] += 1
+        shape['total_ms'] += entry['ms']
+        shape['max_ms'] = max(shape['max_ms'], entry['ms'])
+        shape['views'][entry.get('view') or '<no request>'] += 1
+        # The caller, and the innermost project frame above it.
+        site = ' < '.join(entry.get('stack', [])[:2]) or '?'
+        shape['sites'][entry.get('template') or site] += 1
+        if entry.get('plan'):
+            shape['plan'] = entry['plan']
+    return list(shapes.values())
+
+
+class Command(BaseCommand):
+    help = 'Summarize the slow query log by normalized query shape, slowest in total first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='Slow query log to read. Defaults to BLOG_SLOW_QUERY_LOG.')
+        parser.add_argument('--top', type=int, default=10, help='Number of query shapes to show.')
+        parser.add_argument(
+            '--order', choices=sorted(ORDERS), default='total', help='Rank shapes by total, mean or max time, or count.'
+        )
+        parser.add_argument('--view', help='Only count statements run by this URL name, e.g. post_detail_page.')
+        parser.add_argument('--plans', action='store_true', help='Show the captured EXPLAIN output of each shape.')
+
+    def handle(self, *args, **options):
+        shapes = summarize(read_log(options['log']), options['view'])
+        if not shapes:
+            self.stdout.write('No slow queries logged.')
+            return
+
+        shapes.sort(key=ORDERS[options['order']], reverse=True)
+        total = sum(shape['count'] for shape in shapes)
+        self.stdout.write(f'{total} slow statement(s) in {len(shapes)} shape(s).\n')
+        for rank, shape in enumerate(shapes[:options['top']], 1):
+            self.stdout.write(self.style.SQL_KEYWORD(
+                f"{rank}. {shape['total_ms']:.1f} ms total, {shape['count']} call(s), "
+                f"{shape['total_ms'] / shape['count']:.1f} ms mean, {shape['max_ms']:.1f} ms max"
+            ))
+            self.stdout.write(f"   {shape['shape']}")
+            self.stdout.write('   views: ' + ', '.join(f'{name} ({n})' for name, n in shape['views'].most_common(3)))
+            self.stdout.write('   from: ' + ', '.join(f'{site} ({n})' for site, n in shape['sites'].most_common(3)))
+            if options['plans'] and shape['plan']:
+                self.stdout.write('   plan:')
+                for line in shape['plan'].splitlines():
+                    self.stdout.write(f'     {line}')
+            self.stdout.write('')
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.sync import OVERLAP, sync
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy new, changed and deleted authors, tags, posts and comments from '
+        'one database to another, by default from "default" to "backup".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default='default', help='Database alias to copy from.')
+        parser.add_argument('--target', default='backup', help='Database alias to copy to.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows read and written per transaction.')
+        parser.add_argument('--full', action='store_true', help='Copy every row instead of resuming from the high-water marks.')
+        parser.add_argument(
+            '--overlap', type=float, default=OVERLAP.total_seconds(),
+            help='Seconds before the updated_at high-water marks to copy again, covering late commits.'
+        )
+
+    def handle(self, *args, **options):
+        if options['source'] == options['target']:
+            raise CommandError('The source and target databases must differ.')
+
+        total_rows = total_seconds = 0
+        overlap = timedelta(seconds=options['overlap'])
+        for stats in sync(options['source'], options['target'], options['batch_size'], options['full'], overlap):
+            total_rows += stats.copied + stats.deleted
+            total_seconds += stats.seconds
+            self.stdout.write(
+                f'{stats.model._meta.label}: {stats.copied} copied, {stats.deleted} deleted '
+                f'in {stats.seconds:.2f}s ({stats.rows_per_second:.0f} rows/s)'
+            )
+
+        rate = total_rows / total_seconds if total_seconds else 0
+        self.stdout.write(self.style.SUCCESS(f'Synced {total_rows} row(s) in {total_seconds:.2f}s ({rate:.0f} rows/s).'))
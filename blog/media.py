@@ -0,0 +1,167 @@
+"""
+Serving of uploaded media files (MEDIA_URL) in production.
+
+Django's development ``serve`` view reads every file through Python, ignores
+Range requests and sends no caching headers. This view answers conditional
+requests with 304/412 from the file's stat(), honours single byte ranges and
+marks content-hashed names as immutable. The bytes themselves are either
+handed to the front-end server (BLOG_MEDIA_SENDFILE) or streamed with
+FileResponse, which the WSGI server turns into a zero-copy sendfile().
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# A name whose stem is, or ends in, a hex digest of at least 12 digits, like
+# ManifestStaticFilesStorage's "photo.0123456789ab.jpg", or the name of an
+# image derivative built from such a file, like "0123456789ab-320w.webp".
+# Such a name is never reused for other content, so it may be cached for good.
+HASHED_NAME_RE = re.compile(r'(?:^|[.\-_])[0-9a-f]{12,}(?:-\d+w)?\.[^./]+$')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class FileRange:
+    """
+    A file read from its current position up to ``length`` bytes.
+
+    It keeps fileno() so that the WSGI server can still sendfile() it: gunicorn
+    sends Content-Length bytes from the file's current offset.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    The (start, stop) byte span requested by a Range header, None to serve
+    the whole file, or False if the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        # Malformed and multi-part ranges may be ignored (RFC 9110, 14.2).
+        return None
+    first, last = match.groups()
+    if not first:
+        # A suffix range: the last N bytes.
+        length = int(last)
+        return (max(0, size - length), size) if length else False
+    start = int(first)
+    stop = min(int(last) + 1, size) if last else size
+    if start >= size or start >= stop:
+        return False
+    return start, stop
+
+
+def if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        # Only a strong, exactly equal ETag allows a partial response.
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def cache_control(name):
+    if HASHED_NAME_RE.search(posixpath.basename(name)):
+        return {'public': True, 'max_age': IMMUTABLE_MAX_AGE, 'immutable': True}
+    return {'public': True, 'max_age': settings.BLOG_MEDIA_MAX_AGE}
+
+
+def offload(name, fullpath):
+    """Have the front-end server send the file, if it is configured to."""
+    if settings.BLOG_MEDIA_SENDFILE == 'x-accel-redirect':
+        # nginx serves the internal location itself, with its own Range,
+        # ETag and Last-Modified handling.
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.BLOG_MEDIA_ACCEL_PREFIX + quote(name)
+        return response
+    if settings.BLOG_MEDIA_SENDFILE == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = fullpath
+        return response
+    return None
+
+
+@require_safe
+def serve_media(request, path):
+    name = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, name)
+        stat = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404('File not found.')
+    if not os.path.isfile(fullpath):
+        raise Http404('File not found.')
+
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    content_type, encoding = mimetypes.guess_type(fullpath)
+
+    def set_headers(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, **cache_control(name))
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return set_headers(not_modified)
+
+    response = offload(name, fullpath)
+    if response is not None:
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        return set_headers(response)
+
+    span = None
+    if 'HTTP_RANGE' in request.META and if_range_matches(request, etag, last_modified):
+        span = parse_range(request.META['HTTP_RANGE'], size)
+        if span is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return set_headers(response)
+
+    start, stop = span or (0, size)
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type or 'application/octet-stream')
+    else:
+        file = open(fullpath, 'rb')
+        file.seek(start)
+        response = FileResponse(FileRange(file, stop - start), content_type=content_type or 'application/octet-stream')
+    if span:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+    response['Content-Length'] = stop - start
+    response['Accept-Ranges'] = 'bytes'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return set_headers(response)
@@ -0,0 +1,196 @@
+"""
+Prometheus metrics for the site, served at /metrics when BLOG_METRICS is set.
+
+MetricsMiddleware records every request's latency and status under its URL
+name, with the number of SQL queries it ran and their total time. The
+queries are counted by an execute wrapper that blog/signals.py gives every
+database connection when it is opened; it only does any work while a
+request is being measured. Template render times come from the
+TimedDjangoTemplates backend, page cache lookups from PageCache.count(), and
+template fragment cache lookups from the CountedCache wrapped around the
+``fragments`` cache.
+
+Under gunicorn each worker writes its samples to files in
+PROMETHEUS_MULTIPROC_DIR (set up by gunicorn.conf.py), and /metrics merges
+the files of every worker, so a scrape sees the whole server whichever
+worker answers it. Without that directory, the process's own samples are
+served.
+"""
+import os
+import secrets
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.module_loading import import_string
+from django.views.decorators.http import require_safe
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    'blog_request_duration_seconds', 'Time to respond to a request.', ['view'], buckets=LATENCY_BUCKETS
+)
+RESPONSES = Counter('blog_responses_total', 'Responses sent.', ['view', 'method', 'status'])
+DB_QUERIES = Histogram(
+    'blog_db_queries_per_request', 'SQL queries run by a request.', ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+DB_TIME = Histogram(
+    'blog_db_seconds_per_request', 'Time a request spent in SQL queries.', ['view'], buckets=LATENCY_BUCKETS
+)
+TEMPLATE_RENDER = Histogram(
+    'blog_template_render_seconds', 'Time to render a template.', ['template'], buckets=LATENCY_BUCKETS
+)
+PAGE_CACHE = Counter('blog_page_cache_requests_total', 'Page cache lookups.', ['outcome'])
+FRAGMENT_CACHE = Counter(
+    'blog_fragment_cache_requests_total', 'Template fragment cache lookups.', ['fragment', 'outcome']
+)
+
+UNMATCHED = '<unmatched>'
+
+# [queries, seconds] of the request being measured, shared with the threads
+# that an async request runs its queries in.
+_request_queries = ContextVar('blog_request_queries', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    totals = _request_queries.get()
+    if totals is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        totals[0] += 1
+        totals[1] += time.perf_counter() - start
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def count_page_cache(outcome):
+    if settings.BLOG_METRICS:
+        PAGE_CACHE.labels(outcome).inc()
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.BLOG_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        totals = [0, 0.0]
+        token = _request_queries.set(totals)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.observe(request, response, time.perf_counter() - start, totals)
+        return response
+
+    async def __acall__(self, request):
+        totals = [0, 0.0]
+        token = _request_queries.set(totals)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.observe(request, response, time.perf_counter() - start, totals)
+        return response
+
+    def observe(self, request, response, seconds, totals):
+        match = request.resolver_match
+        view = match.view_name if match else UNMATCHED
+        REQUEST_LATENCY.labels(view).observe(seconds)
+        RESPONSES.labels(view, request.method, response.status_code).inc()
+        DB_QUERIES.labels(view).observe(totals[0])
+        DB_TIME.labels(view).observe(totals[1])
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            TEMPLATE_RENDER.labels(self.origin.template_name or '<string>').observe(time.perf_counter() - start)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing every render of a template."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def fragment_name(key):
+    # {% cache %} keys are "template.cache.<fragment name>.<hash>".
+    parts = key.split('.')
+    return parts[2] if len(parts) == 4 and parts[:2] == ['template', 'cache'] else '<other>'
+
+
+class CountedCache:
+    """
+    A cache backend wrapping the one in OPTIONS['CACHE'], counting the hits
+    and misses of its lookups by fragment name.
+    """
+
+    def __init__(self, location, params):
+        inner = dict(params['OPTIONS']['CACHE'])
+        backend = import_string(inner.pop('BACKEND'))
+        self.cache = backend(inner.pop('LOCATION', ''), inner)
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+    def count(self, key, value, default):
+        FRAGMENT_CACHE.labels(fragment_name(key), 'misses' if value is default else 'hits').inc()
+        return value
+
+    def get(self, key, default=None, version=None):
+        return self.count(key, self.cache.get(key, default, version), default)
+
+    async def aget(self, key, default=None, version=None):
+        return self.count(key, await self.cache.aget(key, default, version), default)
+
+
+def registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    merged = CollectorRegistry()
+    multiprocess.MultiProcessCollector(merged)
+    return merged
+
+
+@require_safe
+def metrics_view(request):
+    if not settings.BLOG_METRICS:
+        raise Http404
+    token = settings.BLOG_METRICS_TOKEN
+    if token and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
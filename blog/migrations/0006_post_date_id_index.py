@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_alter_comment_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-date', '-id'], name='blog_post_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(excerpt, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE blog_post ADD COLUMN search_vector tsvector')
+        schema_editor.execute(f'UPDATE blog_post SET search_vector = {POSTGRES_VECTOR}')
+        schema_editor.execute(
+            'CREATE INDEX blog_post_search_vector_idx ON blog_post USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE blog_post_fts USING fts5("
+            "title, excerpt, content, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            'INSERT INTO blog_post_fts (rowid, title, excerpt, content) '
+            'SELECT id, title, excerpt, content FROM blog_post'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS blog_post_search_vector_idx')
+        schema_editor.execute('ALTER TABLE blog_post DROP COLUMN IF EXISTS search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS blog_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_post_date_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing_rows(apps, schema_editor):
+    using = schema_editor.connection.alias
+    Comment = apps.get_model('blog', 'Comment')
+    Post = apps.get_model('blog', 'Post')
+    Tag = apps.get_model('blog', 'Tag')
+    PostTags = Post.tags.through
+
+    comments = Comment.objects.filter(post=OuterRef('pk')).values('post').annotate(total=Count('id')).values('total')
+    Post.objects.using(using).update(comment_count=Coalesce(Subquery(comments), 0))
+
+    posts = PostTags.objects.filter(tag=OuterRef('pk')).values('tag').annotate(total=Count('id')).values('total')
+    Tag.objects.using(using).update(post_count=Coalesce(Subquery(posts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_comment_post_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing_rows, migrations.RunPython.noop),
+    ]
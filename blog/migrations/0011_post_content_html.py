@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:15
+
+from django.db import migrations, models
+from django.utils.html import linebreaks
+
+
+def render_existing_posts(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    posts = Post.objects.using(schema_editor.connection.alias).only('id', 'content')
+    batch = []
+    for post in posts.iterator(chunk_size=500):
+        post.content_html = linebreaks(post.content, autoescape=True)
+        batch.append(post)
+        if len(batch) == 500:
+            Post.objects.using(schema_editor.connection.alias).bulk_update(batch, ['content_html'])
+            batch = []
+    Post.objects.using(schema_editor.connection.alias).bulk_update(batch, ['content_html'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_post_comment_count_tag_post_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_existing_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:23
+
+import blog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_post_image_description'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(null=True, storage=blog.storage.post_image_storage, upload_to='posts'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-18 05:10
+
+import time
+
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    ContentVersion = apps.get_model('blog', 'ContentVersion')
+    ContentVersion.objects.using(schema_editor.connection.alias).create(pk=1, version=time.time_ns())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_post_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
@@ -1,28 +1,149 @@
-from django.db import models
+import time
+
+from django.db import models, router
+from django.db.models import OuterRef, Subquery
 from django.core.validators import MinLengthValidator
 
+from .images import describe_image, open_image
+from .rendering import render_content
+from .storage import post_image_storage
+
 # Create your models here.
 
+
+def exclude_counters(instance, counters, kwargs):
+    """
+    Leave the ``counters`` out of a full save() of an existing row.
+
+    The signal handlers keep counters current with F() updates, so the value
+    loaded with the instance may be stale by the time it is saved; writing
+    it back would undo the increments made since. update_fields naming a
+    counter still writes it.
+    """
+    if instance._state.adding or kwargs.get('force_insert') or kwargs.get('update_fields') is not None:
+        return
+    using = kwargs.get('using') or router.db_for_write(type(instance), instance=instance)
+    if using != instance._state.db:
+        return
+    kwargs['update_fields'] = [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in counters
+    ]
+
 class Comment(models.Model):
     id = models.AutoField(primary_key=True)
     user_name = models.CharField(max_length=130)
     user_mail = models.EmailField()
     text = models.TextField(max_length=400)
     post = models.ForeignKey('Post', on_delete=models.CASCADE, related_name='comments')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Comments are always read per post, newest first, and paged with
+            # an id cursor.
+            models.Index(fields=['post', '-id'], name='blog_comment_post_id_idx'),
+            # sync_backup's high-water mark for comments.
+            models.Index(fields=['updated_at'], name='blog_comment_updated_at_idx'),
+            # A post's last comment edit, which versions its detail page.
+            models.Index(fields=['post', '-updated_at'], name='blog_comment_post_updated_idx'),
+        ]
+
+class PostQuerySet(models.QuerySet):
+
+    def for_listing(self):
+        """Posts as rendered by the post cards, with their author joined in."""
+        return self.select_related('author').defer('content', 'content_html').order_by('-date', '-id')
+
+    def with_latest_comment_id(self):
+        """Annotate the id of the newest comment, which versions the cached comment list."""
+        latest_comment = Comment.objects.filter(post=OuterRef('pk')).order_by('-id').values('id')[:1]
+        return self.annotate(latest_comment_id=Subquery(latest_comment))
+
+    def for_detail(self):
+        """
+        Posts with the author joined, the tags fetched in one extra query and
+        the id of the newest comment. Pages show content_html, so the raw
+        content is left out.
+        """
+        return self.select_related('author').prefetch_related('tags').defer('content').with_latest_comment_id()
+
 
 class Post(models.Model):
     title = models.CharField(max_length=150)
     excerpt = models.CharField(max_length=200)
-    image = models.ImageField(upload_to='posts', null=True)
+    image = models.ImageField(upload_to='posts', null=True, storage=post_image_storage)
+    # Widths of the resized copies of image built by blog.images; empty until
+    # they have been generated.
+    image_widths = models.JSONField(default=list, blank=True, editable=False)
+    # Description of image taken when it is uploaded, so that pages never
+    # have to open the file; see blog.images.describe_image().
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False)
     date = models.DateField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True)
     slug = models.SlugField(unique=True)
     content = models.TextField(validators=[MinLengthValidator(10)])
+    # content rendered by blog.rendering.render_content() on save.
+    content_html = models.TextField(blank=True, editable=False)
     author = models.ForeignKey('Author', on_delete=models.SET_NULL, related_name='posts', null=True)
     tags = models.ManyToManyField('Tag', blank=True)
+    # Maintained by the signal handlers in blog/signals.py; rebuild with
+    # `manage.py repair_counters` after writes that skip signals.
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Matches the (-date, -id) ordering of the listings and the
+            # keyset cursor, so every listing page is an index range scan.
+            models.Index(fields=['-date', '-id'], name='blog_post_date_id_idx'),
+            # The newest updated_at, sync_backup's high-water mark, is read
+            # off the end of this index.
+            models.Index(fields=['updated_at'], name='blog_post_updated_at_idx'),
+            # An author's posts in the listing order, for the admin's author
+            # filter.
+            models.Index(fields=['author', '-date', '-id'], name='blog_post_author_date_idx'),
+            # The admin's comments filter.
+            models.Index(fields=['comment_count'], name='blog_post_comment_count_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    IMAGE_DESCRIPTION_FIELDS = ('image_width', 'image_height', 'image_color', 'image_placeholder')
+
+    def describe_image(self):
+        """Set the image description fields from the image file."""
+        if self.image:
+            self.image.seek(0)
+            description = describe_image(open_image(self.image))
+            self.image.seek(0)
+        else:
+            description = {'image_width': None, 'image_height': None, 'image_color': '', 'image_placeholder': ''}
+        for field, value in description.items():
+            setattr(self, field, value)
+
+    def save(self, *args, **kwargs):
+        exclude_counters(self, {'comment_count'}, kwargs)
+        self.content_html = render_content(self.content)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'content' in update_fields:
+            update_fields = kwargs['update_fields'] = {*update_fields, 'content_html'}
+
+        # A file that has not been committed to storage yet is a new upload,
+        # whose derivatives are scheduled by blog.signals once it is saved.
+        self._image_uploaded = bool(self.image) and not self.image._committed
+        if self._image_uploaded or not self.image:
+            self.image_widths = []
+            self.describe_image()
+            if update_fields is not None and 'image' in update_fields:
+                kwargs['update_fields'] = {*update_fields, *self.IMAGE_DESCRIPTION_FIELDS, 'image_widths'}
+        super().save(*args, **kwargs)
+
 class Author(models.Model):
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
@@ -37,6 +158,37 @@ class Author(models.Model):
 
 class Tag(models.Model):
     caption = models.CharField(max_length=20)
+    post_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
-        return self.caption
\ No newline at end of file
+        return self.caption
+
+    def save(self, *args, **kwargs):
+        exclude_counters(self, {'post_count'}, kwargs)
+        super().save(*args, **kwargs)
+
+
+class ContentVersion(models.Model):
+    """
+    A single row whose version changes whenever a post, tag or author does.
+    It keys the page cache and the listing validators, and lives in the
+    database so that every worker process sees the same version.
+    """
+    SITE = 1
+
+    version = models.BigIntegerField(default=0)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=cls.SITE).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    async def acurrent(cls):
+        return await cls.objects.filter(pk=cls.SITE).values_list('version', flat=True).afirst() or 0
+
+    @classmethod
+    def bump(cls, using=None):
+        # A fresh timestamp rather than an increment: it doubles as the
+        # listings' Last-Modified, and never reuses an old version.
+        cls.objects.db_manager(using).update_or_create(pk=cls.SITE, defaults={'version': time.time_ns()})
+
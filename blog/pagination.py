@@ -0,0 +1,149 @@
+import base64
+import datetime
+import json
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class KeysetPage:
+    """One page of a keyset pagination, with opaque cursors to its neighbours."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class KeysetPaginator:
+    """
+    Cursor based paginator over a queryset ordered on ``(-date, -id)``.
+
+    Unlike django.core.paginator.Paginator it never runs a COUNT and never
+    uses OFFSET: each page is a range scan starting right after the row the
+    cursor points at, so every page costs the same however deep it is.
+    """
+
+    page_class = KeysetPage
+
+    def __init__(self, queryset, per_page, date_field='date'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.date_field = date_field
+
+    def encode_cursor(self, obj, backwards=False):
+        value = getattr(obj, self.date_field).isoformat()
+        payload = json.dumps([value, obj.pk, int(backwards)], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            value, pk, backwards = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.date.fromisoformat(value), int(pk), bool(backwards)
+        except (ValueError, TypeError):
+            raise Http404('Invalid cursor')
+
+    def page_queryset(self, cursor):
+        """The queryset of the page after ``cursor``, with one row extra."""
+        date = self.date_field
+        queryset = self.queryset
+
+        if cursor:
+            value, pk, backwards = self.decode_cursor(cursor)
+            # The redundant bound on the date alone lets the database seek
+            # into the (date, id) index instead of scanning it for the OR.
+            if backwards:
+                queryset = queryset.filter(**{f'{date}__gte': value}).filter(
+                    Q(**{f'{date}__gt': value}) | Q(pk__gt=pk)
+                ).order_by(date, 'pk')
+            else:
+                queryset = queryset.filter(**{f'{date}__lte': value}).filter(
+                    Q(**{f'{date}__lt': value}) | Q(pk__lt=pk)
+                ).order_by(f'-{date}', '-pk')
+        else:
+            queryset = queryset.order_by(f'-{date}', '-pk')
+
+        # One extra row tells us whether there is anything past this page.
+        return queryset[:self.per_page + 1]
+
+    def make_page(self, rows, cursor):
+        backwards = bool(cursor) and self.decode_cursor(cursor)[2]
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(cursor)
+
+        next_cursor = self.encode_cursor(rows[-1]) if rows and has_next else None
+        previous_cursor = self.encode_cursor(rows[0], backwards=True) if rows and has_previous else None
+        return self.page_class(rows, next_cursor, previous_cursor)
+
+    def page(self, cursor=None):
+        return self.make_page(list(self.page_queryset(cursor)), cursor)
+
+    async def apage(self, cursor=None):
+        return self.make_page([row async for row in self.page_queryset(cursor)], cursor)
+
+
+class CommentPage:
+    """
+    The comments of a post older than ``before``, newest first.
+
+    The page is queried on first use, so when the template fragment that
+    renders it is already cached no query runs at all. ``next_cursor`` is the
+    id to pass as ``before`` for the following page.
+    """
+
+    def __init__(self, queryset, per_page, before=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.before = before
+
+    @cached_property
+    def _rows(self):
+        queryset = self.queryset.order_by('-id')
+        if self.before is not None:
+            queryset = queryset.filter(id__lt=self.before)
+        return list(queryset[:self.per_page + 1])
+
+    @property
+    def object_list(self):
+        return self._rows[:self.per_page]
+
+    @property
+    def next_cursor(self):
+        if len(self._rows) > self.per_page:
+            return self.object_list[-1].id
+        return None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
@@ -0,0 +1,74 @@
+"""
+Statistics on this process's connections to the primary database.
+
+With DATABASE_POOL=True connections come from Django's psycopg connection
+pool, whose own counters give the checkouts and the time spent waiting for a
+free connection. Otherwise every connection opened is counted, so the share
+of requests that reused a persistent (DATABASE_CONN_MAX_AGE) connection
+rather than paying for a new handshake shows up. The counters are logged to
+the ``blog.db`` logger every DATABASE_STATS_SECONDS.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger('blog.db')
+
+_lock = threading.Lock()
+_counts = Counter()
+_last_logged = time.monotonic()
+
+
+def get_pool(alias=DEFAULT_DB_ALIAS):
+    """The alias's connection pool, or None if it is not pooled or not in use yet."""
+    # The DatabaseWrapper.pool property would create the pool.
+    return getattr(connections[alias], '_connection_pools', {}).get(alias)
+
+
+def count(event):
+    with _lock:
+        _counts[event] += 1
+
+
+def connection_stats(alias=DEFAULT_DB_ALIAS):
+    """This process's connection counters for ``alias``."""
+    with _lock:
+        stats = {
+            'requests': _counts['requests'],
+            'connections_opened': _counts[f'opened:{alias}'],
+        }
+    pool = get_pool(alias)
+    if pool is not None:
+        pool_stats = pool.get_stats()
+        stats.update({
+            # Django "connects" on every checkout; the pool counts handshakes.
+            'connections_opened': pool_stats.get('connections_num', 0),
+            'pool_size': pool_stats.get('pool_size', 0),
+            'pool_available': pool_stats.get('pool_available', 0),
+            'checkouts': pool_stats.get('requests_num', 0),
+            'checkouts_waited': pool_stats.get('requests_queued', 0),
+            'checkout_wait_ms': pool_stats.get('requests_wait_ms', 0),
+            'checkout_errors': pool_stats.get('requests_errors', 0),
+            'connections_lost': pool_stats.get('connections_lost', 0) + pool_stats.get('returns_bad', 0),
+        })
+    return stats
+
+
+def log_connection_stats():
+    """Log the counters if DATABASE_STATS_SECONDS have passed since the last time."""
+    global _last_logged
+    interval = settings.DATABASE_STATS_SECONDS
+    now = time.monotonic()
+    if not interval or now - _last_logged < interval:
+        return
+    with _lock:
+        if now - _last_logged < interval:
+            return
+        _last_logged = now
+    stats = connection_stats()
+    logger.info('pid %s: %s', os.getpid(), ' '.join(f'{key}={value}' for key, value in stats.items()))
@@ -0,0 +1,210 @@
+"""
+Sampled request profiling, switched on with BLOG_PROFILER.
+
+ProfilerMiddleware profiles a BLOG_PROFILER_SAMPLE_RATE fraction of the
+requests, and any request that asks for it: with an ``X-Profile`` header
+carrying BLOG_PROFILER_TOKEN, or from a staff user with an ``X-Profile``
+header or a ``_profile`` query parameter. Everything below the middleware
+is covered: the view, template rendering and the ORM.
+
+While a request runs, a thread samples its call stack every
+BLOG_PROFILER_INTERVAL seconds. The stacks are written to BLOG_PROFILER_DIR
+in the folded format of flamegraph.pl, inferno and speedscope (one
+``outer;inner;innermost <microseconds>`` line per distinct stack), next to a
+JSON description of the request. The admin lists them at /admin/profiles/,
+and the BLOG_PROFILER_KEEP most recent ones are kept.
+
+Under ASGI the middleware runs in the request's sync thread, so the async
+views' sync work (queries, rendering) is sampled but their coroutines are
+not.
+"""
+import json
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+
+CAPTURE_ID_RE = re.compile(r'^[0-9]+-[0-9a-f]{8}$')
+
+
+def path_prefixes():
+    """Directory prefixes cut from file names, longest first."""
+    return sorted({str(settings.BASE_DIR), *(path for path in sys.path if path)}, key=len, reverse=True)
+
+
+def frame_label(code, prefixes):
+    filename = code.co_filename
+    for prefix in prefixes:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip(os.sep)
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class Sampler(threading.Thread):
+    """Samples the stack of ``thread_id`` below ``root`` until stopped."""
+
+    def __init__(self, thread_id, root, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.prefixes = path_prefixes()
+        self.labels = {}
+        self.done = threading.Event()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None and frame is not self.root:
+                label = self.labels.get(frame.f_code)
+                if label is None:
+                    label = self.labels[frame.f_code] = frame_label(frame.f_code, self.prefixes)
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                # Weighted by the time since the last sample, which varies
+                # with how long this thread waited for the GIL.
+                self.stacks[';'.join(reversed(stack))] += round((now - last) * 1_000_000)
+                self.samples += 1
+            last = now
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+
+def profiler_dir():
+    return Path(settings.BLOG_PROFILER_DIR)
+
+
+def save_capture(request, response, seconds, sampler):
+    directory = profiler_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    capture_id = f'{time.time_ns()}-{secrets.token_hex(4)}'
+    match = request.resolver_match
+    folded = ''.join(f'{stack} {weight}\n' for stack, weight in sampler.stacks.items())
+    (directory / f'{capture_id}.folded').write_text(folded)
+    (directory / f'{capture_id}.json').write_text(json.dumps({
+        'id': capture_id,
+        'route': match.view_name if match else '',
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(seconds * 1000, 1),
+        'samples': sampler.samples,
+        'created': time.time(),
+    }))
+    prune(directory)
+    return capture_id
+
+
+def prune(directory):
+    descriptions = sorted(directory.glob('*.json'), reverse=True)
+    for description in descriptions[settings.BLOG_PROFILER_KEEP:]:
+        description.with_suffix('.folded').unlink(missing_ok=True)
+        description.unlink(missing_ok=True)
+
+
+def recent_captures(limit=200):
+    """Descriptions of the most recent captures, newest first."""
+    directory = profiler_dir()
+    if not directory.is_dir():
+        return []
+    captures = []
+    for description in sorted(directory.glob('*.json'), reverse=True)[:limit]:
+        try:
+            captures.append(json.loads(description.read_text()))
+        except (OSError, ValueError):
+            continue
+    return captures
+
+
+def capture_path(capture_id):
+    """The folded stacks of a capture, or None if there is no such capture."""
+    if not CAPTURE_ID_RE.match(capture_id):
+        return None
+    path = profiler_dir() / f'{capture_id}.folded'
+    return path if path.is_file() else None
+
+
+class ProfilerMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.BLOG_PROFILER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def wants_profile(self, request):
+        if random.random() < settings.BLOG_PROFILER_SAMPLE_RATE:
+            return True
+        header = request.headers.get('X-Profile')
+        token = settings.BLOG_PROFILER_TOKEN
+        if header and token and secrets.compare_digest(header, token):
+            return True
+        if header is not None or '_profile' in request.GET:
+            user = getattr(request, 'user', None)
+            return bool(user and user.is_staff)
+        return False
+
+    def __call__(self, request):
+        if not self.wants_profile(request):
+            return self.get_response(request)
+
+        sampler = Sampler(threading.get_ident(), sys._getframe(), settings.BLOG_PROFILER_INTERVAL)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        finally:
+            sampler.stop()
+        response['X-Profile-Id'] = save_capture(request, response, time.perf_counter() - start, sampler)
+        return response
+
+
+def profile_list(request):
+    """The admin's list of captures, filterable by route and sortable by duration."""
+    captures = recent_captures()
+    routes = sorted({capture['route'] for capture in captures})
+    route = request.GET.get('route')
+    if route:
+        captures = [capture for capture in captures if capture['route'] == route]
+    for capture in captures:
+        capture['created'] = datetime.fromtimestamp(capture['created'], timezone.utc)
+    order = request.GET.get('o')
+    if order == 'duration':
+        captures.sort(key=lambda capture: capture['duration_ms'], reverse=True)
+    return TemplateResponse(request, 'admin/blog/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'captures': captures,
+        'routes': routes,
+        'route': route,
+        'order': order,
+    })
+
+
+def profile_download(request, capture_id):
+    path = capture_path(capture_id)
+    if path is None:
+        raise Http404('No such profile')
+    return FileResponse(path.open('rb'), as_attachment=True, filename=path.name, content_type='text/plain')
@@ -0,0 +1,14 @@
+"""
+Rendering of post bodies to HTML.
+
+Posts are rendered once when they are saved and the result is stored in
+``Post.content_html``, so pages never pay for it per request. Keep this in
+step with the output templates would produce, and run
+``manage.py render_posts`` after changing it.
+"""
+from django.utils.html import linebreaks
+
+
+def render_content(content):
+    """The HTML of a post body: escaped, with paragraphs and line breaks."""
+    return linebreaks(content, autoescape=True)
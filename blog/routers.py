@@ -0,0 +1,142 @@
+"""
+Read replica routing for the blog.
+
+With BLOG_READ_REPLICA set to a database alias, ReplicaRoutingMiddleware
+sends the blog's reads during safe (GET/HEAD) requests to that replica. All
+writes, and every read outside such requests, go to the primary (``default``).
+
+A visitor who has just written something (any unsafe request) carries a
+cookie for BLOG_REPLICA_PIN_SECONDS that keeps their reads on the primary,
+so they see their own comment or read-later change even while the replica
+lags behind.
+
+If the primary cannot be reached, a safe request is retried with every read
+on the replica and the primary is left alone for BLOG_FAILOVER_SECONDS. The
+blog stays up read-only until the primary is back.
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+PIN_COOKIE = 'blog_primary'
+
+# How reads are routed during the current request: 'primary', 'replica' (the
+# blog's reads go to the replica) or 'failover' (every read does).
+_routing = ContextVar('blog_db_routing', default='primary')
+
+_lock = threading.Lock()
+_primary_down_until = 0.0
+
+
+def primary_is_down():
+    return time.monotonic() < _primary_down_until
+
+
+def mark_primary_down():
+    global _primary_down_until
+    with _lock:
+        _primary_down_until = time.monotonic() + settings.BLOG_FAILOVER_SECONDS
+
+
+def primary_is_reachable():
+    """Whether a new connection to the primary can be made."""
+    connection = connections[DEFAULT_DB_ALIAS]
+    try:
+        connection.close()
+        connection.ensure_connection()
+    except OperationalError:
+        return False
+    return True
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replica = settings.BLOG_READ_REPLICA
+        if not replica:
+            return None
+        routing = _routing.get()
+        if routing == 'failover' or (routing == 'replica' and model._meta.app_label == 'blog'):
+            return replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS if settings.BLOG_READ_REPLICA else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds copies of the primary's rows.
+        aliases = {DEFAULT_DB_ALIAS, settings.BLOG_READ_REPLICA}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.BLOG_READ_REPLICA:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def routing(self, request):
+        safe = request.method in ('GET', 'HEAD')
+        if safe and primary_is_down():
+            return 'failover'
+        if safe and PIN_COOKIE not in request.COOKIES:
+            return 'replica'
+        return 'primary'
+
+    def pin(self, request, response):
+        if request.method not in ('GET', 'HEAD') and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.BLOG_REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax', secure=request.is_secure()
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _routing.set(self.routing(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = _routing.set(self.routing(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(request, response)
+
+    def process_exception(self, request, exception):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or not isinstance(exception, OperationalError)
+            or _routing.get() == 'failover'
+            or primary_is_reachable()
+        ):
+            return None
+
+        mark_primary_down()
+        token = _routing.set('failover')
+        try:
+            # Exception middleware always runs synchronously, in a thread
+            # of its own when the chain is async.
+            if iscoroutinefunction(self):
+                return async_to_sync(self.get_response)(request)
+            return self.get_response(request)
+        finally:
+            _routing.reset(token)
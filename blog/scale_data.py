@@ -0,0 +1,212 @@
+"""
+Generated authors, tags, posts and comments at production volumes, used by
+``manage.py generate_scale_data`` to load-test and benchmark the blog.
+
+Everything is derived from a seed, so a given set of options always produces
+the same rows. Comments are split over the posts by a Zipf law: with a skew of
+1 the busiest post gets about as many comments as the next two together, and
+a few percent of the posts get most of them. The comments of each slice of
+posts come from a generator seeded with the slice's number, so they are the
+same whether the slices are written by one process or by a pool of workers.
+
+Rows are written with bulk_create() in batches, which skips model signals:
+posts are created with their comment counts, tag counts are computed once
+the posts are in, and the search index is rebuilt at the end.
+"""
+import datetime
+import random
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Case, Value, When
+from django.utils.text import slugify
+from PIL import Image, ImageDraw
+
+from .counters import actual_post_count
+from .images import describe_image, make_executor
+from .models import Author, Comment, ContentVersion, Post, Tag
+from .rendering import render_content
+from .search import get_search_backend
+
+PostTag = Post.tags.through
+
+WORDS = (
+    'mountain', 'forest', 'river', 'summit', 'trail', 'valley', 'lake', 'ridge', 'dawn', 'dusk',
+    'code', 'python', 'django', 'query', 'index', 'cache', 'server', 'latency', 'deploy', 'test',
+    'coffee', 'journey', 'weekend', 'notes', 'lessons', 'guide', 'story', 'week', 'season', 'light',
+    'quiet', 'fast', 'slow', 'simple', 'better', 'first', 'last', 'long', 'small', 'wild',
+)
+FIRST_NAMES = ('Ada', 'Alan', 'Grace', 'Linus', 'Margaret', 'Guido', 'Barbara', 'Ken', 'Radia', 'Donald')
+LAST_NAMES = ('Lovelace', 'Turing', 'Hopper', 'Torvalds', 'Hamilton', 'Rossum', 'Liskov', 'Thompson', 'Perlman', 'Knuth')
+
+# Posts per slice of comment generation, the unit of work of the workers.
+POSTS_PER_SLICE = 1000
+
+
+def sentence(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def comment_counts(posts, comments, skew, rng):
+    """Split ``comments`` over ``posts`` by a Zipf law with exponent ``skew``."""
+    if not posts:
+        return []
+    weights = [1 / rank ** skew for rank in range(1, posts + 1)]
+    total = sum(weights)
+    counts = [int(comments * weight / total) for weight in weights]
+    for rank in range(comments - sum(counts)):
+        counts[rank % posts] += 1
+    # The busiest posts are scattered rather than the oldest ones.
+    rng.shuffle(counts)
+    return counts
+
+
+def make_images(count, rng):
+    """Store ``count`` generated photos; returns their names and descriptions."""
+    storage = Post._meta.get_field('image').storage
+    upload_to = Post._meta.get_field('image').upload_to
+    images = []
+    for number in range(count):
+        image = Image.new('RGB', (1280, 853), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(12):
+            x, y = rng.randrange(1280), rng.randrange(853)
+            draw.ellipse((x, y, x + rng.randint(40, 400), y + rng.randint(40, 400)),
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=80)
+        name = storage.save(f'{upload_to}/scale-{number}.jpg', ContentFile(buffer.getvalue()))
+        images.append((name, describe_image(image)))
+    return images
+
+
+def create_authors(using, count, rng):
+    authors = []
+    for number in range(count):
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        authors.append(Author(
+            first_name=first_name,
+            last_name=last_name,
+            email_address=f'{first_name}.{last_name}.{number}@example.com'.lower(),
+        ))
+    return [author.pk for author in Author.objects.using(using).bulk_create(authors)]
+
+
+def create_tags(using, count):
+    Tag.objects.using(using).bulk_create([Tag(caption=f'tag-{number}') for number in range(count)])
+
+
+def create_posts(using, options, author_ids, images, counts, rng):
+    """Create the posts, newest last, with their tag links; returns their ids."""
+    total, batch_size = options['posts'], options['batch_size']
+    tag_ids = list(Tag.objects.using(using).order_by('pk').values_list('pk', flat=True))
+    today = datetime.date.today()
+    post_ids = []
+    for start in range(0, total, batch_size):
+        numbers = range(start, min(start + batch_size, total))
+        posts = []
+        for number in numbers:
+            title = sentence(rng, 3, 7).capitalize()
+            content = '\n\n'.join(sentence(rng, 20, 80).capitalize() + '.' for _ in range(rng.randint(3, 8)))
+            image, description = rng.choice(images) if images else ('', {})
+            posts.append(Post(
+                title=title,
+                excerpt=sentence(rng, 8, 20).capitalize(),
+                slug=f'{slugify(title)[:40]}-{number}',
+                content=content,
+                content_html=render_content(content),
+                author_id=rng.choice(author_ids) if author_ids else None,
+                image=image,
+                comment_count=counts[number],
+                **description,
+            ))
+        with transaction.atomic(using=using):
+            posts = Post.objects.using(using).bulk_create(posts)
+            # date is auto_now, so spread the posts over the days afterwards.
+            days = {}
+            for number, post in zip(numbers, posts):
+                day = today - datetime.timedelta(days=(total - 1 - number) * options['days'] // total)
+                days.setdefault(day, []).append(post.pk)
+            # Each day's posts were inserted one after the other.
+            Post.objects.using(using).filter(pk__in=[post.pk for post in posts]).update(
+                date=Case(*(When(pk__range=(min(pks), max(pks)), then=Value(day)) for day, pks in days.items()))
+            )
+            links = []
+            for post in posts:
+                for tag_id in rng.sample(tag_ids, min(options['tags_per_post'], len(tag_ids))):
+                    links.append(PostTag(post_id=post.pk, tag_id=tag_id))
+            PostTag.objects.using(using).bulk_create(links)
+        post_ids.extend(post.pk for post in posts)
+    Tag.objects.using(using).update(post_count=actual_post_count())
+    return post_ids
+
+
+def create_comments(using, slice_number, post_ids, counts, seed, batch_size):
+    """Create the comments of one slice of posts; returns how many."""
+    rng = random.Random(f'{seed}-comments-{slice_number}')
+    created = 0
+    batch = []
+    for post_id, count in zip(post_ids, counts):
+        for _ in range(count):
+            name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+            batch.append(Comment(
+                user_name=name,
+                user_mail=f'{slugify(name)}@example.com',
+                text=sentence(rng, 5, 50).capitalize()[:400],
+                post_id=post_id,
+            ))
+            if len(batch) == batch_size:
+                Comment.objects.using(using).bulk_create(batch)
+                created += len(batch)
+                batch = []
+    if batch:
+        Comment.objects.using(using).bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def create_comments_in_worker(*args):
+    try:
+        return create_comments(*args)
+    finally:
+        connections.close_all()
+
+
+def generate(using, options, progress=lambda phase, rows: None):
+    """
+    Generate the rows described by ``options`` (the generate_scale_data
+    command's) in ``using``, calling ``progress`` after each phase.
+    """
+    rng = random.Random(options['seed'])
+    counts = comment_counts(options['posts'], options['comments'], options['skew'], rng)
+
+    images = make_images(options['images'], rng)
+    progress('images', len(images))
+    author_ids = create_authors(using, options['authors'], rng)
+    progress('authors', len(author_ids))
+
+    create_tags(using, options['tags'])
+    progress('tags', options['tags'])
+
+    post_ids = create_posts(using, options, author_ids, images, counts, rng)
+    progress('posts', len(post_ids))
+
+    slices = [
+        (using, number, post_ids[start:start + POSTS_PER_SLICE], counts[start:start + POSTS_PER_SLICE],
+         options['seed'], options['batch_size'])
+        for number, start in enumerate(range(0, len(post_ids), POSTS_PER_SLICE))
+    ]
+    if options['workers'] > 1:
+        with make_executor(options['workers']) as executor:
+            comments = sum(executor.map(create_comments_in_worker, *zip(*slices)))
+    else:
+        comments = sum(create_comments(*arguments) for arguments in slices)
+    progress('comments', comments)
+
+    with transaction.atomic(using=using):
+        get_search_backend(using).rebuild()
+    progress('search index', len(post_ids))
+    # bulk_create() sent no signals, so retire any cached pages here.
+    ContentVersion.bump(using)
+
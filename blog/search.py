@@ -0,0 +1,186 @@
+"""
+Ranked full-text search over posts.
+
+Postgres keeps a weighted ``tsvector`` in ``blog_post.search_vector`` with a
+GIN index on it; SQLite keeps an FTS5 virtual table, ``blog_post_fts``, keyed
+on the post id. Both are created by migration 0007 and kept in sync one post
+at a time by the signal handlers in blog/signals.py.
+"""
+from django.db import connections
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+# Highlight markers put around matched terms by the database. They are
+# private use characters so that the excerpt can be HTML-escaped first and
+# the markers turned into <mark> tags afterwards.
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_STOP = '\ue001'
+
+
+def highlight(excerpt):
+    """Escape an excerpt returned by a backend and mark up its matched terms."""
+    html = escape(excerpt).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+    return mark_safe(html)
+
+
+class PostgresSearchBackend:
+    vector_sql = (
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(excerpt, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(content, '')), 'C')"
+    )
+    headline_options = (
+        f'StartSel="{HIGHLIGHT_START}", StopSel="{HIGHLIGHT_STOP}", '
+        'MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=" … "'
+    )
+
+    def __init__(self, using):
+        self.using = using
+
+    def index_post(self, post_id):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f'UPDATE blog_post SET search_vector = {self.vector_sql} WHERE id = %s', [post_id]
+            )
+
+    def remove_post(self, post_id):
+        # The vector lives on the post row and goes away with it.
+        pass
+
+    def rebuild(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'UPDATE blog_post SET search_vector = {self.vector_sql}')
+
+    def count(self, query):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM blog_post "
+                "WHERE search_vector @@ websearch_to_tsquery('english', %s)",
+                [query]
+            )
+            return cursor.fetchone()[0]
+
+    def search(self, query, offset, limit):
+        # Rank and page in the inner query so ts_headline only runs over the
+        # rows that are actually shown.
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                "SELECT page.id, page.rank, ts_headline('english', p.content, page.query, %s) "
+                "FROM ("
+                "  SELECT id, query, ts_rank_cd(search_vector, query) AS rank "
+                "  FROM blog_post, websearch_to_tsquery('english', %s) AS query "
+                "  WHERE search_vector @@ query "
+                "  ORDER BY rank DESC, id DESC LIMIT %s OFFSET %s"
+                ") AS page JOIN blog_post p ON p.id = page.id "
+                "ORDER BY page.rank DESC, page.id DESC",
+                [self.headline_options, query, limit, offset]
+            )
+            return cursor.fetchall()
+
+
+class SQLiteSearchBackend:
+
+    def __init__(self, using):
+        self.using = using
+
+    @staticmethod
+    def match_expression(query):
+        # Quote every term so user input can never be parsed as FTS5 syntax;
+        # adjacent quoted terms are ANDed together.
+        terms = query.split()
+        return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+    def index_post(self, post_id):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('DELETE FROM blog_post_fts WHERE rowid = %s', [post_id])
+            cursor.execute(
+                'INSERT INTO blog_post_fts (rowid, title, excerpt, content) '
+                'SELECT id, title, excerpt, content FROM blog_post WHERE id = %s',
+                [post_id]
+            )
+
+    def remove_post(self, post_id):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('DELETE FROM blog_post_fts WHERE rowid = %s', [post_id])
+
+    def rebuild(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('DELETE FROM blog_post_fts')
+            cursor.execute(
+                'INSERT INTO blog_post_fts (rowid, title, excerpt, content) '
+                'SELECT id, title, excerpt, content FROM blog_post'
+            )
+
+    def count(self, query):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                'SELECT count(*) FROM blog_post_fts WHERE blog_post_fts MATCH %s',
+                [self.match_expression(query)]
+            )
+            return cursor.fetchone()[0]
+
+    def search(self, query, offset, limit):
+        # bm25() is lower for better matches; title and excerpt hits weigh
+        # more than body hits, like the Postgres setweight() classes.
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid, -bm25(blog_post_fts, 10.0, 4.0, 1.0) AS rank, '
+                'snippet(blog_post_fts, -1, %s, %s, %s, 32) '
+                'FROM blog_post_fts WHERE blog_post_fts MATCH %s '
+                'ORDER BY rank DESC, rowid DESC LIMIT %s OFFSET %s',
+                [HIGHLIGHT_START, HIGHLIGHT_STOP, ' … ', self.match_expression(query), limit, offset]
+            )
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend(using='default'):
+    return BACKENDS[connections[using].vendor](using)
+
+
+class SearchResults:
+    """
+    Lazily evaluated search results that django.core.paginator.Paginator can
+    page through: ``count()`` runs the match count and slicing runs one ranked
+    query for that page, plus one query loading the matching posts.
+    """
+
+    def __init__(self, query, using='default'):
+        self.query = query.strip()
+        self.using = using
+        self.backend = get_search_backend(using)
+
+    def count(self):
+        if not self.query:
+            return 0
+        return self.backend.count(self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.query:
+            return []
+
+        offset = index.start or 0
+        rows = self.backend.search(self.query, offset, index.stop - offset)
+        posts = Post.objects.using(self.using).for_listing().in_bulk([row[0] for row in rows])
+
+        results = []
+        for post_id, rank, excerpt in rows:
+            post = posts.get(post_id)
+            if post is None:
+                continue
+            post.search_rank = rank
+            post.search_excerpt = highlight(excerpt)
+            results.append(post)
+        return results
@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import page_cache
+from .counters import change_comment_count, change_post_count
+from .images import schedule_derivatives
+from .metrics import install_query_recorder
+from .models import Author, Comment, Post, Tag
+from .pool import count, log_connection_stats
+from .search import get_search_backend
+from .slow_queries import install_slow_query_log
+
+
+@receiver(post_save, sender=Post)
+def index_post_for_search(sender, instance, using, **kwargs):
+    get_search_backend(using).index_post(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_search(sender, instance, using, **kwargs):
+    get_search_backend(using).remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def build_image_derivatives(sender, instance, using, **kwargs):
+    if not settings.BLOG_IMAGE_DERIVATIVES or not instance.__dict__.pop('_image_uploaded', False):
+        return
+    # The workers read the post in their own connection, so wait until it
+    # has been committed.
+    post_id, name = instance.pk, instance.image.name
+    transaction.on_commit(lambda: schedule_derivatives(post_id, name, using), using=using)
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Author)
+def invalidate_cached_pages(sender, using, **kwargs):
+    # Wait for the commit so that no request can cache the old content under
+    # the new version in between.
+    transaction.on_commit(lambda: page_cache.bump_version(using), using=using)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_cached_pages_on_tagging(sender, action, using, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(lambda: page_cache.bump_version(using), using=using)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_cached_comments(sender, instance, using, **kwargs):
+    # New comments get a fresh fragment key through the post's latest comment
+    # id. Edits and deletes of older comments keep that id, so drop the
+    # current fragment of this one post.
+    post_id = instance.post_id
+
+    def delete_fragment():
+        latest_id = Comment.objects.using(using).filter(post_id=post_id).order_by('-id').values_list(
+            'id', flat=True
+        ).first()
+        if latest_id is not None:
+            caches['fragments'].delete(make_template_fragment_key('post_comments', [post_id, latest_id]))
+
+    transaction.on_commit(delete_fragment, using=using)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, using, **kwargs):
+    if created:
+        change_comment_count(instance.post_id, 1, using)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, using, **kwargs):
+    change_comment_count(instance.post_id, -1, using)
+
+
+@receiver(pre_delete, sender=Post)
+def count_deleted_post_tags(sender, instance, using, **kwargs):
+    # The cascade deletes the post's tag links without sending m2m_changed.
+    tag_ids = list(Post.tags.through.objects.using(using).filter(post_id=instance.pk).values_list('tag_id', flat=True))
+    change_post_count(tag_ids, -1, using)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def count_tagging(sender, instance, action, reverse, pk_set, using, **kwargs):
+    links = sender.objects.using(using)
+    if reverse:
+        links = links.filter(tag_id=instance.pk)
+        linked_field = 'post_id'
+    else:
+        links = links.filter(post_id=instance.pk)
+        linked_field = 'tag_id'
+
+    if action in ('pre_remove', 'pre_clear'):
+        # pk_set may name objects that were not linked, and clear() gives
+        # none at all, so note which links really exist before they go.
+        if action == 'pre_remove':
+            links = links.filter(**{f'{linked_field}__in': pk_set})
+        instance._removed_tag_links = set(links.values_list(linked_field, flat=True))
+        return
+
+    if action == 'post_add':
+        # pk_set only holds the newly added links here.
+        changed, delta = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        changed, delta = instance.__dict__.pop('_removed_tag_links', set()), -1
+    else:
+        return
+
+    if reverse:
+        change_post_count([instance.pk], delta * len(changed), using)
+    else:
+        change_post_count(changed, delta, using)
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    count(f'opened:{connection.alias}')
+    install_query_recorder(connection)
+    install_slow_query_log(connection)
+
+
+@receiver(request_finished)
+def count_request(sender, **kwargs):
+    count('requests')
+    log_connection_stats()
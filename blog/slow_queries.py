@@ -0,0 +1,278 @@
+"""
+A log of slow SQL statements, switched on with BLOG_SLOW_QUERIES.
+
+Every database connection gets an execute wrapper (installed from
+blog/signals.py) that times its statements. A statement taking
+BLOG_SLOW_QUERY_MS or longer is appended as a JSON line to
+BLOG_SLOW_QUERY_LOG and logged to the ``blog.db`` logger, attributed to:
+
+- the URL name, method and path of the request running it, e.g.
+  ``post_detail_page`` or ``admin:blog_post_changelist``, which
+  SlowQueryMiddleware makes known;
+- the template node being rendered when it ran, if any, e.g.
+  ``blog/post-detail.html:12 {% for tag in post_tags %}``;
+- the code that ran it: the first frame outside django.db, followed by the
+  project's own frames, innermost first.
+
+Parameters are logged as their types only, since they hold session keys,
+session data and email addresses, unless BLOG_SLOW_QUERY_PARAMS is set.
+Savepoint statements, which transaction.atomic() issues around nested
+blocks, are not logged.
+
+A SELECT taking BLOG_SLOW_QUERY_EXPLAIN_MS or longer has its plan captured
+as well, once per query shape and process: ``EXPLAIN ANALYZE`` on
+PostgreSQL, which runs the query again, and ``EXPLAIN QUERY PLAN`` on
+SQLite. Only the BLOG_SLOW_QUERY_EXPLAIN_SHAPES shapes explained most
+recently are remembered, so a shape forgotten since is explained again. ``python manage.py slow_queries`` summarizes the log by query shape.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, transaction
+from django.template.base import Node, TokenType
+
+from .profiler import path_prefixes
+
+logger = logging.getLogger('blog.db')
+
+STACK_DEPTH = 8
+SQL_LENGTH = 4000
+PARAMS_LENGTH = 500
+
+_request = ContextVar('blog_slow_query_request', default=None)
+_explaining = ContextVar('blog_slow_query_explaining', default=False)
+
+_lock = threading.Lock()
+# The (database, shape) pairs explained, least recently seen first.
+_explained = OrderedDict()
+
+_RENDER_NODE = Node.render_annotated.__code__
+
+SAVEPOINT_RE = re.compile(r'\s*(?:RELEASE |ROLLBACK TO )?SAVEPOINT\b', re.IGNORECASE)
+
+
+def normalize(sql):
+    """The shape of a statement: its literals and parameters as ``?`` and lists of them collapsed."""
+    shape = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    shape = re.sub(r'\b\d+(?:\.\d+)?\b', '?', shape)
+    shape = shape.replace('%s', '?')
+    shape = re.sub(r'\s+', ' ', shape).strip()
+    shape = re.sub(r'\bIN \(\?(?:, \?)*\)', 'IN (...)', shape, flags=re.IGNORECASE)
+    return re.sub(r'(\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+', r'\1, ...', shape)
+
+
+def params_shape(params, many):
+    """The parameters' types, e.g. ``(int, str)``, so that their values stay out of the log."""
+    if params is None:
+        return None
+    if many:
+        params = list(params)
+        return f'{len(params)} x {params_shape(params[0], False)}' if params else '0 x ()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in params.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+
+
+def project_dir():
+    return str(settings.BASE_DIR)
+
+
+def is_database_frame(frame):
+    name = frame.f_globals.get('__name__', '')
+    return name.startswith('django.db.') or name == 'django.utils.asyncio'
+
+
+def is_project_frame(frame):
+    filename = frame.f_code.co_filename
+    return (
+        filename.startswith(project_dir()) and 'site-packages' not in filename
+        and frame.f_globals.get('__name__') != __name__
+    )
+
+
+def frame_label(frame, prefixes):
+    filename = frame.f_code.co_filename
+    for prefix in prefixes:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip(os.sep)
+            break
+    return f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+
+
+def node_label(node):
+    origin = getattr(node, 'origin', None)
+    token = getattr(node, 'token', None)
+    name = getattr(origin, 'template_name', None) or '<string>'
+    if token is None:
+        return name
+    contents = token.contents if len(token.contents) <= 80 else token.contents[:77] + '...'
+    tag = f'{{{{ {contents} }}}}' if token.token_type == TokenType.VAR else f'{{% {contents} %}}'
+    return f'{name}:{token.lineno} {tag}'
+
+
+def attribute(frame):
+    """The template node being rendered and the calling code's stack, as seen from ``frame``."""
+    # The execute wrappers are called from django.db, itself called by the
+    # ORM: the caller is the first frame past them.
+    while frame is not None and not is_database_frame(frame):
+        frame = frame.f_back
+    while frame is not None and is_database_frame(frame):
+        frame = frame.f_back
+    template = ''
+    stack = []
+    prefixes = path_prefixes()
+    while frame is not None:
+        if not template and frame.f_code is _RENDER_NODE:
+            template = node_label(frame.f_locals.get('self'))
+        if len(stack) < STACK_DEPTH and (not stack or is_project_frame(frame)):
+            stack.append(frame_label(frame, prefixes))
+        frame = frame.f_back
+    return template, stack
+
+
+def explain(connection, sql, params):
+    """The plan of a SELECT statement, or None if it cannot be explained."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+    # The savepoint's own statements are not logged.
+    token = _explaining.set(True)
+    try:
+        prefix = connection.ops.explain_query_prefix(**options)
+        # A savepoint inside a transaction, so that a failing EXPLAIN does
+        # not abort it; a cursor of its own, since the statement's results
+        # have not been read yet.
+        with transaction.atomic(using=connection.alias):
+            cursor = connection.create_cursor()
+            try:
+                cursor.execute(f'{prefix} {sql}', params)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+    except (DatabaseError, NotImplementedError):
+        logger.exception('Could not explain a slow query')
+        return None
+    finally:
+        _explaining.reset(token)
+    # PostgreSQL gives a line of text per row, SQLite (id, parent, notused, detail).
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+def write_entry(entry):
+    path = Path(settings.BLOG_SLOW_QUERY_LOG)
+    line = json.dumps(entry, default=str) + '\n'
+    with _lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('a', encoding='utf-8') as log:
+            log.write(line)
+
+
+def record_slow_query(execute, sql, params, many, context):
+    if not settings.BLOG_SLOW_QUERIES:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    ms = (time.perf_counter() - start) * 1000
+    if ms >= settings.BLOG_SLOW_QUERY_MS and not _explaining.get() and not SAVEPOINT_RE.match(sql):
+        log_slow_query(context['connection'], sql, params, many, ms)
+    return result
+
+
+def log_slow_query(connection, sql, params, many, ms):
+    shape = normalize(sql)
+    template, stack = attribute(sys._getframe(1))
+    request = _request.get()
+    match = request.resolver_match if request is not None else None
+    entry = {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'database': connection.alias,
+        'ms': round(ms, 2),
+        'shape': shape,
+        'sql': sql[:SQL_LENGTH],
+        'params': repr(params)[:PARAMS_LENGTH] if settings.BLOG_SLOW_QUERY_PARAMS else params_shape(params, many),
+        'many': many,
+        'view': match.view_name if match else '',
+        'method': request.method if request is not None else '',
+        'path': request.path if request is not None else '',
+        'template': template,
+        'stack': stack,
+        'plan': None,
+    }
+    if not many and ms >= settings.BLOG_SLOW_QUERY_EXPLAIN_MS:
+        key = (connection.alias, shape)
+        with _lock:
+            first = key not in _explained
+            _explained[key] = None
+            _explained.move_to_end(key)
+            while len(_explained) > settings.BLOG_SLOW_QUERY_EXPLAIN_SHAPES:
+                _explained.popitem(last=False)
+        if first:
+            entry['plan'] = explain(connection, sql, params)
+
+    logger.warning(
+        'Slow query (%.1f ms) in %s at %s: %s',
+        ms, entry['view'] or '<no request>', template or (stack[0] if stack else '?'), shape[:200]
+    )
+    try:
+        write_entry(entry)
+    except OSError:
+        logger.exception('Could not write the slow query log')
+
+
+def install_slow_query_log(connection, **kwargs):
+    if record_slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_slow_query)
+
+
+def read_log(path=None):
+    """The entries of the slow query log, skipping lines that cannot be read."""
+    path = Path(path or settings.BLOG_SLOW_QUERY_LOG)
+    if not path.is_file():
+        return
+    with path.open(encoding='utf-8') as log:
+        for line in log:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class SlowQueryMiddleware:
+    """Makes the request known to the slow query log for attribution."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.BLOG_SLOW_QUERIES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+
+    async def __acall__(self, request):
+        token = _request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request.reset(token)
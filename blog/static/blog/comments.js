@@ -0,0 +1,17 @@
+// Load older comments in place instead of following the link to the
+// standalone comments page.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('#comments .more-comments a');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+
+  fetch(link.href, { headers: { 'X-Requested-With': 'fetch' } })
+    .then(function (response) {
+      return response.text();
+    })
+    .then(function (html) {
+      link.closest('li').outerHTML = html;
+    });
+});
@@ -0,0 +1,18 @@
+// Publicly cached post pages are rendered without a CSRF token or the
+// visitor's read-later state. Fill both in from the uncached state endpoint.
+(function () {
+  var script = document.currentScript;
+
+  fetch(script.dataset.stateUrl, { credentials: 'same-origin' })
+    .then(function (response) {
+      return response.json();
+    })
+    .then(function (state) {
+      document.querySelectorAll('input[name="csrfmiddlewaretoken"]').forEach(function (input) {
+        input.value = state.csrf_token;
+      });
+
+      var button = document.querySelector('#read-later button');
+      button.textContent = state.is_saved ? button.dataset.savedLabel : button.dataset.unsavedLabel;
+    });
+})();
@@ -0,0 +1,57 @@
+"""
+WhiteNoise for a middleware chain that may be async.
+
+WhiteNoiseMiddleware is sync only. Under ASGI, Django then runs it, and every
+middleware above it, in a thread, and calls the async views back through
+async_to_sync, so no request ever runs on the event loop. This subclass is
+sync and async capable. In an async chain it looks static files up in the
+table WhiteNoise builds at startup, opens them in a thread and streams them
+with an async iterator; every other request goes straight to the next
+handler.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def read_chunks(file, chunk_size=CHUNK_SIZE):
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while chunk := await read(chunk_size):
+            yield chunk
+    finally:
+        file.close()
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is None:
+            return await self.get_response(request)
+
+        response = await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        # FileResponse iterates its file synchronously, which the ASGI handler
+        # could only do by reading it whole in a thread. The file stays
+        # registered with the response, which closes it even if the client
+        # disconnects before the iterator is started.
+        file = response.file_to_stream
+        if file is not None:
+            response.streaming_content = read_chunks(file)
+        return response
@@ -0,0 +1,76 @@
+"""
+Content-addressed storage for post images.
+
+Files are stored under the SHA-256 of their bytes, e.g.
+``posts/3f/3f2a...e1.jpg``, in MEDIA_ROOT like any other upload. Uploading the
+same image again stores nothing and returns the existing name, and since a
+name never changes content, blog.media serves these files as immutable.
+Blobs that no post refers to any more are removed with
+``manage.py gc_image_blobs``. Derivatives of a blob, which blog.images
+stores in ``derived/`` next to it under names made from its digest, are
+saved under the name they are given.
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+
+DIGEST_LENGTH = 32
+
+BLOB_NAME_RE = re.compile(rf'^(?P<digest>[0-9a-f]{{{DIGEST_LENGTH}}})(?:\.[a-z0-9]+)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def blob_name(self, name, content):
+        """The name under which ``content``, uploaded as ``name``, is stored."""
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        content.seek(0)
+        digest = sha256.hexdigest()[:DIGEST_LENGTH]
+
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if posixpath.basename(posixpath.dirname(name)) == 'derived':
+            return super().save(name, content, max_length)
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.blob_name(name, content)
+        if self.exists(name):
+            # A fresh mtime keeps gc_image_blobs off the blob until the post
+            # that is about to refer to it again has been saved.
+            os.utime(self.path(name))
+            return name
+        # Two uploads of the same new file racing each other end up with the
+        # second one stored under a suffixed, non-deduplicated name.
+        return super().save(name, content, max_length)
+
+    def is_blob(self, name):
+        return BLOB_NAME_RE.match(posixpath.basename(name)) is not None
+
+    def blobs(self, directory):
+        """Names of every blob stored below ``directory``."""
+        subdirectories, _ = self.listdir(directory)
+        for subdirectory in subdirectories:
+            if not re.fullmatch('[0-9a-f]{2}', subdirectory):
+                continue
+            for filename in self.listdir(posixpath.join(directory, subdirectory))[1]:
+                if self.is_blob(filename):
+                    yield posixpath.join(directory, subdirectory, filename)
+
+
+def post_image_storage():
+    """The storage of Post.image, chosen by BLOG_CONTENT_ADDRESSED_MEDIA."""
+    if settings.BLOG_CONTENT_ADDRESSED_MEDIA:
+        return ContentAddressedStorage()
+    return default_storage
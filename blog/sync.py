@@ -0,0 +1,181 @@
+"""
+Incremental copy of the blog's tables from one database to another, used by
+``manage.py sync_backup`` to keep the ``backup`` database current.
+
+Rows are read with chunked iterator() queries and written with bulk upserts,
+one transaction per batch, so memory use is bounded by the batch size and an
+interrupted run loses at most one batch. The high-water marks are read from
+the target itself: posts and comments are copied from its newest
+``updated_at`` on, less an overlap window, and post tags, which are only ever
+added or deleted, from its highest id on. Authors, tags and the content
+version carry no timestamp and are small, so they are copied in full.
+
+``updated_at`` is stamped when a row is saved, not when its transaction
+commits, so a row committed after a sync may carry an older stamp than the
+newest one already copied. Every run therefore goes back OVERLAP before the
+mark; the window must outlast the longest write transaction.
+
+Deletions are found by comparing primary keys batch by batch. Bulk writes
+and deletes skip model signals, so the target's cascades, search index and
+the comment counts of the posts whose comments changed are updated
+explicitly; the site's cache handlers never see the backup's writes.
+"""
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Author, Comment, ContentVersion, Post, Tag
+from .search import get_search_backend
+
+PostTag = Post.tags.through
+
+# In dependency order: every table only refers to tables before it.
+MODELS = (Author, Tag, Post, PostTag, Comment, ContentVersion)
+
+OVERLAP = timedelta(minutes=5)
+
+
+class SyncStats:
+
+    def __init__(self, model):
+        self.model = model
+        self.copied = 0
+        self.deleted = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        rows = self.copied + self.deleted
+        return rows / self.seconds if self.seconds else 0.0
+
+
+def copy_rows(model, rows, target):
+    """Insert or update ``rows`` (dicts of column values) in ``target``."""
+    fields = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+    model.objects.using(target).bulk_create(
+        [model(**row) for row in rows],
+        update_conflicts=True,
+        unique_fields=[model._meta.pk.name],
+        update_fields=fields,
+    )
+    # bulk_create() stamps auto_now fields with the current time; put the
+    # source's values back, since Post.updated_at is the high-water mark.
+    stamped = [
+        field.attname for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    if stamped:
+        model.objects.using(target).bulk_update([model(**row) for row in rows], stamped)
+
+
+def changed_rows(model, source, target, full, overlap=OVERLAP):
+    """The rows of ``model`` in ``source`` that the target may not have yet."""
+    rows = model.objects.using(source).order_by('pk')
+    if full or model in (Author, Tag, ContentVersion):
+        return rows
+    if model in (Post, Comment):
+        high_water = model.objects.using(target).aggregate(mark=Max('updated_at'))['mark']
+        if high_water is None:
+            return rows
+        return rows.filter(updated_at__gte=high_water - overlap).order_by('updated_at', 'pk')
+    high_water = model.objects.using(target).aggregate(mark=Max('pk'))['mark']
+    return rows.filter(pk__gt=high_water) if high_water else rows
+
+
+def refresh_comment_counts(post_ids, source, target):
+    counts = Post.objects.using(source).filter(pk__in=post_ids).values_list('pk', 'comment_count')
+    Post.objects.using(target).bulk_update(
+        [Post(pk=pk, comment_count=count) for pk, count in counts], ['comment_count']
+    )
+
+
+def copy_changes(model, source, target, batch_size, full, overlap, stats):
+    columns = [field.attname for field in model._meta.concrete_fields]
+    rows = changed_rows(model, source, target, full, overlap).values(*columns)
+    search = get_search_backend(target)
+
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            write_batch(model, batch, source, target, search)
+            stats.copied += len(batch)
+            batch = []
+    if batch:
+        write_batch(model, batch, source, target, search)
+        stats.copied += len(batch)
+
+
+def write_batch(model, batch, source, target, search):
+    with transaction.atomic(using=target):
+        copy_rows(model, batch, target)
+        if model is Post:
+            for row in batch:
+                search.index_post(row['id'])
+        elif model is Comment:
+            refresh_comment_counts({row['post_id'] for row in batch}, source, target)
+
+
+def prune(model, source, target, batch_size, stats):
+    """Delete the target's rows of ``model`` that the source no longer has."""
+    last_pk = None
+    while True:
+        pks = model.objects.using(target).order_by('pk')
+        if last_pk is not None:
+            pks = pks.filter(pk__gt=last_pk)
+        pks = list(pks.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        last_pk = pks[-1]
+
+        kept = set(model.objects.using(source).filter(pk__in=pks).values_list('pk', flat=True))
+        gone = [pk for pk in pks if pk not in kept]
+        if not gone:
+            continue
+        with transaction.atomic(using=target):
+            stale = model.objects.using(target).filter(pk__in=gone)
+            post_ids = set(stale.values_list('post_id', flat=True)) if model is Comment else ()
+            delete_rows(model, gone, target)
+            if post_ids:
+                refresh_comment_counts(post_ids, source, target)
+        stats.deleted += len(gone)
+
+
+def delete_rows(model, pks, target):
+    """
+    Delete rows of ``model`` from ``target`` without sending signals.
+
+    The site's delete handlers bump the content version and drop cached
+    fragments, which a backup's deletions must not touch, and count each
+    cascaded comment one UPDATE at a time. The cascades are done here in
+    bulk instead.
+    """
+    if model is Post:
+        Comment.objects.using(target).filter(post_id__in=pks)._raw_delete(target)
+        PostTag.objects.using(target).filter(post_id__in=pks)._raw_delete(target)
+        search = get_search_backend(target)
+        for pk in pks:
+            search.remove_post(pk)
+    elif model is Tag:
+        PostTag.objects.using(target).filter(tag_id__in=pks)._raw_delete(target)
+    elif model is Author:
+        Post.objects.using(target).filter(author_id__in=pks).update(author=None)
+    model.objects.using(target).filter(pk__in=pks)._raw_delete(target)
+
+
+def sync(source, target, batch_size=1000, full=False, overlap=OVERLAP):
+    """Bring ``target`` up to date with ``source`` and return a SyncStats per model."""
+    stats = {model: SyncStats(model) for model in MODELS}
+    # Deletions go first, children before their parents, so that a row
+    # re-created under a new id cannot clash with its old copy.
+    for model in reversed(MODELS):
+        start = time.perf_counter()
+        prune(model, source, target, batch_size, stats[model])
+        stats[model].seconds += time.perf_counter() - start
+    for model in MODELS:
+        start = time.perf_counter()
+        copy_changes(model, source, target, batch_size, full, overlap, stats[model])
+        stats[model].seconds += time.perf_counter() - start
+    return list(stats.values())
@@ -0,0 +1,55 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from ..images import DERIVATIVE_FORMATS, derivative_name
+
+register = template.Library()
+
+
+def srcset(image, widths, extension):
+    return ', '.join(
+        f'{image.storage.url(derivative_name(image.name, width, extension))} {width}w' for width in widths
+    )
+
+
+def image_attributes(post, lazy):
+    """Attributes that let the browser lay out and paint the image before it loads."""
+    attributes = {'alt': post.title}
+    if post.image_width and post.image_height:
+        attributes.update(width=post.image_width, height=post.image_height)
+    if lazy:
+        attributes['loading'] = 'lazy'
+    attributes['decoding'] = 'async'
+    if post.image_placeholder:
+        attributes['style'] = (
+            f'background: {post.image_color} url({post.image_placeholder}) center / cover no-repeat'
+        )
+    return flatatt(attributes)
+
+
+@register.simple_tag
+def responsive_image(post, sizes, lazy=True):
+    """
+    Render ``post.image`` as a <picture> choosing between its WebP and JPEG
+    derivatives by ``sizes``, or as the original image until they are built.
+    Images above the fold should pass ``lazy=False``.
+    """
+    if not post.image:
+        return ''
+    attributes = image_attributes(post, lazy)
+    widths = post.image_widths
+    if not widths:
+        return format_html('<img src="{}"{}>', post.image.url, attributes)
+
+    (webp, _, _), (jpeg, _, _) = DERIVATIVE_FORMATS
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}>'
+        '</picture>',
+        srcset(post.image, widths, webp), sizes,
+        post.image.storage.url(derivative_name(post.image.name, widths[0], jpeg)),
+        srcset(post.image, widths, jpeg), sizes,
+        attributes,
+    )
@@ -0,0 +1,95 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.handlers.asgi import ASGIHandler
+from django.test import SimpleTestCase, override_settings
+from django.urls import path
+
+from . import async_views, staticfiles, test_views
+from .urls import blog_urlpatterns
+
+# blog/urls.py with BLOG_ASYNC_VIEWS on, which is read once at import time.
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    *blog_urlpatterns(async_views),
+]
+
+async_urls = override_settings(ROOT_URLCONF='blog.test_async_views')
+
+
+# The view tests, run against the async views.
+
+@async_urls
+class AsyncStartingPageViewTest(test_views.StartingPageViewTest):
+    """Tests for the async starting page view."""
+
+
+@async_urls
+class AsyncPostsViewTest(test_views.PostsViewTest):
+    """Tests for the async posts view."""
+
+
+@async_urls
+class AsyncPostsViewKeysetPaginationTest(test_views.PostsViewKeysetPaginationTest):
+    """Tests for keyset pagination of the async posts view."""
+
+
+@async_urls
+class AsyncPostDetailViewTest(test_views.PostDetailViewTest):
+    """Tests for the async post detail view."""
+
+
+@async_urls
+class AsyncPublicPostDetailTest(test_views.PublicPostDetailTest):
+    """Tests for the publicly cacheable async post detail view."""
+
+
+@async_urls
+class AsyncConditionalGetTest(test_views.ConditionalGetTest):
+    """Tests for conditional GETs of the async views."""
+
+
+@async_urls
+class AsyncReadLaterViewTest(test_views.ReadLaterViewTest):
+    """Tests for the async read later view."""
+
+
+@async_urls
+class AsyncQueryBudgetTest(test_views.QueryBudgetTest):
+    """Tests that the async views keep the sync views' query budgets."""
+
+
+@async_urls
+class AsyncMiddlewareChainTest(SimpleTestCase):
+    """Tests that the middleware chain stays async under ASGI."""
+
+    @override_settings(DEBUG=True)
+    def test_no_middleware_is_adapted(self):
+        """Test that Django does not have to run any middleware in a thread."""
+        with self.assertLogs('django.request', 'DEBUG') as logs:
+            ASGIHandler()
+        # Django adapts the handler before a middleware can decline with
+        # MiddlewareNotUsed, as the disabled profiler does.
+        adapted = [line for line in logs.output if 'adapted' in line and 'ProfilerMiddleware' not in line]
+        self.assertEqual(adapted, [])
+
+    async def test_static_files_are_streamed(self):
+        """Test that static files are served from the event loop with an async iterator."""
+        response = await self.async_client.get('/static/app.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(content, (settings.STATIC_ROOT / 'app.css').read_bytes())
+
+        response = await self.async_client.get('/static/app.css', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_closing_response_closes_static_file(self):
+        """Test that a static file is closed with its response even if it was never streamed."""
+        with mock.patch.object(staticfiles, 'read_chunks', wraps=staticfiles.read_chunks) as read_chunks:
+            response = await self.async_client.get('/static/app.css')
+        file = read_chunks.call_args.args[0]
+        self.assertFalse(file.closed)
+        response.close()
+        self.assertTrue(file.closed)
@@ -0,0 +1,250 @@
+import tempfile
+
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .cache import page_cache
+from .models import Author, Comment, ContentVersion, Post, Tag
+
+
+@override_settings(BLOG_PAGE_CACHE=True)
+class PageCacheTest(TestCase):
+    """Tests for the full-page cache of the home page and post listing."""
+
+    def setUp(self):
+        """Start every test with an empty cache and fresh counters."""
+        caches['default'].clear()
+        page_cache.reset_stats()
+        self.author = Author.objects.create(
+            first_name='John',
+            last_name='Doe',
+            email_address='john@example.com'
+        )
+        self.post = Post.objects.create(
+            title='First Post',
+            excerpt='First excerpt',
+            slug='first-post',
+            content='Content for the first post',
+            author=self.author,
+            image='posts/first.jpg'
+        )
+
+    def change(self, func, *args, **kwargs):
+        """Run a write and the page cache invalidation waiting for its commit."""
+        with self.captureOnCommitCallbacks(execute=True):
+            return func(*args, **kwargs)
+
+    def test_second_request_is_served_from_cache(self):
+        """Test that a repeated anonymous request hits the cache with only the version lookup."""
+        first = self.client.get(reverse('starting_page'))
+        with self.assertNumQueries(1):
+            second = self.client.get(reverse('starting_page'))
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(page_cache.stats(), {'hits': 1, 'misses': 1, 'bypasses': 0})
+
+    def test_cached_page_answers_conditional_requests(self):
+        """Test that a cache hit still returns 304 for a matching ETag."""
+        etag = self.client.get(reverse('posts_page'))['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('posts_page'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_query_string_is_part_of_key(self):
+        """Test that different listing pages are cached separately."""
+        self.client.get(reverse('posts_page'))
+        response = self.client.get(reverse('posts_page'), {'page': 1})
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_unread_query_parameters_are_not_part_of_key(self):
+        """Test that query parameters the view ignores do not make new cache entries."""
+        self.client.get(reverse('posts_page'), {'page': 1})
+        for params in ({'page': 1, 'utm_source': 'feed'}, {'utm_source': 'feed', 'page': 1, 'x': 2}):
+            self.assertEqual(self.client.get(reverse('posts_page'), params)['X-Cache'], 'HIT')
+        self.client.get(reverse('starting_page'))
+        self.assertEqual(self.client.get(reverse('starting_page'), {'page': 2})['X-Cache'], 'HIT')
+
+    def test_saving_post_invalidates(self):
+        """Test that editing a post drops the cached pages."""
+        self.client.get(reverse('posts_page'))
+        self.post.title = 'Renamed Post'
+        self.change(self.post.save)
+        response = self.client.get(reverse('posts_page'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Renamed Post')
+
+    def test_version_is_shared_between_processes(self):
+        """Test that a version bumped elsewhere, with a cache of its own, retires the cached pages."""
+        self.client.get(reverse('posts_page'))
+        # What another worker's post_save handler does to the shared row.
+        ContentVersion.objects.filter(pk=ContentVersion.SITE).update(version=F('version') + 1)
+        self.assertEqual(self.client.get(reverse('posts_page'))['X-Cache'], 'MISS')
+
+    def test_deleting_post_invalidates(self):
+        """Test that deleting a post drops the cached pages."""
+        self.client.get(reverse('starting_page'))
+        self.change(self.post.delete)
+        response = self.client.get(reverse('starting_page'))
+        self.assertNotContains(response, 'First Post')
+
+    def test_author_and_tag_changes_invalidate(self):
+        """Test that Author, Tag and tagging changes drop the cached pages."""
+        tag = self.change(Tag.objects.create, caption='Django')
+        for write in (
+            lambda: self.post.tags.add(tag),
+            lambda: self.post.tags.remove(tag),
+            lambda: tag.save(),
+            lambda: self.author.save(),
+        ):
+            self.client.get(reverse('posts_page'))
+            self.change(write)
+            self.assertEqual(self.client.get(reverse('posts_page'))['X-Cache'], 'MISS')
+
+    def test_uncommitted_change_does_not_invalidate(self):
+        """Test that the version is only bumped once the write commits."""
+        self.client.get(reverse('posts_page'))
+        self.post.save()
+        self.assertEqual(self.client.get(reverse('posts_page'))['X-Cache'], 'HIT')
+
+    def test_requests_with_session_bypass_cache(self):
+        """Test that visitors with a session always get a freshly rendered page."""
+        session = self.client.session
+        session['stored_posts'] = [self.post.id]
+        session.save()
+        self.client.get(reverse('starting_page'))
+        response = self.client.get(reverse('starting_page'))
+        self.assertNotIn('X-Cache', response)
+        self.assertEqual(page_cache.stats()['bypasses'], 2)
+
+    @override_settings(BLOG_PAGE_CACHE=False)
+    def test_disabled_cache_is_not_used(self):
+        """Test that nothing is cached when the page cache is switched off."""
+        self.client.get(reverse('starting_page'))
+        response = self.client.get(reverse('starting_page'))
+        self.assertNotIn('X-Cache', response)
+        self.assertEqual(page_cache.stats(), {'hits': 0, 'misses': 0, 'bypasses': 0})
+
+
+class FileBasedPageCacheTest(PageCacheTest):
+    """The same tests against the file-based cache backend."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory.name,
+            },
+            'fragments': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+            },
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+    },
+})
+class FragmentCacheTest(TestCase):
+    """Tests for the cached post cards, post bodies and comment lists."""
+
+    def setUp(self):
+        """Create two commented posts and start with an empty fragment cache."""
+        caches['fragments'].clear()
+        self.author = Author.objects.create(
+            first_name='John',
+            last_name='Doe',
+            email_address='john@example.com'
+        )
+        self.posts = []
+        for i in range(2):
+            post = Post.objects.create(
+                title=f'Post {i}',
+                excerpt=f'Excerpt {i}',
+                slug=f'post-{i}',
+                content=f'Content for post {i}',
+                author=self.author,
+                image=f'posts/post-{i}.jpg'
+            )
+            Comment.objects.create(
+                user_name=f'Reader {i}',
+                user_mail='reader@example.com',
+                text=f'Comment on post {i}',
+                post=post
+            )
+            self.posts.append(post)
+        self.post = self.posts[0]
+
+    def detail(self, post):
+        return self.client.get(reverse('post_detail_page', args=[post.slug]))
+
+    def comments_key(self, post):
+        latest_id = post.comments.order_by('-id').values_list('id', flat=True).first()
+        return make_template_fragment_key('post_comments', [post.id, latest_id])
+
+    def test_cached_comments_skip_comment_query(self):
+        """Test that a cached comment list is not queried again."""
+        self.detail(self.post)
+        # The ETag, the post with its author and the tags.
+        with self.assertNumQueries(3):
+            response = self.detail(self.post)
+        self.assertContains(response, 'Comment on post 0')
+
+    def test_new_comment_changes_fragment_key(self):
+        """Test that a new comment is shown straight away."""
+        self.detail(self.post)
+        self.client.post(reverse('post_detail_page', args=[self.post.slug]), {
+            'user_name': 'Late Reader',
+            'user_mail': 'late@example.com',
+            'text': 'A new comment'
+        })
+        self.assertContains(self.detail(self.post), 'A new comment')
+
+    def test_editing_comment_only_drops_its_post_fragment(self):
+        """Test that editing an older comment invalidates that post alone."""
+        for post in self.posts:
+            self.detail(post)
+        other_key = self.comments_key(self.posts[1])
+        comment = self.post.comments.get()
+
+        comment.text = 'Edited comment'
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.save()
+
+        self.assertIsNotNone(caches['fragments'].get(other_key))
+        self.assertIsNone(caches['fragments'].get(self.comments_key(self.post)))
+        self.assertContains(self.detail(self.post), 'Edited comment')
+
+    def test_deleting_last_comment_hides_section(self):
+        """Test that the comment section goes away with the last comment."""
+        self.detail(self.post)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.comments.get().delete()
+        self.assertNotContains(self.detail(self.post), 'id="comments"')
+
+    def test_editing_post_refreshes_content_and_card(self):
+        """Test that post fragments are keyed on the post's last update."""
+        self.detail(self.post)
+        self.client.get(reverse('posts_page'))
+
+        self.post.content = 'Rewritten content'
+        self.post.title = 'Rewritten title'
+        self.post.save()
+
+        self.assertContains(self.detail(self.post), 'Rewritten content')
+        self.assertContains(self.client.get(reverse('posts_page')), 'Rewritten title')
@@ -0,0 +1,276 @@
+import os
+import posixpath
+import shutil
+import tempfile
+from concurrent.futures import Future
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from .cache import page_cache
+from .images import build_post_derivatives, derivative_name, derivatives_built, generate_derivatives
+from .media import cache_control
+from .models import Author, Post
+from .storage import ContentAddressedStorage
+
+
+def create_upload(width, height, name='photo.jpg'):
+    file = BytesIO()
+    Image.new('RGB', (width, height), color='blue').save(file, 'jpeg')
+    return SimpleUploadedFile(name, file.getvalue(), content_type='image/jpeg')
+
+
+class ImageDerivativesTest(TestCase):
+    """Tests for the responsive image derivatives of post images."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.author = Author.objects.create(
+            first_name='John',
+            last_name='Doe',
+            email_address='john@example.com'
+        )
+        self.post = Post.objects.create(
+            title='Image Post',
+            excerpt='Image excerpt',
+            slug='image-post',
+            content='Content for the image post',
+            author=self.author,
+            image=create_upload(1000, 500)
+        )
+
+    def render(self, sizes='7rem'):
+        template = Template('{% load blog_images %}{% responsive_image post sizes="' + sizes + '" %}')
+        return template.render(Context({'post': Post.objects.get(pk=self.post.pk)}))
+
+    def test_derivatives_are_never_upscaled(self):
+        """Test that only widths below the original's are built, in both formats."""
+        widths = generate_derivatives(self.post.image.name)
+        self.assertEqual(widths, [320, 640])
+        for width in widths:
+            for extension in ('webp', 'jpg'):
+                name = derivative_name(self.post.image.name, width, extension)
+                with default_storage.open(name) as file:
+                    self.assertEqual(Image.open(file).size, (width, width // 2))
+
+    def test_small_image_gets_one_copy(self):
+        """Test that an image narrower than every width is re-encoded at its own."""
+        self.post.image = create_upload(200, 100, 'small.jpg')
+        self.post.save()
+        self.assertEqual(generate_derivatives(self.post.image.name), [200])
+
+    def test_existing_derivatives_are_kept(self):
+        """Test that a second run does not rewrite derivatives unless forced."""
+        generate_derivatives(self.post.image.name)
+        with mock.patch.object(Image.Image, 'save') as save:
+            generate_derivatives(self.post.image.name)
+            save.assert_not_called()
+            generate_derivatives(self.post.image.name, force=True)
+            self.assertEqual(save.call_count, 4)
+
+    def test_built_derivatives_are_recorded(self):
+        """Test that the post records its derivative widths and is marked updated."""
+        updated_at = self.post.updated_at
+        build_post_derivatives(self.post.pk, self.post.image.name)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image_widths, [320, 640])
+        self.assertGreater(self.post.updated_at, updated_at)
+
+    def test_new_upload_resets_widths(self):
+        """Test that uploading another image forgets the old derivatives."""
+        build_post_derivatives(self.post.pk, self.post.image.name)
+        self.post.refresh_from_db()
+        self.post.image = create_upload(800, 800, 'other.jpg')
+        self.post.save(update_fields=['image'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image_widths, [])
+
+    def test_upload_is_described(self):
+        """Test that an upload's dimensions, colour and placeholder are stored."""
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.image_width, post.image_height), (1000, 500))
+        self.assertEqual(post.image_color, '#0000fe')
+        self.assertTrue(post.image_placeholder.startswith('data:image/webp;base64,'))
+
+    def test_removing_image_clears_description(self):
+        """Test that a post without an image has no description."""
+        self.post.image = None
+        self.post.save(update_fields=['image'])
+        self.post.refresh_from_db()
+        self.assertIsNone(self.post.image_width)
+        self.assertEqual(self.post.image_placeholder, '')
+
+    def test_template_tag_reserves_space(self):
+        """Test that images carry their size, placeholder and lazy loading."""
+        html = self.render()
+        self.assertIn('width="1000"', html)
+        self.assertIn('height="500"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn(f'style="background: #0000fe url({self.post.image_placeholder})', html)
+
+        template = Template('{% load blog_images %}{% responsive_image post sizes="12rem" lazy=False %}')
+        self.assertNotIn('loading=', template.render(Context({'post': self.post})))
+
+    def test_template_tag_falls_back_to_original(self):
+        """Test that posts without derivatives render their original image."""
+        html = self.render()
+        self.assertNotIn('<picture>', html)
+        self.assertIn(f'src="{self.post.image.url}"', html)
+
+    def test_template_tag_renders_srcset(self):
+        """Test that built derivatives are offered in WebP and JPEG with sizes."""
+        build_post_derivatives(self.post.pk, self.post.image.name)
+        html = self.render('12rem')
+        name = self.post.image.name
+        webp = default_storage.url(derivative_name(name, 320, 'webp'))
+        jpeg = default_storage.url(derivative_name(name, 640, 'jpg'))
+        self.assertIn(f'<source type="image/webp" srcset="{webp} 320w, ', html)
+        self.assertIn(f'{jpeg} 640w" sizes="12rem"', html)
+        self.assertEqual(html.count('sizes="12rem"'), 2)
+
+    @override_settings(BLOG_IMAGE_DERIVATIVES=True)
+    def test_uploads_are_scheduled_after_commit(self):
+        """Test that only saves with a new upload schedule a build."""
+        with mock.patch('blog.signals.schedule_derivatives') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.post.title = 'Renamed'
+                self.post.save()
+            schedule.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.post.image = create_upload(800, 800, 'other.jpg')
+                self.post.save()
+            schedule.assert_called_once_with(self.post.pk, self.post.image.name, 'default')
+
+    def test_finished_builds_bump_the_version_in_the_web_process(self):
+        """Test that the done-callback bumps the content version, or logs why the build failed."""
+        built, failed = Future(), Future()
+        built.set_result(True)
+        failed.set_exception(OSError('disk full'))
+        with mock.patch.object(page_cache, 'bump_version') as bump, mock.patch.object(connections, 'close_all'):
+            derivatives_built(built, 'posts/photo.jpg')
+            bump.assert_called_once_with('default')
+            with self.assertLogs('blog.images', 'ERROR') as logs:
+                derivatives_built(failed, 'posts/photo.jpg')
+            bump.assert_called_once_with('default')
+        self.assertIn('posts/photo.jpg', logs.output[0])
+        self.assertIn('disk full', logs.output[0])
+
+    def test_backfill_command(self):
+        """Test that the command builds derivatives for posts that lack them."""
+        out = StringIO()
+        call_command('build_image_derivatives', workers=1, stdout=out)
+        self.assertIn('Built derivatives for 1 image(s), 0 failed.', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image_widths, [320, 640])
+
+        call_command('build_image_derivatives', workers=1, stdout=out)
+        self.assertIn('Built derivatives for 0 image(s)', out.getvalue())
+
+
+class ContentAddressedStorageTest(TestCase):
+    """Tests for the content-addressed post image storage."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.storage = ContentAddressedStorage()
+        storage_patch = mock.patch.object(Post._meta.get_field('image'), 'storage', self.storage)
+        storage_patch.start()
+        self.addCleanup(storage_patch.stop)
+
+    def create_post(self, slug, upload):
+        return Post.objects.create(
+            title=slug,
+            excerpt='Excerpt',
+            slug=slug,
+            content='Content for a post with an image',
+            image=upload
+        )
+
+    def age(self, name, seconds=2 * 60 * 60):
+        path = self.storage.path(name)
+        mtime = os.path.getmtime(path) - seconds
+        os.utime(path, (mtime, mtime))
+
+    def test_identical_uploads_are_stored_once(self):
+        """Test that the same bytes uploaded twice share one immutable name."""
+        first = self.create_post('first', create_upload(50, 50, 'a.JPG'))
+        second = self.create_post('second', create_upload(50, 50, 'b.jpg'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/([0-9a-f]{2})/\1[0-9a-f]{30}\.jpg$')
+        self.assertEqual(len(self.storage.listdir(posixpath.dirname(first.image.name))[1]), 1)
+        self.assertTrue(cache_control(first.image.name)['immutable'])
+        self.assertTrue(cache_control(derivative_name(first.image.name, 320, 'webp'))['immutable'])
+
+    def test_derivatives_use_post_image_storage(self):
+        """Test that derivatives are stored and linked through Post.image's storage, under their own names."""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        storage = ContentAddressedStorage(location=location, base_url='/blobs/')
+        with mock.patch.object(Post._meta.get_field('image'), 'storage', storage):
+            post = self.create_post('elsewhere', create_upload(400, 300))
+            build_post_derivatives(post.pk, post.image.name)
+            post.refresh_from_db()
+            html = Template('{% load blog_images %}{% responsive_image post "10rem" %}').render(
+                Context({'post': post})
+            )
+        webp = derivative_name(post.image.name, 320, 'webp')
+        self.assertTrue(storage.exists(webp))
+        self.assertFalse(default_storage.exists(webp))
+        self.assertIn(f'srcset="/blobs/{webp} 320w', html)
+
+    def test_reupload_refreshes_blob(self):
+        """Test that uploading a stored image again makes it young, so the collector keeps it."""
+        name = self.create_post('first', create_upload(50, 50)).image.name
+        Post.objects.all().delete()
+        self.age(name)
+        self.storage.save('posts/again.jpg', create_upload(50, 50))
+
+        out = StringIO()
+        call_command('gc_image_blobs', stdout=out)
+        self.assertIn('Deleted 0 of 1 image(s).', out.getvalue())
+        self.assertTrue(self.storage.exists(name))
+
+    def test_gc_deletes_unreferenced_blobs(self):
+        """Test that only old blobs no post refers to are deleted, with their derivatives."""
+        kept = self.create_post('kept', create_upload(50, 50))
+        orphan = self.create_post('orphan', create_upload(60, 60)).image.name
+        young = self.create_post('young', create_upload(70, 70)).image.name
+        generate_derivatives(orphan)
+        Post.objects.filter(slug__in=['orphan', 'young']).delete()
+        self.age(kept.image.name)
+        self.age(orphan)
+
+        out = StringIO()
+        call_command('gc_image_blobs', dry_run=True, stdout=out)
+        self.assertIn('Would delete 1 of 3 image(s).', out.getvalue())
+        self.assertTrue(self.storage.exists(orphan))
+
+        call_command('gc_image_blobs', stdout=out)
+        self.assertFalse(self.storage.exists(orphan))
+        self.assertFalse(self.storage.exists(derivative_name(orphan, 60, 'webp')))
+        self.assertTrue(self.storage.exists(kept.image.name))
+        self.assertTrue(self.storage.exists(young))
+
+    def test_gc_requires_content_addressed_storage(self):
+        """Test that the command refuses to run against ordinary storage."""
+        with mock.patch.object(Post._meta.get_field('image'), 'storage', default_storage):
+            with self.assertRaises(CommandError):
+                call_command('gc_image_blobs')
@@ -0,0 +1,71 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Max
+from django.test import TestCase
+
+from .index_audit import capture_statements, plan_problems
+from .models import Author, Comment, Post, Tag
+from .slow_queries import explain
+
+
+class IndexAuditTest(TestCase):
+    """Tests for the index audit and the indexes it asked for."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Ada', last_name='Lovelace', email_address='ada@example.com')
+        tag = Tag.objects.create(caption='python')
+        for number in range(3):
+            post = Post.objects.create(
+                title=f'Post {number}',
+                excerpt='Excerpt',
+                slug=f'post-{number}',
+                content='Content long enough to be valid',
+                image='posts/test.jpg',
+                author=author,
+            )
+            post.tags.add(tag)
+            Comment.objects.create(user_name='Reader', user_mail='reader@example.com', text='Hi', post=post)
+
+    def test_plan_problems(self):
+        """Test that full scans and sorts are picked out of SQLite and PostgreSQL plans."""
+        self.assertEqual(
+            plan_problems('SCAN blog_post\nSEARCH blog_author USING INTEGER PRIMARY KEY (rowid=?)', 'sqlite'),
+            ['full scan of blog_post'],
+        )
+        self.assertEqual(
+            plan_problems('SCAN blog_post USING INDEX blog_post_date_id_idx\nUSE TEMP B-TREE FOR ORDER BY', 'sqlite'),
+            ['sort for ORDER BY'],
+        )
+        self.assertEqual(
+            plan_problems(
+                'Limit  (cost=1.1..1.2 rows=1)\n  ->  Sort  (cost=1.1..1.2 rows=1)\n'
+                '        Sort Key: id DESC\n        ->  Seq Scan on blog_post  (cost=0.0..1.0 rows=1)',
+                'postgresql',
+            ),
+            ['Sort', 'full scan of blog_post'],
+        )
+
+    def test_hot_queries_use_the_indexes(self):
+        """Test that the sync high-water mark and admin filters are answered from the new indexes."""
+        [(sql, params)] = capture_statements(lambda: Post.objects.aggregate(mark=Max('updated_at')))
+        self.assertIn('blog_post_updated_at_idx', explain(connection, sql, params))
+        self.assertIn('blog_post_comment_count_idx', Post.objects.filter(comment_count__gt=10).explain())
+        self.assertIn('blog_post_author_date_idx', Post.objects.filter(author_id=1).order_by('-date', '-id').explain())
+
+    def test_command_reports_every_shape(self):
+        """Test that the command times and audits the view and admin query shapes."""
+        out = StringIO()
+        call_command('audit_indexes', repeat=1, stdout=out)
+        output = out.getvalue()
+        self.assertIn('listing validators', output)
+        self.assertIn('admin:blog_post_changelist?tags=<id>', output)
+        self.assertIn('query shape(s) flagged.', output)
+
+    def test_command_needs_posts(self):
+        """Test that there must be posts to sample the queries from."""
+        Post.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('audit_indexes', stdout=StringIO())
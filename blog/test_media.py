@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+
+class ServeMediaTest(TestCase):
+    """Tests for the media serving view."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, BLOG_MEDIA_MAX_AGE=600)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        os.makedirs(os.path.join(self.media_root, 'posts'))
+        self.content = bytes(range(256)) * 4
+        for name in ('photo.jpg', 'photo.0123456789abcdef.jpg'):
+            with open(os.path.join(self.media_root, 'posts', name), 'wb') as file:
+                file.write(self.content)
+        self.url = reverse('media', args=['posts/photo.jpg'])
+
+    def get(self, url=None, **headers):
+        return self.client.get(url or self.url, headers=headers)
+
+    def test_serves_file_with_validators(self):
+        """Test that a file is served whole with caching and range headers."""
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=600')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_hashed_names_are_immutable(self):
+        """Test that content-hashed names are cached for a year."""
+        response = self.get(reverse('media', args=['posts/photo.0123456789abcdef.jpg']))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_conditional_get(self):
+        """Test that a matching If-None-Match is answered with a 304."""
+        etag = self.get()['ETag']
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_range_request(self):
+        """Test that a byte range is served as partial content."""
+        response = self.get(range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+    def test_suffix_range_request(self):
+        """Test that a suffix range serves the end of the file."""
+        response = self.get(range='bytes=-24')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[-24:])
+
+    def test_unsatisfiable_range(self):
+        """Test that a range past the end of the file is answered with a 416."""
+        response = self.get(range=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_stale_if_range_serves_whole_file(self):
+        """Test that a range conditional on another version gets the whole file."""
+        response = self.get(range='bytes=0-9', if_range='"outdated"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_missing_and_outside_files_are_not_found(self):
+        """Test that unknown paths and paths outside MEDIA_ROOT are 404s."""
+        self.assertEqual(self.get(reverse('media', args=['posts/missing.jpg'])).status_code, 404)
+        self.assertEqual(self.get(reverse('media', args=['posts'])).status_code, 404)
+        self.assertEqual(self.get(reverse('media', args=['../etc/passwd'])).status_code, 404)
+
+    @override_settings(BLOG_MEDIA_SENDFILE='x-accel-redirect', BLOG_MEDIA_ACCEL_PREFIX='/internal/')
+    def test_x_accel_redirect(self):
+        """Test that nginx is asked to send the file."""
+        response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], '/internal/posts/photo.jpg')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=600')
+
+    @override_settings(BLOG_MEDIA_SENDFILE='x-sendfile')
+    def test_x_sendfile(self):
+        """Test that the front-end server is given the file's path."""
+        response = self.get()
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'posts', 'photo.jpg'))
@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from .models import Post
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@override_settings(BLOG_METRICS=True)
+class MetricsTest(TestCase):
+    """Tests for the request metrics and the /metrics endpoint."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Post.objects.create(
+            title='Metrics Post',
+            excerpt='Excerpt',
+            slug='metrics-post',
+            content='Content long enough to be valid',
+            image='posts/test.jpg'
+        )
+
+    def test_requests_are_measured_per_url_name(self):
+        """Test that latency, status and SQL queries are recorded under the URL name."""
+        requests = sample('blog_request_duration_seconds_count', view='posts_page')
+        responses = sample('blog_responses_total', view='posts_page', method='GET', status='200')
+        queries = sample('blog_db_queries_per_request_sum', view='posts_page')
+
+        with self.assertNumQueries(3):
+            self.client.get(reverse('posts_page'))
+
+        self.assertEqual(sample('blog_request_duration_seconds_count', view='posts_page'), requests + 1)
+        self.assertEqual(sample('blog_responses_total', view='posts_page', method='GET', status='200'), responses + 1)
+        self.assertEqual(sample('blog_db_queries_per_request_sum', view='posts_page'), queries + 3)
+
+    def test_unmatched_requests_share_a_label(self):
+        """Test that requests no URL matches are not labelled by their path."""
+        not_found = sample('blog_responses_total', view='<unmatched>', method='GET', status='404')
+        self.client.get('/no/such/page')
+        self.assertEqual(sample('blog_responses_total', view='<unmatched>', method='GET', status='404'), not_found + 1)
+
+    @override_settings(TEMPLATES=[{**settings.TEMPLATES[0], 'BACKEND': 'blog.metrics.TimedDjangoTemplates'}])
+    def test_template_render_time(self):
+        """Test that every render of a template is timed."""
+        renders = sample('blog_template_render_seconds_count', template='blog/all-posts.html')
+        self.client.get(reverse('posts_page'))
+        self.assertEqual(sample('blog_template_render_seconds_count', template='blog/all-posts.html'), renders + 1)
+
+    @override_settings(BLOG_PAGE_CACHE=True)
+    def test_page_cache_lookups(self):
+        """Test that page cache hits and misses are counted."""
+        caches[settings.BLOG_PAGE_CACHE_ALIAS].clear()
+        hits = sample('blog_page_cache_requests_total', outcome='hits')
+        misses = sample('blog_page_cache_requests_total', outcome='misses')
+
+        self.client.get(reverse('posts_page'))
+        self.client.get(reverse('posts_page'))
+
+        self.assertEqual(sample('blog_page_cache_requests_total', outcome='misses'), misses + 1)
+        self.assertEqual(sample('blog_page_cache_requests_total', outcome='hits'), hits + 1)
+
+    @override_settings(CACHES={**settings.CACHES, 'fragments': {
+        'BACKEND': 'blog.metrics.CountedCache',
+        'OPTIONS': {'CACHE': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'metrics'}},
+    }})
+    def test_fragment_cache_lookups(self):
+        """Test that template fragment cache hits and misses are counted by fragment name."""
+        hits = sample('blog_fragment_cache_requests_total', fragment='post_card', outcome='hits')
+        misses = sample('blog_fragment_cache_requests_total', fragment='post_card', outcome='misses')
+
+        self.client.get(reverse('posts_page'))
+        self.client.get(reverse('posts_page'))
+
+        self.assertEqual(sample('blog_fragment_cache_requests_total', fragment='post_card', outcome='misses'), misses + 1)
+        self.assertEqual(sample('blog_fragment_cache_requests_total', fragment='post_card', outcome='hits'), hits + 1)
+
+    def test_endpoint_serves_prometheus_text(self):
+        """Test that /metrics serves the samples in the Prometheus text format."""
+        self.client.get(reverse('starting_page'))
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('blog_request_duration_seconds_bucket{le="0.005",view="starting_page"}', response.content.decode())
+
+    @override_settings(BLOG_METRICS_TOKEN='s3cret')
+    def test_endpoint_requires_token(self):
+        """Test that a configured token must be sent as a bearer token."""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(BLOG_METRICS=False)
+    def test_disabled_by_default(self):
+        """Test that the endpoint does not exist unless metrics are on."""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
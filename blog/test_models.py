@@ -1,5 +1,7 @@
+from io import StringIO
 from django.test import TestCase
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from .models import Post, Author, Comment, Tag
 
 
@@ -96,6 +98,25 @@ class PostModelTest(TestCase):
         with self.assertRaises(ValidationError):
             post.full_clean()
     
+    def test_post_content_html_rendered_on_save(self):
+        """Test that the body is rendered, escaped, when the post is saved."""
+        self.post.content = 'First <b>paragraph</b>\n\nSecond line\nThird line'
+        self.post.save(update_fields=['content'])
+        self.post.refresh_from_db()
+        self.assertEqual(
+            self.post.content_html,
+            '<p>First &lt;b&gt;paragraph&lt;/b&gt;</p>\n\n<p>Second line<br>Third line</p>'
+        )
+
+    def test_render_posts_command_fixes_stale_html(self):
+        """Test that the backfill command re-renders posts saved without HTML."""
+        Post.objects.filter(pk=self.post.pk).update(content_html='')
+        out = StringIO()
+        call_command('render_posts', stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.content_html, '<p>This is a test content with minimum length</p>')
+        self.assertIn('Rendered 1 post(s), 1 changed.', out.getvalue())
+
     def test_post_tags_relationship(self):
         """Test that tags can be added to posts."""
         tag1 = Tag.objects.create(caption='Django')
@@ -151,3 +172,121 @@ class CommentModelTest(TestCase):
         
         self.assertFalse(Post.objects.filter(id=post_id).exists())
         self.assertFalse(Comment.objects.filter(id=comment_id).exists())
+
+
+
+class CounterTest(TestCase):
+    """Tests for the maintained Post.comment_count and Tag.post_count."""
+
+    def setUp(self):
+        """Create two posts and two tags."""
+        self.author = Author.objects.create(
+            first_name='John',
+            last_name='Doe',
+            email_address='john@example.com'
+        )
+        self.post = Post.objects.create(
+            title='Test Post',
+            excerpt='Test excerpt',
+            slug='test-post',
+            content='This is test content',
+            author=self.author
+        )
+        self.other_post = Post.objects.create(
+            title='Other Post',
+            excerpt='Other excerpt',
+            slug='other-post',
+            content='This is other content',
+            author=self.author
+        )
+        self.django = Tag.objects.create(caption='Django')
+        self.python = Tag.objects.create(caption='Python')
+
+    def add_comment(self, post):
+        return Comment.objects.create(
+            user_name='Commenter',
+            user_mail='commenter@example.com',
+            text='This is a test comment',
+            post=post
+        )
+
+    def assertCounts(self, post_comments, django_posts, python_posts):
+        self.post.refresh_from_db()
+        self.django.refresh_from_db()
+        self.python.refresh_from_db()
+        self.assertEqual(self.post.comment_count, post_comments)
+        self.assertEqual(self.django.post_count, django_posts)
+        self.assertEqual(self.python.post_count, python_posts)
+
+    def test_comment_count_follows_comments(self):
+        """Test that creating and deleting comments updates the post counter."""
+        first = self.add_comment(self.post)
+        self.add_comment(self.post)
+        first.text = 'Edited'
+        first.save()
+        self.assertCounts(2, 0, 0)
+        first.delete()
+        self.assertCounts(1, 0, 0)
+
+    def test_post_count_follows_tagging(self):
+        """Test that add, remove and clear from the post side update the tags."""
+        self.post.tags.add(self.django, self.python)
+        self.post.tags.add(self.django)
+        self.assertCounts(0, 1, 1)
+        self.post.tags.remove(self.django)
+        self.other_post.tags.remove(self.python)
+        self.assertCounts(0, 0, 1)
+        self.post.tags.clear()
+        self.assertCounts(0, 0, 0)
+
+    def test_post_count_follows_reverse_tagging(self):
+        """Test that add, remove and clear from the tag side update the tag."""
+        self.django.post_set.add(self.post, self.other_post)
+        self.assertCounts(0, 2, 0)
+        self.django.post_set.remove(self.post)
+        self.assertCounts(0, 1, 0)
+        self.django.post_set.clear()
+        self.assertCounts(0, 0, 0)
+
+    def test_post_count_follows_post_deletes(self):
+        """Test that deleting a post uncounts it from its tags."""
+        self.post.tags.add(self.django)
+        self.other_post.tags.add(self.django)
+        self.post.delete()
+        self.django.refresh_from_db()
+        self.assertEqual(self.django.post_count, 1)
+
+    def test_saves_keep_counters(self):
+        """Test that saving a stale instance does not write back its old counter."""
+        stale_post = Post.objects.get(pk=self.post.pk)
+        stale_tag = Tag.objects.get(pk=self.django.pk)
+        self.add_comment(self.post)
+        self.post.tags.add(self.django)
+
+        stale_post.title = 'Renamed'
+        stale_post.save()
+        stale_tag.caption = 'Renamed'
+        stale_tag.save()
+        self.assertCounts(1, 1, 0)
+        self.assertEqual(self.post.title, 'Renamed')
+        self.assertEqual(self.django.caption, 'Renamed')
+
+        stale_post.save(update_fields=['comment_count'])
+        self.assertCounts(0, 1, 0)
+
+    def test_repair_counters_fixes_drift(self):
+        """Test that the command reports and repairs drifted counters."""
+        self.add_comment(self.post)
+        self.post.tags.add(self.django)
+        Post.objects.update(comment_count=7)
+        Tag.objects.update(post_count=3)
+
+        out = StringIO()
+        call_command('repair_counters', '--dry-run', stdout=out)
+        self.assertIn('2 post(s) and 2 tag(s) have drifted', out.getvalue())
+        self.assertCounts(7, 3, 3)
+
+        call_command('repair_counters', stdout=StringIO())
+        self.assertCounts(1, 1, 0)
+        self.other_post.refresh_from_db()
+        self.assertEqual(self.other_post.comment_count, 0)
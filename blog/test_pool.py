@@ -0,0 +1,50 @@
+from unittest import mock
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import TestCase, override_settings
+
+from . import pool
+
+
+class ConnectionStatsTest(TestCase):
+    """Tests for the per-process database connection counters."""
+
+    def test_counts_requests_and_new_connections(self):
+        """Test that finished requests and opened connections are counted."""
+        before = pool.connection_stats()
+        self.client.get('/')
+        connection_created.send(sender=connection.__class__, connection=connection)
+
+        after = pool.connection_stats()
+        self.assertEqual(after['requests'], before['requests'] + 1)
+        self.assertEqual(after['connections_opened'], before['connections_opened'] + 1)
+        self.assertNotIn('checkouts', after)
+
+    def test_pool_counters(self):
+        """Test that a connection pool's checkouts and wait time are reported."""
+        fake_pool = mock.Mock()
+        fake_pool.get_stats.return_value = {
+            'pool_size': 4, 'pool_available': 1, 'requests_num': 120, 'requests_queued': 7,
+            'requests_wait_ms': 350, 'connections_num': 5, 'connections_lost': 1,
+        }
+        with mock.patch.object(pool, 'get_pool', return_value=fake_pool):
+            stats = pool.connection_stats()
+
+        self.assertEqual(stats['checkouts'], 120)
+        self.assertEqual(stats['checkouts_waited'], 7)
+        self.assertEqual(stats['checkout_wait_ms'], 350)
+        self.assertEqual(stats['connections_opened'], 5)
+        self.assertEqual(stats['connections_lost'], 1)
+
+    @override_settings(DATABASE_STATS_SECONDS=60)
+    def test_stats_are_logged_once_per_interval(self):
+        """Test that the counters are logged at most once per interval."""
+        with mock.patch.object(pool, '_last_logged', 0.0), \
+                mock.patch.object(pool.time, 'monotonic', return_value=1000.0), \
+                self.assertLogs('blog.db', 'INFO') as logs:
+            pool.log_connection_stats()
+            pool.log_connection_stats()
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('requests=', logs.output[0])
@@ -0,0 +1,121 @@
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .models import Post
+from .profiler import Sampler
+
+
+def busy_view_work(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+class ProfilerTest(TestCase):
+    """Tests for the sampled request profiler."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Post.objects.create(
+            title='Profiled Post',
+            excerpt='Excerpt',
+            slug='profiled-post',
+            content='Content long enough to be valid',
+            image='posts/test.jpg'
+        )
+        cls.staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        cls.reader = User.objects.create_user('reader', password='secret')
+
+    def setUp(self):
+        self.profile_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        settings_override = override_settings(
+            BLOG_PROFILER=True, BLOG_PROFILER_DIR=self.profile_dir, BLOG_PROFILER_TOKEN='profile-token'
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def capture(self, response):
+        capture_id = response['X-Profile-Id']
+        description = json.loads((self.profile_dir / f'{capture_id}.json').read_text())
+        folded = (self.profile_dir / f'{capture_id}.folded').read_text()
+        return description, folded
+
+    def test_token_header_profiles_request(self):
+        """Test that a request with the token is profiled and described."""
+        response = self.client.get(reverse('posts_page'), headers={'X-Profile': 'profile-token'})
+
+        description, folded = self.capture(response)
+        self.assertEqual(description['route'], 'posts_page')
+        self.assertEqual(description['status'], 200)
+        self.assertGreater(description['duration_ms'], 0)
+        for line in folded.splitlines():
+            self.assertRegex(line, r'^\S.*\(.+:\d+\) \d+$')
+
+    def test_requests_are_not_profiled_by_default(self):
+        """Test that only sampled or authorized requests are profiled."""
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('posts_page')))
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('posts_page'), headers={'X-Profile': 'wrong'}))
+
+        self.client.force_login(self.reader)
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('posts_page') + '?_profile=1'))
+        self.assertEqual(list(self.profile_dir.iterdir()), [])
+
+    def test_staff_can_ask_for_profile(self):
+        """Test that a staff user's request is profiled on request."""
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('post_detail_page', args=['profiled-post']) + '?_profile=1')
+        self.assertEqual(self.capture(response)[0]['route'], 'post_detail_page')
+
+    @override_settings(BLOG_PROFILER_SAMPLE_RATE=1.0)
+    def test_sample_rate(self):
+        """Test that sampled requests are profiled without asking."""
+        self.assertIn('X-Profile-Id', self.client.get(reverse('starting_page')))
+
+    @override_settings(BLOG_PROFILER_SAMPLE_RATE=1.0, BLOG_PROFILER_KEEP=2)
+    def test_old_captures_are_removed(self):
+        """Test that only the most recent captures are kept."""
+        for _ in range(3):
+            self.client.get(reverse('starting_page'))
+        self.assertEqual(len(list(self.profile_dir.glob('*.json'))), 2)
+        self.assertEqual(len(list(self.profile_dir.glob('*.folded'))), 2)
+
+    def test_admin_lists_and_serves_captures(self):
+        """Test that staff can list captures by route and download them."""
+        capture_id = self.client.get(reverse('posts_page'), headers={'X-Profile': 'profile-token'})['X-Profile-Id']
+        self.client.get(reverse('starting_page'), headers={'X-Profile': 'profile-token'})
+
+        list_url = reverse('profile_list')
+        download_url = reverse('profile_download', args=[capture_id])
+        self.assertEqual(self.client.get(list_url).status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(list_url, {'route': 'posts_page', 'o': 'duration'})
+        self.assertEqual(len(response.context['captures']), 1)
+        self.assertContains(response, download_url)
+
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(self.client.get(reverse('profile_download', args=['1-missing'])).status_code, 404)
+
+    def test_sampler_records_stacks_below_root(self):
+        """Test that the sampler folds the stacks of the profiled thread below its root."""
+        sampler = Sampler(threading.get_ident(), sys._getframe(), 0.001)
+        sampler.start()
+        busy_view_work(0.05)
+        sampler.stop()
+
+        self.assertGreater(sampler.samples, 0)
+        stacks = list(sampler.stacks)
+        self.assertTrue(any(stack.startswith('busy_view_work (') for stack in stacks))
+        self.assertFalse(any('test_sampler_records_stacks_below_root' in stack for stack in stacks))
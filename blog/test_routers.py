@@ -0,0 +1,96 @@
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from . import routers
+from .models import Post
+from .views import PostsView
+
+
+@override_settings(BLOG_READ_REPLICA='backup')
+class ReplicaRoutingTest(TestCase):
+    """Tests for routing blog reads to the read replica."""
+    databases = {'default', 'backup'}
+
+    def setUp(self):
+        self.addCleanup(setattr, routers, '_primary_down_until', 0.0)
+        self.primary_post = self.create_post('default', 'primary-post')
+        self.replica_post = self.create_post('backup', 'replica-post')
+
+    def create_post(self, using, slug):
+        return Post.objects.using(using).create(
+            title=slug.replace('-', ' ').title(),
+            excerpt='Excerpt',
+            slug=slug,
+            content='Content long enough to be valid',
+            image='posts/test.jpg'
+        )
+
+    def assertServedFrom(self, response, post):
+        self.assertEqual([p.slug for p in response.context['posts']], [post.slug])
+
+    def test_anonymous_reads_use_replica(self):
+        """Test that a GET reads the blog from the replica."""
+        self.assertServedFrom(self.client.get(reverse('posts_page')), self.replica_post)
+
+    def test_writes_pin_visitor_to_primary(self):
+        """Test that a visitor who has just written reads from the primary."""
+        response = self.client.post(
+            reverse('post_detail_page', args=[self.primary_post.slug]),
+            {'user_name': 'Jane', 'user_mail': 'jane@example.com', 'text': 'A comment'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.primary_post.comments.count(), 1)
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], 10)
+        self.assertServedFrom(self.client.get(reverse('posts_page')), self.primary_post)
+
+    def test_unreachable_primary_fails_over_to_replica(self):
+        """Test that reads go to the replica while the primary is down."""
+        self.client.cookies[routers.PIN_COOKIE] = '1'
+        self.assertServedFrom(self.client.get(reverse('posts_page')), self.primary_post)
+
+        routers.mark_primary_down()
+        self.assertServedFrom(self.client.get(reverse('posts_page')), self.replica_post)
+
+    def test_failed_request_is_retried_on_replica(self):
+        """Test that a GET failing to reach the primary is served by the replica."""
+        self.client.cookies[routers.PIN_COOKIE] = '1'
+        get_queryset = PostsView.get_queryset
+
+        def primary_unreachable(view):
+            if routers._routing.get() != 'failover':
+                raise OperationalError('could not connect to server')
+            return get_queryset(view)
+
+        with mock.patch.object(PostsView, 'get_queryset', primary_unreachable), \
+                mock.patch.object(routers, 'primary_is_reachable', return_value=False):
+            response = self.client.get(reverse('posts_page'))
+        self.assertServedFrom(response, self.replica_post)
+        self.assertTrue(routers.primary_is_down())
+
+    async def test_async_requests_are_routed(self):
+        """Test that the middleware routes and pins requests without leaving an async chain."""
+        routings = []
+
+        async def get_response(request):
+            routings.append(routers._routing.get())
+            return HttpResponse()
+
+        middleware = routers.ReplicaRoutingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        await middleware(RequestFactory().get('/'))
+        response = await middleware(RequestFactory().post('/'))
+        self.assertEqual(routings, ['replica', 'primary'])
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+    @override_settings(BLOG_READ_REPLICA='')
+    def test_without_replica_everything_uses_primary(self):
+        """Test that the router is inactive unless a replica is configured."""
+        self.assertServedFrom(self.client.get(reverse('posts_page')), self.primary_post)
+        with self.assertRaises(MiddlewareNotUsed):
+            routers.ReplicaRoutingMiddleware(HttpResponse)
@@ -0,0 +1,71 @@
+import random
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from .counters import find_drift
+from .models import Author, Comment, Post, Tag
+from .scale_data import comment_counts
+
+
+class GenerateScaleDataTest(TestCase):
+    """Tests for the generate_scale_data command."""
+    databases = {'default', 'backup'}
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def generate(self, **options):
+        options = {'authors': 5, 'tags': 8, 'posts': 60, 'comments': 900, 'images': 2, 'batch_size': 25, **options}
+        call_command('generate_scale_data', stdout=StringIO(), **options)
+
+    def test_generates_requested_volumes(self):
+        """Test that the rows are created with correct counters, images and dates."""
+        self.generate()
+
+        self.assertEqual(Author.objects.count(), 5)
+        self.assertEqual(Tag.objects.count(), 8)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 900)
+        self.assertEqual(Post.tags.through.objects.count(), 60 * 3)
+        self.assertEqual(find_drift(), {'posts': 0, 'tags': 0})
+
+        post = Post.objects.first()
+        self.assertTrue(post.image.storage.exists(post.image.name))
+        self.assertEqual((post.image_width, post.image_height), (1280, 853))
+        self.assertTrue(post.content_html.startswith('<p>'))
+        self.assertGreater(Post.objects.values('date').distinct().count(), 1)
+
+    def test_same_seed_gives_same_rows(self):
+        """Test that the generated rows only depend on the seed and options."""
+        self.generate(seed=7)
+        self.generate(seed=7, database='backup')
+
+        def rows(using):
+            posts = Post.objects.using(using).order_by('slug').values_list('slug', 'comment_count', 'date')
+            comments = Comment.objects.using(using).order_by('post__slug', 'id').values_list('post__slug', 'text')
+            return list(posts), list(comments)
+
+        self.assertEqual(rows('default'), rows('backup'))
+
+    def test_skew_concentrates_comments(self):
+        """Test that a few posts get most of the comments."""
+        counts = sorted(comment_counts(1000, 100_000, 1.2, random.Random(0)), reverse=True)
+        self.assertEqual(sum(counts), 100_000)
+        self.assertGreater(sum(counts[:50]), 50_000)
+
+        even = comment_counts(1000, 100_000, 0, random.Random(0))
+        self.assertEqual(set(even), {100})
+
+    def test_refuses_database_with_posts(self):
+        """Test that generating into a database that has posts is refused."""
+        self.generate()
+        with self.assertRaises(CommandError):
+            self.generate()
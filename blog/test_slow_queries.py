@@ -0,0 +1,155 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import transaction
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .models import Post
+from . import slow_queries
+from .slow_queries import normalize, read_log
+
+
+class SlowQueryLogTest(TestCase):
+    """Tests for the slow query log and its summary command."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Post.objects.create(
+            title='Slow Post',
+            excerpt='Excerpt',
+            slug='slow-post',
+            content='Content long enough to be valid',
+            image='posts/test.jpg'
+        )
+        cls.admin = User.objects.create_superuser('admin', password='secret')
+
+    def setUp(self):
+        log_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, log_dir)
+        self.log = log_dir / 'slow.jsonl'
+        # Every statement counts as slow.
+        settings_override = override_settings(
+            BLOG_SLOW_QUERIES=True, BLOG_SLOW_QUERY_MS=0, BLOG_SLOW_QUERY_EXPLAIN_MS=0, BLOG_SLOW_QUERY_LOG=self.log
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        slow_queries._explained.clear()
+
+    def entries(self):
+        return list(read_log(self.log))
+
+    def test_normalize(self):
+        """Test that statements differing only in their values share a shape."""
+        self.assertEqual(
+            normalize('SELECT "id" FROM "blog_post" WHERE ("id" IN (%s, %s, %s) AND "slug" = \'a b\')  LIMIT 21'),
+            'SELECT "id" FROM "blog_post" WHERE ("id" IN (...) AND "slug" = ?) LIMIT ?',
+        )
+        self.assertEqual(
+            normalize('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO "t" ("a", "b") VALUES (?, ?), ...',
+        )
+
+    def test_queries_are_attributed_to_the_view(self):
+        """Test that a request's statements carry its URL name and the code that ran them."""
+        with self.assertLogs('blog.db', 'WARNING'):
+            self.client.get(reverse('post_detail_page', args=['slow-post']))
+
+        entries = [entry for entry in self.entries() if '"blog_post"' in entry['sql']]
+        self.assertTrue(entries)
+        self.assertEqual(entries[0]['path'], '/posts/slow-post')
+        self.assertTrue(all(entry['view'] == 'post_detail_page' for entry in entries))
+        self.assertTrue(any(frame.startswith('blog/views.py:') for entry in entries for frame in entry['stack']))
+
+    def test_admin_changelist(self):
+        """Test that the statements of an admin changelist are attributed to it."""
+        # Logging in runs statements of its own.
+        with self.assertLogs('blog.db', 'WARNING'):
+            self.client.force_login(self.admin)
+            self.client.get(reverse('admin:blog_post_changelist'))
+        self.assertIn('admin:blog_post_changelist', {entry['view'] for entry in self.entries()})
+
+    def test_queries_are_attributed_to_the_template_node(self):
+        """Test that a statement run while rendering names the template node."""
+        template = Template('{% for post in posts %}{{ post.title }}{% endfor %}')
+        with self.assertLogs('blog.db', 'WARNING'):
+            template.render(Context({'posts': Post.objects.all()}))
+
+        entry = self.entries()[0]
+        self.assertEqual(entry['view'], '')
+        self.assertEqual(entry['template'], '<string>:1 {% for post in posts %}')
+
+    def test_explain_is_captured_once_per_shape(self):
+        """Test that the plan of a slow SELECT is captured the first time its shape is seen."""
+        with self.assertLogs('blog.db', 'WARNING'):
+            list(Post.objects.filter(slug='slow-post'))
+            list(Post.objects.filter(slug='other-post'))
+
+        first, second = self.entries()
+        self.assertEqual(first['shape'], second['shape'])
+        self.assertIn('blog_post', first['plan'])
+        self.assertIsNone(second['plan'])
+
+    @override_settings(BLOG_SLOW_QUERY_EXPLAIN_SHAPES=1)
+    def test_explained_shapes_are_capped(self):
+        """Test that only the most recently explained shapes are remembered."""
+        with self.assertLogs('blog.db', 'WARNING'):
+            list(Post.objects.filter(slug='slow-post'))
+            list(Post.objects.filter(title='Slow Post'))
+            list(Post.objects.filter(slug='slow-post'))
+
+        self.assertEqual(len(slow_queries._explained), 1)
+        self.assertTrue(all(entry['plan'] for entry in self.entries()))
+
+    def test_params_are_not_logged_by_default(self):
+        """Test that only the parameters' types are logged unless their values are asked for."""
+        with self.assertLogs('blog.db', 'WARNING'):
+            list(Post.objects.filter(slug='secret-slug', id__gt=1))
+        self.assertEqual(self.entries()[0]['params'], '(int, str)')
+        self.assertNotIn('secret-slug', self.log.read_text())
+
+        with override_settings(BLOG_SLOW_QUERY_PARAMS=True), self.assertLogs('blog.db', 'WARNING'):
+            list(Post.objects.filter(slug='secret-slug'))
+        self.assertIn('secret-slug', self.entries()[-1]['params'])
+
+    def test_savepoints_are_not_logged(self):
+        """Test that the savepoint statements around a nested atomic block are skipped."""
+        with self.assertLogs('blog.db', 'WARNING'):
+            with transaction.atomic():
+                list(Post.objects.all())
+        self.assertEqual(len(self.entries()), 1)
+        self.assertNotIn('SAVEPOINT', self.log.read_text())
+
+    @override_settings(BLOG_SLOW_QUERY_MS=10_000)
+    def test_fast_queries_are_not_logged(self):
+        """Test that statements under the threshold are not logged."""
+        list(Post.objects.all())
+        self.assertEqual(self.entries(), [])
+
+    def test_summary_command(self):
+        """Test that the command ranks query shapes by total time."""
+        entries = [
+            {'shape': 'SELECT a', 'ms': 5.0, 'view': 'posts_page', 'template': '', 'stack': ['blog/views.py:1 in f']},
+            {'shape': 'SELECT b', 'ms': 4.0, 'view': 'posts_page', 'template': 't.html:2 {% for x in y %}',
+             'stack': [], 'plan': 'SCAN blog_post'},
+            {'shape': 'SELECT b', 'ms': 4.0, 'view': 'starting_page', 'template': '', 'stack': []},
+        ]
+        self.log.write_text(''.join(json.dumps(entry) + '\n' for entry in entries))
+
+        out = StringIO()
+        call_command('slow_queries', plans=True, stdout=out)
+        output = out.getvalue()
+        self.assertLess(output.index('SELECT b'), output.index('SELECT a'))
+        self.assertIn('8.0 ms total, 2 call(s)', output)
+        self.assertIn('t.html:2 {% for x in y %} (1)', output)
+        self.assertIn('SCAN blog_post', output)
+
+        out = StringIO()
+        call_command('slow_queries', view='starting_page', stdout=out)
+        self.assertNotIn('SELECT a', out.getvalue())
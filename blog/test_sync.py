@@ -0,0 +1,124 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Max
+from django.test import TestCase
+
+from .models import Author, Comment, ContentVersion, Post, Tag
+from .search import SearchResults
+
+
+class SyncBackupTest(TestCase):
+    """Tests for the incremental copy of the blog into the backup database."""
+    databases = {'default', 'backup'}
+
+    def setUp(self):
+        self.author = Author.objects.create(first_name='John', last_name='Doe', email_address='john@example.com')
+        self.tag = Tag.objects.create(caption='django')
+        self.posts = [self.create_post(i) for i in range(5)]
+        for post in self.posts:
+            post.tags.add(self.tag)
+        Comment.objects.create(
+            user_name='Jane', user_mail='jane@example.com', text='A comment', post=self.posts[0]
+        )
+
+    def create_post(self, i):
+        return Post.objects.create(
+            title=f'Post {i}',
+            excerpt=f'Excerpt {i}',
+            slug=f'post-{i}',
+            content=f'Content of synchronised post {i}',
+            author=self.author,
+            image='posts/test.jpg'
+        )
+
+    def sync(self, **options):
+        out = StringIO()
+        call_command('sync_backup', batch_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def assertInSync(self):
+        for model in (Author, Tag, Post, Post.tags.through, Comment):
+            self.assertEqual(
+                list(model.objects.using('backup').order_by('pk').values()),
+                list(model.objects.order_by('pk').values()),
+                model._meta.label
+            )
+
+    def test_first_run_copies_everything(self):
+        """Test that an empty backup receives every row, timestamps included."""
+        output = self.sync()
+        self.assertInSync()
+        self.assertIn('blog.Post: 5 copied, 0 deleted', output)
+        self.assertIn('rows/s', output)
+        self.assertEqual(SearchResults('synchronised', using='backup').count(), 5)
+
+    def test_later_runs_copy_only_changes(self):
+        """Test that a second run resumes from the high-water marks."""
+        self.sync()
+        post = self.posts[3]
+        post.title = 'Edited title'
+        post.save()
+        Comment.objects.create(user_name='Max', user_mail='max@example.com', text='Another', post=self.posts[1])
+
+        output = self.sync(overlap=0)
+        self.assertInSync()
+        # The new comment, and the newest copied one the mark starts at.
+        self.assertIn('blog.Comment: 2 copied, 0 deleted', output)
+        # Only the edited post and any saved in the same instant as the
+        # previous high-water mark are copied again.
+        self.assertNotIn('blog.Post: 5 copied', output)
+        self.assertEqual(Post.objects.using('backup').get(pk=self.posts[1].pk).comment_count, 1)
+
+    def test_edited_comments_are_copied(self):
+        """Test that an edited comment is copied again."""
+        self.sync()
+        comment = Comment.objects.get()
+        comment.text = 'An edited comment'
+        comment.save()
+
+        self.sync(overlap=0)
+        self.assertEqual(Comment.objects.using('backup').get().text, 'An edited comment')
+
+    def test_late_commits_are_copied(self):
+        """Test that a row stamped before the high-water mark but committed after the last run is copied."""
+        self.sync()
+        mark = Post.objects.using('backup').aggregate(mark=Max('updated_at'))['mark']
+        Post.objects.filter(pk=self.posts[0].pk).update(title='Committed late', updated_at=mark - timedelta(seconds=1))
+
+        self.sync(overlap=0)
+        self.assertNotEqual(Post.objects.using('backup').get(pk=self.posts[0].pk).title, 'Committed late')
+        self.sync()
+        self.assertInSync()
+
+    def test_deletions_are_copied(self):
+        """Test that deleted rows are removed from the backup."""
+        self.sync()
+        self.posts[0].comments.all().delete()
+        self.posts[2].delete()
+        self.posts[4].tags.remove(self.tag)
+
+        output = self.sync()
+        self.assertInSync()
+        self.assertRegex(output, r'blog.Post: \d+ copied, 1 deleted')
+        self.assertEqual(SearchResults('synchronised', using='backup').count(), 4)
+
+    def test_pruning_leaves_the_site_alone(self):
+        """Test that deleting rows from the backup neither bumps the primary's content version nor runs the site's handlers."""
+        self.sync()
+        version = ContentVersion.current()
+        # Rows the source never had: an author with a tagged, commented post.
+        author = Author.objects.using('backup').create(first_name='Old', last_name='Author', email_address='o@a.com')
+        tag = Tag.objects.using('backup').create(caption='old')
+        post = Post.objects.using('backup').create(
+            title='Old', excerpt='Old', slug='old-post', content='Content of an old post', author=author
+        )
+        post.tags.add(tag)
+        Comment.objects.using('backup').create(user_name='Old', user_mail='o@a.com', text='Old', post=post)
+
+        with self.captureOnCommitCallbacks(using='backup', execute=True) as callbacks:
+            self.sync()
+        self.assertEqual(callbacks, [])
+        self.assertInSync()
+        self.assertEqual(ContentVersion.current(), version)
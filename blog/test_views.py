@@ -1,4 +1,7 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth.models import User
 from django.urls import reverse
 from .models import Post, Author, Comment, Tag
 from io import BytesIO
@@ -19,6 +22,41 @@ def create_test_image():
     )
 
 
+def seed_posts(count, author, tags=()):
+    """Bulk create `count` posts, each linked to every tag."""
+    posts = Post.objects.bulk_create([
+        Post(
+            title=f'Seeded Post {i}',
+            excerpt=f'Seeded excerpt {i}',
+            slug=f'seeded-post-{i}',
+            content=f'Seeded content for post {i} with minimum length',
+            author=author,
+            image=f'posts/seeded-{i}.jpg'
+        )
+        for i in range(count)
+    ])
+    Post.tags.through.objects.bulk_create([
+        Post.tags.through(post_id=post.id, tag_id=tag.id)
+        for post in posts
+        for tag in tags
+    ])
+    return posts
+
+
+class QueryBudgetMixin:
+    """Assertion that fails when a request runs more SQL queries than allowed."""
+
+    def assertQueryBudget(self, budget, method, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data)
+        self.assertLessEqual(
+            len(context.captured_queries), budget,
+            f'{method.upper()} {url} ran {len(context.captured_queries)} queries, '
+            f'budget is {budget}:\n' + '\n'.join(q['sql'] for q in context.captured_queries)
+        )
+        return response
+
+
 class StartingPageViewTest(TestCase):
     """Tests for the StartingPageView."""
     
@@ -101,6 +139,155 @@ class PostsViewTest(TestCase):
             self.assertGreaterEqual(posts[i].date, posts[i + 1].date)
 
 
+@override_settings(BLOG_KEYSET_PAGINATION=True)
+class PostsViewKeysetPaginationTest(QueryBudgetMixin, TestCase):
+    """Tests for PostsView with cursor pagination enabled."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(
+            first_name='Jane',
+            last_name='Smith',
+            email_address='jane@example.com'
+        )
+        cls.posts = seed_posts(25, cls.author)
+
+    def walk(self, url):
+        """Follow the "older posts" links from `url`, returning every page's responses."""
+        responses = []
+        while url:
+            response = self.client.get(url)
+            responses.append(response)
+            url = response.context.get('next_page_url')
+            if url:
+                url = reverse('posts_page') + url
+        return responses
+
+    def test_walks_every_post_once_in_order(self):
+        """Test that following the cursors visits all posts newest first."""
+        responses = self.walk(reverse('posts_page'))
+        seen = [post.id for response in responses for post in response.context['posts']]
+        expected = list(Post.objects.order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual([len(r.context['posts']) for r in responses], [10, 10, 5])
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Test that the "newer posts" cursor goes back to the page before."""
+        first, second = self.walk(reverse('posts_page'))[:2]
+        response = self.client.get(reverse('posts_page') + second.context['previous_page_url'])
+        self.assertEqual(list(response.context['posts']), list(first.context['posts']))
+        self.assertNotIn('previous_page_url', response.context)
+
+    def test_skips_count_query(self):
+        """Test that a deep page is fetched with one query and no COUNT or OFFSET."""
+        second = self.walk(reverse('posts_page'))[1]
+        url = reverse('posts_page') + second.context['next_page_url']
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        # The first query is the aggregate behind the conditional GET validators.
+        page_queries = [query['sql'] for query in context.captured_queries[1:]]
+        self.assertEqual(len(page_queries), 1)
+        self.assertNotIn('COUNT(', page_queries[0].upper())
+        self.assertNotIn('OFFSET', page_queries[0].upper())
+        self.assertContains(response, 'Newer Posts')
+        self.assertNotContains(response, 'Older Posts')
+
+    def test_invalid_cursor_returns_404(self):
+        """Test that a tampered cursor is rejected."""
+        response = self.client.get(reverse('posts_page'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchViewTest(TestCase):
+    """Tests for the SearchView and the search index kept by the Post signals."""
+
+    def setUp(self):
+        """Create posts matching and not matching the search terms."""
+        self.author = Author.objects.create(
+            first_name='Jane',
+            last_name='Smith',
+            email_address='jane@example.com'
+        )
+        self.title_match = Post.objects.create(
+            title='Mountains at dawn',
+            excerpt='A hike',
+            slug='mountains-at-dawn',
+            content='We started walking long before sunrise.',
+            author=self.author
+        )
+        self.content_match = Post.objects.create(
+            title='Woods',
+            excerpt='A walk',
+            slug='woods',
+            content='Far away you could see the mountains <b>glowing</b> in the evening.',
+            author=self.author
+        )
+        self.no_match = Post.objects.create(
+            title='Coding',
+            excerpt='Some code',
+            slug='coding',
+            content='Nothing about the outdoors in here at all.',
+            author=self.author
+        )
+
+    def search(self, query, **params):
+        return self.client.get(reverse('search_page'), {'q': query, **params})
+
+    def test_search_page_loads_without_query(self):
+        """Test that the search page renders an empty form."""
+        response = self.client.get(reverse('search_page'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'blog/search.html')
+        self.assertEqual(list(response.context['results']), [])
+
+    def test_search_ranks_title_matches_first(self):
+        """Test that matching posts are found and title hits rank highest."""
+        response = self.search('mountains')
+        self.assertEqual(list(response.context['results']), [self.title_match, self.content_match])
+
+    def test_search_excerpt_is_highlighted_and_escaped(self):
+        """Test that matched terms are marked and post HTML is escaped."""
+        response = self.search('glowing')
+        excerpt = response.context['results'][0].search_excerpt
+        self.assertIn('<mark>glowing</mark>', excerpt)
+        self.assertIn('&lt;b&gt;', excerpt)
+
+    def test_search_index_follows_post_updates(self):
+        """Test that edited posts are reindexed on save."""
+        self.no_match.content = 'Now this post is about mountains as well.'
+        self.no_match.save()
+        self.assertIn(self.no_match, self.search('mountains').context['results'])
+
+        self.no_match.content = 'And now it is about code again.'
+        self.no_match.save()
+        self.assertNotIn(self.no_match, self.search('mountains').context['results'])
+
+    def test_search_index_follows_post_deletes(self):
+        """Test that deleted posts disappear from the results."""
+        self.title_match.delete()
+        self.assertEqual(list(self.search('mountains').context['results']), [self.content_match])
+
+    def test_search_results_are_paginated(self):
+        """Test that results are split into pages of ten."""
+        for i in range(12):
+            Post.objects.create(
+                title=f'Mountain trip {i}',
+                excerpt='Trip',
+                slug=f'mountain-trip-{i}',
+                content='Another day in the mountains.',
+                author=self.author
+            )
+        response = self.search('mountains')
+        self.assertTrue(response.context['is_paginated'])
+        self.assertEqual(len(response.context['results']), 10)
+        self.assertEqual(len(self.search('mountains', page=2).context['results']), 4)
+
+    def test_search_treats_operators_as_text(self):
+        """Test that query syntax characters do not cause errors."""
+        response = self.search('"mountains OR (NEAR -')
+        self.assertEqual(response.status_code, 200)
+
+
 class PostDetailViewTest(TestCase):
     """Tests for the PostDetailView."""
     
@@ -178,6 +365,297 @@ class PostDetailViewTest(TestCase):
         self.assertTrue(response.context['is_saved'])
 
 
+@override_settings(BLOG_PUBLIC_POST_DETAIL=True)
+class PublicPostDetailTest(TestCase):
+    """Tests for post detail pages rendered without per-visitor state."""
+
+    def setUp(self):
+        """Create a post and a client that enforces CSRF checks."""
+        self.client = Client(enforce_csrf_checks=True)
+        self.author = Author.objects.create(
+            first_name='John',
+            last_name='Doe',
+            email_address='john@example.com'
+        )
+        self.post = Post.objects.create(
+            title='Test Post',
+            excerpt='Test excerpt',
+            slug='test-post',
+            content='This is test content with minimum length',
+            author=self.author,
+            image='posts/test.jpg'
+        )
+        self.url = reverse('post_detail_page', args=[self.post.slug])
+
+    def test_page_is_publicly_cacheable(self):
+        """Test that the page sets shared cache headers and no cookies."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=300', response['Cache-Control'])
+        self.assertIn('stale-while-revalidate=3600', response['Cache-Control'])
+        self.assertFalse(response.cookies)
+        self.assertFalse(response.has_header('Vary'))
+
+    def test_page_is_identical_for_every_visitor(self):
+        """Test that the read-later state of a session does not change the HTML."""
+        anonymous = self.client.get(self.url).content
+        session = self.client.session
+        session['stored_posts'] = [self.post.id]
+        session.save()
+        self.assertEqual(self.client.get(self.url).content, anonymous)
+
+    def test_state_endpoint_returns_token_and_saved_state(self):
+        """Test that the uncached endpoint carries the per-visitor state."""
+        session = self.client.session
+        session['stored_posts'] = [self.post.id]
+        session.save()
+        response = self.client.get(reverse('read_later_state'), {'post_id': self.post.id})
+        self.assertTrue(response.json()['is_saved'])
+        self.assertTrue(response.json()['csrf_token'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_form_with_token_from_state_endpoint(self):
+        """Test that JavaScript clients post with the fetched CSRF token."""
+        token = self.client.get(reverse('read_later_state')).json()['csrf_token']
+        response = self.client.post(
+            reverse('read_later_page'),
+            {'post_id': self.post.id, 'csrfmiddlewaretoken': token}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(self.post.id, self.client.session['stored_posts'])
+
+    def test_form_without_token_from_same_origin(self):
+        """Test that forms posted without JavaScript still work."""
+        response = self.client.post(
+            self.url,
+            {'user_name': 'Reader', 'user_mail': 'reader@example.com', 'text': 'No JS', 'csrfmiddlewaretoken': ''},
+            HTTP_ORIGIN='http://testserver'
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.post.comments.count(), 1)
+
+        response = self.client.post(
+            reverse('read_later_page'),
+            {'post_id': self.post.id},
+            HTTP_REFERER='http://testserver' + self.url
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_form_without_token_from_other_origin_is_rejected(self):
+        """Test that cross-site and origin-less posts without a token fail."""
+        response = self.client.post(
+            reverse('read_later_page'), {'post_id': self.post.id}, HTTP_ORIGIN='https://evil.example.com'
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(reverse('read_later_page'), {'post_id': self.post.id})
+        self.assertEqual(response.status_code, 403)
+
+    def test_bad_token_is_rejected(self):
+        """Test that a token that is present is still checked."""
+        response = self.client.post(
+            reverse('read_later_page'),
+            {'post_id': self.post.id, 'csrfmiddlewaretoken': 'x' * 64},
+            HTTP_ORIGIN='http://testserver'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(BLOG_PUBLIC_POST_DETAIL=False)
+    def test_tokenless_form_rejected_outside_public_mode(self):
+        """Test that the Origin fallback is only used for public pages."""
+        response = self.client.post(
+            reverse('read_later_page'), {'post_id': self.post.id}, HTTP_ORIGIN='http://testserver'
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(BLOG_COMMENTS_PER_PAGE=5)
+class CommentPaginationTest(QueryBudgetMixin, TestCase):
+    """Tests for the paged comments of the post detail page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(
+            first_name='John',
+            last_name='Doe',
+            email_address='john@example.com'
+        )
+        cls.post = seed_posts(1, cls.author)[0]
+        cls.comments = Comment.objects.bulk_create([
+            Comment(user_name=f'Reader {i}', user_mail='r@example.com', text=f'Comment {i}', post=cls.post)
+            for i in range(12)
+        ])
+        cls.newest_first = list(Comment.objects.order_by('-id').values_list('id', flat=True))
+
+    def comments_url(self, before):
+        return reverse('post_comments_page', args=[self.post.slug]) + f'?before={before}'
+
+    def test_first_paint_shows_newest_comments(self):
+        """Test that the post page only renders the newest page of comments."""
+        response = self.client.get(reverse('post_detail_page', args=[self.post.slug]))
+        comments = response.context['comments']
+        self.assertEqual([c.id for c in comments], self.newest_first[:5])
+        self.assertContains(response, self.comments_url(self.newest_first[4]))
+
+    def test_fragment_endpoint_walks_older_pages(self):
+        """Test that following the cursors returns every comment once."""
+        seen = self.newest_first[:5]
+        before = self.newest_first[4]
+        while before:
+            response = self.assertQueryBudget(2, 'get', self.comments_url(before), {})
+            seen += [c.id for c in response.context['comments']]
+            before = response.context['comments'].next_cursor
+        self.assertEqual(seen, self.newest_first)
+
+    def test_fragment_request_renders_list_items_only(self):
+        """Test that comments.js gets bare list items to append."""
+        response = self.client.get(self.comments_url(self.newest_first[4]), HTTP_X_REQUESTED_WITH='fetch')
+        self.assertTemplateUsed(response, 'blog/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertContains(response, 'class="more-comments"')
+        self.assertIn('X-Requested-With', response['Vary'])
+
+    def test_plain_request_renders_full_page(self):
+        """Test that the "older comments" link works without JavaScript."""
+        response = self.client.get(self.comments_url(self.newest_first[9]))
+        self.assertTemplateUsed(response, 'blog/post-comments.html')
+        self.assertEqual(len(response.context['comments']), 2)
+        self.assertNotContains(response, 'class="more-comments"')
+        self.assertIn('X-Requested-With', response['Vary'])
+
+    def test_invalid_cursor_returns_404(self):
+        """Test that a missing or malformed cursor is rejected."""
+        url = reverse('post_comments_page', args=[self.post.slug])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, {'before': 'x'}).status_code, 404)
+
+
+class ConditionalGetTest(TestCase):
+    """Tests for the ETag and Last-Modified validators of the blog views."""
+
+    def setUp(self):
+        """Create two posts."""
+        self.author = Author.objects.create(
+            first_name='John',
+            last_name='Doe',
+            email_address='john@example.com'
+        )
+        self.posts = seed_posts(2, self.author)
+        self.post = self.posts[0]
+        self.detail_url = reverse('post_detail_page', args=[self.post.slug])
+
+    def revalidate(self, url):
+        """Fetch `url`, then fetch it again with the validators it returned."""
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('ETag'))
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_listings_return_304_without_rendering(self):
+        """Test that unchanged listings are answered from the validators alone."""
+        for name in ('starting_page', 'posts_page'):
+            response = self.client.get(reverse(name))
+            self.assertTrue(response.has_header('Last-Modified'))
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+
+    def test_listing_if_modified_since(self):
+        """Test that Last-Modified is honoured on its own."""
+        response = self.client.get(reverse('posts_page'))
+        response = self.client.get(reverse('posts_page'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_listing_changes_with_updates_and_deletes(self):
+        """Test that editing or deleting a post changes the listing ETag."""
+        # The content version is bumped once the write commits.
+        etag = self.client.get(reverse('posts_page'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.get(pk=self.post.pk).save()
+        self.assertEqual(self.client.get(reverse('posts_page'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(reverse('posts_page'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts[1].delete()
+        self.assertEqual(self.client.get(reverse('posts_page'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_listing_validators_are_a_single_lookup(self):
+        """Test that the listing validators do not aggregate over the posts."""
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('posts_page'), HTTP_IF_NONE_MATCH='"x"')
+        self.assertIn('blog_contentversion', context.captured_queries[0]['sql'])
+        self.assertNotIn('blog_post', context.captured_queries[0]['sql'])
+
+    def test_listing_pages_have_different_etags(self):
+        """Test that the query string is part of the listing ETag."""
+        self.assertNotEqual(
+            self.client.get(reverse('posts_page'))['ETag'],
+            self.client.get(reverse('posts_page'), {'page': 1})['ETag']
+        )
+
+    def test_post_detail_returns_304(self):
+        """Test that an unchanged post page is not rendered again."""
+        self.assertEqual(self.revalidate(self.detail_url).status_code, 304)
+        self.assertFalse(self.client.get(self.detail_url).has_header('Last-Modified'))
+
+    def test_post_detail_changes_with_comments(self):
+        """Test that a new comment changes the post page ETag."""
+        etag = self.client.get(self.detail_url)['ETag']
+        Comment.objects.create(user_name='Reader', user_mail='r@example.com', text='Hi', post=self.post)
+        self.assertEqual(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_post_detail_changes_with_comment_edits(self):
+        """Test that editing an existing comment changes the post page ETag."""
+        comment = Comment.objects.create(user_name='Reader', user_mail='r@example.com', text='Hi', post=self.post)
+        etag = self.client.get(self.detail_url)['ETag']
+        comment.text = 'Hello'
+        comment.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Hello')
+
+    def test_post_detail_changes_with_author_and_tags(self):
+        """Test that editing the post's author or renaming one of its tags changes the post page ETag."""
+        tag = Tag.objects.create(caption='travel')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.tags.add(tag)
+
+        etag = self.client.get(self.detail_url)['ETag']
+        self.author.email_address = 'jane@example.com'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save()
+        self.assertEqual(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(self.detail_url)['ETag']
+        tag.caption = 'hiking'
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'hiking')
+
+    def test_post_detail_changes_with_read_later_state(self):
+        """Test that saving the post for later changes the post page ETag."""
+        etag = self.client.get(self.detail_url)['ETag']
+        self.client.post(reverse('read_later_page'), {'post_id': self.post.id})
+        self.assertEqual(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_post_detail_missing_post_is_404(self):
+        """Test that unknown slugs still 404."""
+        response = self.client.get(reverse('post_detail_page', args=['missing']), HTTP_IF_NONE_MATCH='"x"')
+        self.assertEqual(response.status_code, 404)
+
+    def test_read_later_returns_304_until_list_changes(self):
+        """Test that the read later page revalidates against the session."""
+        self.client.post(reverse('read_later_page'), {'post_id': self.post.id})
+        self.assertEqual(self.revalidate(reverse('read_later_page')).status_code, 304)
+
+        etag = self.client.get(reverse('read_later_page'))['ETag']
+        self.client.post(reverse('read_later_page'), {'post_id': self.posts[1].id})
+        response = self.client.get(reverse('read_later_page'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
 class ReadLaterViewTest(TestCase):
     """Tests for the ReadLaterView."""
     
@@ -243,3 +721,64 @@ class ReadLaterViewTest(TestCase):
         response = self.client.get(reverse('read_later_page'))
         self.assertTrue(response.context['has_posts'])
         self.assertEqual(len(response.context['posts']), 2)
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Every page runs a fixed number of queries however much data there is."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(
+            first_name='John',
+            last_name='Doe',
+            email_address='john@example.com'
+        )
+        cls.tags = [Tag.objects.create(caption=f'Tag {i}') for i in range(5)]
+        cls.posts = seed_posts(300, cls.author, cls.tags)
+        cls.post = cls.posts[0]
+        Comment.objects.bulk_create([
+            Comment(
+                user_name=f'Reader {i}',
+                user_mail=f'reader{i}@example.com',
+                text=f'Comment {i}',
+                post=cls.post
+            )
+            for i in range(200)
+        ])
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def test_starting_page_budget(self):
+        response = self.assertQueryBudget(2, 'get', reverse('starting_page'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_posts_page_budget(self):
+        response = self.assertQueryBudget(3, 'get', reverse('posts_page'))
+        self.assertEqual(len(response.context['posts']), 10)
+
+    def test_post_detail_budget(self):
+        response = self.assertQueryBudget(4, 'get', reverse('post_detail_page', args=[self.post.slug]))
+        self.assertEqual(len(response.context['comments']), 20)
+        self.assertEqual(len(response.context['post_tags']), 5)
+
+    def test_post_detail_invalid_comment_budget(self):
+        response = self.assertQueryBudget(
+            3, 'post', reverse('post_detail_page', args=[self.post.slug]), {'user_name': ''}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_read_later_budget(self):
+        session = self.client.session
+        session['stored_posts'] = [post.id for post in self.posts[:100]]
+        session.save()
+        response = self.assertQueryBudget(3, 'get', reverse('read_later_page'))
+        self.assertEqual(len(response.context['posts']), 100)
+
+    def test_post_admin_changelist_budget(self):
+        self.client.force_login(self.admin_user)
+        response = self.assertQueryBudget(7, 'get', reverse('admin:blog_post_changelist'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_admin_changelist_budget(self):
+        self.client.force_login(self.admin_user)
+        response = self.assertQueryBudget(5, 'get', reverse('admin:blog_comment_changelist'))
+        self.assertEqual(response.status_code, 200)
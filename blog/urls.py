@@ -1,10 +1,21 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
 
-urlpatterns = [
-    path('', views.StartingPageView.as_view(), name='starting_page'),
-    path('posts/', views.PostsView.as_view(), name='posts_page'),
-    path('posts/<slug:slug>', views.PostDetailView.as_view(), name='post_detail_page'),
-    path('read-later', views.ReadLaterView.as_view(), name='read_later_page'),
-]
+
+def blog_urlpatterns(blog_views):
+    """The blog's routes to the views of ``blog_views``, either module."""
+    return [
+        path('', blog_views.StartingPageView.as_view(), name='starting_page'),
+        path('posts/', blog_views.PostsView.as_view(), name='posts_page'),
+        path('search/', blog_views.SearchView.as_view(), name='search_page'),
+        path('posts/<slug:slug>', blog_views.PostDetailView.as_view(), name='post_detail_page'),
+        path('posts/<slug:slug>/comments', blog_views.PostCommentsView.as_view(), name='post_comments_page'),
+        path('read-later', blog_views.ReadLaterView.as_view(), name='read_later_page'),
+        path('read-later/state', blog_views.ReadLaterStateView.as_view(), name='read_later_state'),
+    ]
+
+
+# The async views only pay off under an ASGI server; see blog/async_views.py.
+urlpatterns = blog_urlpatterns(async_views if settings.BLOG_ASYNC_VIEWS else views)
@@ -1,7 +1,19 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from django.urls import reverse
-from .models import Post
+from django.conf import settings
+from django.db import router
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import condition
+from .models import Comment, Post
+from .cache import CachedPageMixin
+from .conditional import listing_etag, listing_last_modified, post_detail_etag, read_later_etag
+from .decorators import csrf_protect_public_form
+from .pagination import CommentPage, KeysetPage, KeysetPaginator
+from .search import SearchResults
 from django.views.generic import ListView
 from django.views import View
 from .forms import CommentForm
@@ -9,50 +21,140 @@ from .forms import CommentForm
 # Create your views here.
 
 
-class StartingPageView(ListView):
+listing_condition = condition(etag_func=listing_etag, last_modified_func=listing_last_modified)
+
+
+@method_decorator(listing_condition, name='get')
+class StartingPageView(CachedPageMixin, ListView):
     template_name = 'blog/index.html'
     model = Post
     ordering = ['-date']
     context_object_name = 'posts'
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = Post.objects.for_listing()
         data = queryset[:3]
         return data
     
 
-class PostsView(ListView):
+def page_urls(page):
+    """Links to the pages before and after ``page`` of the post listing."""
+    urls = {}
+    if isinstance(page, KeysetPage):
+        if page.has_next():
+            urls['next_page_url'] = f'?cursor={page.next_cursor}'
+        if page.has_previous():
+            urls['previous_page_url'] = f'?cursor={page.previous_cursor}'
+    else:
+        if page.has_next():
+            urls['next_page_url'] = f'?page={page.next_page_number()}'
+        if page.has_previous():
+            urls['previous_page_url'] = f'?page={page.previous_page_number()}'
+    return urls
+
+
+@method_decorator(listing_condition, name='get')
+class PostsView(CachedPageMixin, ListView):
     template_name = 'blog/all-posts.html'
     model = Post
     context_object_name = 'posts'
     ordering = ['-date']
     paginate_by = 10  # Add pagination: 10 posts per page
+    cache_query_params = ('page', 'cursor')
+
+    def get_queryset(self):
+        return Post.objects.for_listing()
+
+    def paginate_queryset(self, queryset, page_size):
+        if not settings.BLOG_KEYSET_PAGINATION:
+            return super().paginate_queryset(queryset, page_size)
 
+        paginator = KeysetPaginator(queryset, page_size)
+        page = paginator.page(self.request.GET.get('cursor'))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context['page_obj']
+
+        if page is None:
+            return context
+
+        context.update(page_urls(page))
+        return context
+
+@method_decorator(listing_condition, name='get')
+class SearchView(ListView):
+    template_name = 'blog/search.html'
+    context_object_name = 'results'
+    paginate_by = 10
+
+    def get_queryset(self):
+        return SearchResults(self.request.GET.get('q', ''), using=router.db_for_read(Post))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.object_list.query
+        return context
+
+
+def is_post_saved(request, post_id):
+    stored_posts = request.session.get('stored_posts')
+
+    if stored_posts is None:
+        is_saved = False
+    else:
+        is_saved = post_id in stored_posts
+
+    return is_saved
+
+
+@method_decorator(csrf_protect_public_form, name='dispatch')
 class PostDetailView(View):
 
     def is_post_saved(self, request, post_id):
-        stored_posts = request.session.get('stored_posts')
+        return is_post_saved(request, post_id)
+    
+    def render_detail(self, request, post, comment_form):
+        # post.tags comes from the prefetch cache and the comments are only
+        # queried when their cached fragment is missing, so the page costs
+        # the same number of queries however many tags and comments it has.
+        context = {
+            'post': post,
+            'post_tags': post.tags.all(),
+            'comment_form': comment_form,
+            'comments': CommentPage(post.comments.all(), settings.BLOG_COMMENTS_PER_PAGE),
+        }
 
-        if stored_posts is None:
-            is_saved = False
+        if settings.BLOG_PUBLIC_POST_DETAIL:
+            # Leave out the session and the CSRF token so the page is the same
+            # for every visitor; post-detail.js fetches both from
+            # ReadLaterStateView.
+            context['public_page'] = True
         else:
-            is_saved = post_id in stored_posts
+            context['is_saved'] = self.is_post_saved(request, post.id)
 
-        return is_saved
-    
+        return render(request, 'blog/post-detail.html', context)
+
+    @method_decorator(condition(etag_func=post_detail_etag))
     def get(self, request, slug):
-        post = get_object_or_404(Post, slug=slug)
-        return render(request, 'blog/post-detail.html', {
-            'post': post,
-            'post_tags': post.tags.all(),
-            'comment_form': CommentForm(),
-            'comments': post.comments.all().order_by('-id'),
-            'is_saved': self.is_post_saved(request, post.id)
-        })
+        post = get_object_or_404(Post.objects.for_detail(), slug=slug)
+        response = self.render_detail(request, post, CommentForm())
+
+        if settings.BLOG_PUBLIC_POST_DETAIL:
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=0,
+                s_maxage=settings.BLOG_PUBLIC_CACHE_MAX_AGE,
+                stale_while_revalidate=settings.BLOG_PUBLIC_CACHE_STALE_WHILE_REVALIDATE,
+            )
+
+        return response
     
     def post(self, request, slug):
         comment_form = CommentForm(request.POST)
-        post = get_object_or_404(Post, slug=slug)
+        post = get_object_or_404(Post.objects.for_detail(), slug=slug)
 
         if comment_form.is_valid():
             comment = comment_form.save(commit=False)
@@ -60,14 +162,36 @@ class PostDetailView(View):
             comment.save()
             return HttpResponseRedirect(reverse('post_detail_page', args=[slug]))
         
-        return render(request, 'blog/post-detail.html', {
-            'post': post,
-            'post_tags': post.tags.all(),
-            'comment_form': CommentForm(),
-            'comments': post.comments.all().order_by('-id'),
-            'is_saved': self.is_post_saved(request, post.id)
-        })
+        return self.render_detail(request, post, comment_form)
     
+class PostCommentsView(View):
+    """
+    Older comments of a post, one keyset page at a time. Requests made by
+    comments.js get just the list items; plain links get a full page.
+    """
+
+    def get(self, request, slug):
+        post = get_object_or_404(Post.objects.only('id', 'slug', 'title'), slug=slug)
+
+        try:
+            before = int(request.GET['before'])
+        except (KeyError, ValueError):
+            raise Http404('Invalid comment cursor')
+
+        comments = CommentPage(Comment.objects.filter(post_id=post.id), settings.BLOG_COMMENTS_PER_PAGE, before)
+
+        if request.headers.get('X-Requested-With') == 'fetch':
+            template_name = 'blog/includes/comments.html'
+        else:
+            template_name = 'blog/post-comments.html'
+
+        response = render(request, template_name, {'post': post, 'comments': comments})
+        # The same URL answers with a fragment or a full page.
+        patch_vary_headers(response, ['X-Requested-With'])
+        return response
+
+
+@method_decorator(csrf_protect_public_form, name='dispatch')
 class ReadLaterView(View):
     
     def post(self, request):
@@ -86,6 +210,7 @@ class ReadLaterView(View):
         request.session['stored_posts'] = stored_posts
         return HttpResponseRedirect('/')
     
+    @method_decorator(condition(etag_func=read_later_etag))
     def get(self, request):
         stored_posts = request.session.get('stored_posts')
         context = {}
@@ -94,8 +219,24 @@ class ReadLaterView(View):
             context['stored_posts'] = []
             context['has_posts'] = False
         else:
-            posts = Post.objects.filter(id__in=stored_posts)
+            posts = Post.objects.filter(id__in=stored_posts).only('title', 'slug')
             context['posts'] = posts
             context['has_posts'] = True
         
         return render(request, 'blog/stored-posts.html', context)
+
+
+@method_decorator(never_cache, name='dispatch')
+class ReadLaterStateView(View):
+    """The per-visitor state left out of publicly cached post pages."""
+
+    def get(self, request):
+        try:
+            post_id = int(request.GET.get('post_id', ''))
+        except ValueError:
+            post_id = None
+
+        return JsonResponse({
+            'csrf_token': get_token(request),
+            'is_saved': post_id is not None and is_post_saved(request, post_id),
+        })
@@ -0,0 +1,147 @@
+"""
+Gunicorn configuration, used by the Procfile and the Dockerfile:
+
+    gunicorn --config gunicorn.conf.py
+
+Every setting can be overridden from the environment:
+
+- GUNICORN_WORKER_CLASS: ``sync`` (default), ``gthread``, or
+  ``uvicorn_worker.UvicornWorker`` to serve my_site.asgi (see
+  BLOG_ASYNC_VIEWS).
+- WEB_CONCURRENCY: worker processes. By default sized from the CPUs and
+  memory available to the container, at GUNICORN_WORKER_MEMORY_MB (default
+  150) per worker.
+- GUNICORN_THREADS: threads per gthread worker. By default enough for the
+  workers together to have about four requests per CPU in flight, within
+  the memory left over at GUNICORN_THREAD_MEMORY_MB (default 10) per
+  thread. DATABASE_POOL_MAX_SIZE defaults to the worker's threads.
+- GUNICORN_MAX_REQUESTS (default 1000) and GUNICORN_MAX_REQUESTS_JITTER
+  (default a tenth of it): recycle workers after that many requests, each
+  at a different count so they do not all restart at once.
+- GUNICORN_PRELOAD: import Django once in the master before forking
+  (default True), so workers share its memory and start faster.
+- PORT, GUNICORN_TIMEOUT.
+"""
+import os
+import tempfile
+
+
+def cpu_count():
+    """The CPUs this process may use, honouring a cgroup (container) quota."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+    except (OSError, ValueError):
+        return cpus
+    if quota == 'max':
+        return cpus
+    return max(1, min(cpus, int(quota) // int(period)))
+
+
+def memory_bytes():
+    """The memory available to this process, honouring a cgroup limit."""
+    total = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                limit = f.read().strip()
+        except OSError:
+            continue
+        if limit.isdigit():
+            return min(total, int(limit))
+    return total
+
+
+def default_workers(worker_class, cpus, memory, worker_memory):
+    if worker_class == 'sync':
+        # Sync workers idle while waiting on the database; the usual 2n + 1.
+        workers = 2 * cpus + 1
+    else:
+        # Threaded and async workers overlap their own waits.
+        workers = cpus + 1 if worker_class == 'gthread' else cpus
+    return max(1, min(workers, memory // worker_memory))
+
+
+def default_threads(cpus, workers, memory, worker_memory, thread_memory):
+    # Requests mostly wait on the database, so keep several per CPU going.
+    threads = max(2, -(-4 * cpus // workers))
+    spare = memory - workers * worker_memory
+    return max(1, min(threads, spare // (workers * thread_memory)))
+
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+_cpus = cpu_count()
+_memory = memory_bytes()
+_worker_memory = int(os.getenv('GUNICORN_WORKER_MEMORY_MB', 150)) * 1024 * 1024
+workers = int(os.getenv('WEB_CONCURRENCY', 0)) or default_workers(worker_class, _cpus, _memory, _worker_memory)
+if worker_class == 'gthread':
+    threads = int(os.getenv('GUNICORN_THREADS', 0)) or default_threads(
+        _cpus, workers, _memory, _worker_memory, int(os.getenv('GUNICORN_THREAD_MEMORY_MB', 10)) * 1024 * 1024
+    )
+    # One pooled connection per thread (DATABASE_POOL); read by the settings
+    # of the app, which is loaded after this file.
+    os.environ.setdefault('DATABASE_POOL_MAX_SIZE', str(threads))
+elif worker_class == 'sync':
+    os.environ.setdefault('DATABASE_POOL_MAX_SIZE', '1')
+
+wsgi_app = 'my_site.asgi:application' if 'uvicorn' in worker_class.lower() else 'my_site.wsgi:application'
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+# The workers' metrics (BLOG_METRICS) are merged from files in this
+# directory; it has to be set before the app imports prometheus_client.
+if os.getenv('BLOG_METRICS', 'False') == 'True':
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='blog-metrics-'))
+
+# Worker heartbeats are file writes; keep them off a container's overlay
+# filesystem.
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+
+def close_connections():
+    from django.core.cache import caches
+    from django.db import connections
+
+    connections.close_all()
+    caches.close_all()
+    # A psycopg pool (DATABASE_POOL) holds connections and threads of its own.
+    for connection in connections.all(initialized_only=True):
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+
+
+def on_starting(server):
+    # Samples left by a previous run would be added to this one's.
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith('.db'):
+                os.remove(os.path.join(directory, name))
+
+
+def pre_fork(server, worker):
+    # Anything the preloaded app connected to would be shared, socket and
+    # all, by every worker forked after it; close it in the master first.
+    if preload_app:
+        close_connections()
+
+
+def post_fork(server, worker):
+    # And drop whatever a worker might still have inherited, so each one
+    # opens its own connections.
+    if preload_app:
+        close_connections()
+
+
+def child_exit(server, worker):
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -48,14 +48,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog.metrics.MetricsMiddleware',
+    'blog.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'blog.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'blog.profiler.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    'blog.staticfiles.StaticFilesMiddleware',
 ]
 
 ROOT_URLCONF = 'my_site.urls'
@@ -86,7 +90,7 @@ WSGI_APPLICATION = 'my_site.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': os.getenv('DATABASE_ENGINE', 'django.db.backends.postgresql_psycopg2'),
         'NAME': os.getenv('DATABASE_NAME', 'postgres'),
         'USER': os.getenv('DATABASE_USER', 'postgres'),
         'PASSWORD': os.getenv('DATABASE_PASSWORD'),
@@ -99,6 +103,80 @@ DATABASES = {
     }
 }
 
+# Connections to the primary. DATABASE_POOL=True takes them from a psycopg 3
+# connection pool of at most DATABASE_POOL_MAX_SIZE per worker process (which
+# gunicorn.conf.py defaults to the worker's threads), checked before being handed out; a request waits up
+# to DATABASE_POOL_TIMEOUT seconds for one. Otherwise DATABASE_CONN_MAX_AGE
+# keeps a connection per thread open for that many seconds, health checked
+# before reuse; 0 (the default) closes it after every request.
+DATABASE_POOL = os.getenv('DATABASE_POOL', 'False') == 'True'
+
+if DATABASE_POOL and 'postgresql' in DATABASES['default']['ENGINE']:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', 1)),
+            'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE', 4)),
+            'timeout': float(os.getenv('DATABASE_POOL_TIMEOUT', 10)),
+            'max_idle': float(os.getenv('DATABASE_POOL_MAX_IDLE', 300)),
+        },
+    }
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DATABASE_CONN_MAX_AGE', 0))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = DATABASES['default']['CONN_MAX_AGE'] != 0
+
+# Log each process's connection counters (see blog/pool.py) this often, in
+# seconds; 0 turns it off.
+DATABASE_STATS_SECONDS = int(os.getenv('DATABASE_STATS_SECONDS', 300))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'blog': {'handlers': ['console'], 'level': os.getenv('BLOG_LOG_LEVEL', 'INFO')},
+    },
+}
+
+# Reads of the public blog pages go to BLOG_READ_REPLICA (e.g. 'backup') when
+# it is set; see blog/routers.py.
+DATABASE_ROUTERS = ['blog.routers.ReplicaRouter']
+
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# CACHE_BACKEND is one of 'locmem', 'file' or 'redis'. The Redis backend
+# needs the redis package, which is not in requirements.txt.
+
+_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', 'my_site'),
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', BASE_DIR / '.cache'),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://127.0.0.1:6379'),
+    },
+}
+
+CACHES = {
+    'default': _CACHE_BACKENDS[os.getenv('CACHE_BACKEND', 'locmem')],
+    # Rendered template fragments ({% cache ... using="fragments" %}). Turned
+    # off with BLOG_FRAGMENT_CACHE=False, which swaps in the dummy backend.
+    'fragments': {
+        **_CACHE_BACKENDS[os.getenv('CACHE_BACKEND', 'locmem')],
+        'KEY_PREFIX': 'fragments',
+    } if os.getenv('BLOG_FRAGMENT_CACHE', 'False') == 'True' else {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+}
 
 
 # Password validation
@@ -148,6 +226,98 @@ MEDIA_ROOT = BASE_DIR / 'uploads'
 
 MEDIA_URL = '/files/'
 
+# Blog
+
+# Paginate the post listing with opaque (date, id) cursors instead of page
+# numbers. Avoids the COUNT and OFFSET queries on large post tables.
+BLOG_KEYSET_PAGINATION = os.getenv('BLOG_KEYSET_PAGINATION', 'False') == 'True'
+
+# Cache the rendered home page and post listing for visitors without a
+# session. Entries are invalidated by a content version that is bumped when
+# a Post, Tag or Author changes, so the timeout only bounds memory use.
+BLOG_PAGE_CACHE = os.getenv('BLOG_PAGE_CACHE', 'False') == 'True'
+BLOG_PAGE_CACHE_ALIAS = 'default'
+BLOG_PAGE_CACHE_TIMEOUT = int(os.getenv('BLOG_PAGE_CACHE_TIMEOUT', 24 * 60 * 60))
+
+# Comments shown on the post page; older ones are loaded a page at a time.
+BLOG_COMMENTS_PER_PAGE = int(os.getenv('BLOG_COMMENTS_PER_PAGE', 20))
+
+# Render post detail pages without session state or CSRF tokens so that a
+# CDN or reverse proxy can cache them for every visitor; the read-later state
+# and the token are fetched from /read-later/state by post-detail.js.
+BLOG_PUBLIC_POST_DETAIL = os.getenv('BLOG_PUBLIC_POST_DETAIL', 'False') == 'True'
+BLOG_PUBLIC_CACHE_MAX_AGE = int(os.getenv('BLOG_PUBLIC_CACHE_MAX_AGE', 300))
+BLOG_PUBLIC_CACHE_STALE_WHILE_REVALIDATE = int(os.getenv('BLOG_PUBLIC_CACHE_STALE_WHILE_REVALIDATE', 3600))
+
+# Build resized WebP and JPEG copies of post images in a pool of
+# BLOG_IMAGE_WORKERS background processes after a post with a new image is
+# saved. Existing images are backfilled with `manage.py build_image_derivatives`.
+BLOG_IMAGE_DERIVATIVES = os.getenv('BLOG_IMAGE_DERIVATIVES', 'False') == 'True'
+BLOG_IMAGE_WORKERS = int(os.getenv('BLOG_IMAGE_WORKERS', 2))
+
+# Store post images under the hash of their content, so that identical
+# uploads are stored once and every image URL can be cached for good.
+# Unreferenced images are removed with `manage.py gc_image_blobs`.
+BLOG_CONTENT_ADDRESSED_MEDIA = os.getenv('BLOG_CONTENT_ADDRESSED_MEDIA', 'False') == 'True'
+
+# Uploaded media (MEDIA_URL) is served by blog.media.serve_media. Set
+# BLOG_MEDIA_SENDFILE to 'x-accel-redirect' (nginx, with an internal location
+# at BLOG_MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT) or 'x-sendfile' (Apache
+# mod_xsendfile, lighttpd) to have the front-end server send the bytes.
+BLOG_MEDIA_SENDFILE = os.getenv('BLOG_MEDIA_SENDFILE', '')
+BLOG_MEDIA_ACCEL_PREFIX = os.getenv('BLOG_MEDIA_ACCEL_PREFIX', '/protected-files/')
+# Browser cache lifetime of media whose names are not content-hashed.
+BLOG_MEDIA_MAX_AGE = int(os.getenv('BLOG_MEDIA_MAX_AGE', 24 * 60 * 60))
+
+# Database alias that serves the blog's reads during GET requests, such as
+# 'backup'. Visitors stay on the primary for BLOG_REPLICA_PIN_SECONDS after a
+# write, and if the primary is unreachable every read goes to the replica for
+# BLOG_FAILOVER_SECONDS before the primary is tried again.
+BLOG_READ_REPLICA = os.getenv('BLOG_READ_REPLICA', '')
+BLOG_REPLICA_PIN_SECONDS = int(os.getenv('BLOG_REPLICA_PIN_SECONDS', 10))
+BLOG_FAILOVER_SECONDS = int(os.getenv('BLOG_FAILOVER_SECONDS', 30))
+
+# Route the listing, post and read-later pages to the async views in
+# blog/async_views.py. Only worth it when served by an ASGI server such as
+# GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker (see gunicorn.conf.py).
+BLOG_ASYNC_VIEWS = os.getenv('BLOG_ASYNC_VIEWS', 'False') == 'True'
+
+# Prometheus metrics at /metrics: latency, status, SQL queries and time per
+# URL name, template render times, and page and fragment cache lookups (see
+# blog/metrics.py). Under gunicorn they are merged across workers. With
+# BLOG_METRICS_TOKEN set, scrapes must send `Authorization: Bearer <token>`.
+BLOG_METRICS = os.getenv('BLOG_METRICS', 'False') == 'True'
+BLOG_METRICS_TOKEN = os.getenv('BLOG_METRICS_TOKEN', '')
+
+if BLOG_METRICS:
+    TEMPLATES[0]['BACKEND'] = 'blog.metrics.TimedDjangoTemplates'
+    CACHES['fragments'] = {'BACKEND': 'blog.metrics.CountedCache', 'OPTIONS': {'CACHE': CACHES['fragments']}}
+
+# Sampled request profiles (see blog/profiler.py), listed at /admin/profiles/.
+# A BLOG_PROFILER_SAMPLE_RATE fraction of requests is profiled, plus those
+# sending `X-Profile: <BLOG_PROFILER_TOKEN>` and staff requests sending an
+# X-Profile header or ?_profile=1.
+BLOG_PROFILER = os.getenv('BLOG_PROFILER', 'False') == 'True'
+BLOG_PROFILER_SAMPLE_RATE = float(os.getenv('BLOG_PROFILER_SAMPLE_RATE', 0))
+BLOG_PROFILER_TOKEN = os.getenv('BLOG_PROFILER_TOKEN', '')
+BLOG_PROFILER_INTERVAL = float(os.getenv('BLOG_PROFILER_INTERVAL', 0.001))
+BLOG_PROFILER_DIR = os.getenv('BLOG_PROFILER_DIR', BASE_DIR / 'profiles')
+BLOG_PROFILER_KEEP = int(os.getenv('BLOG_PROFILER_KEEP', 500))
+
+# Statements taking BLOG_SLOW_QUERY_MS or longer are appended to
+# BLOG_SLOW_QUERY_LOG with the request, template node and code that ran them,
+# and SELECTs taking BLOG_SLOW_QUERY_EXPLAIN_MS or longer with their plan.
+# Summarize the log with `python manage.py slow_queries`.
+BLOG_SLOW_QUERIES = os.getenv('BLOG_SLOW_QUERIES', 'False') == 'True'
+BLOG_SLOW_QUERY_MS = float(os.getenv('BLOG_SLOW_QUERY_MS', 100))
+BLOG_SLOW_QUERY_EXPLAIN_MS = float(os.getenv('BLOG_SLOW_QUERY_EXPLAIN_MS', 500))
+BLOG_SLOW_QUERY_LOG = os.getenv('BLOG_SLOW_QUERY_LOG', BASE_DIR / 'slow_queries.jsonl')
+# How many query shapes each process remembers having explained.
+BLOG_SLOW_QUERY_EXPLAIN_SHAPES = int(os.getenv('BLOG_SLOW_QUERY_EXPLAIN_SHAPES', 1000))
+# Statement parameters hold session keys, session data and email addresses:
+# only their types are logged unless this is switched on.
+BLOG_SLOW_QUERY_PARAMS = os.getenv('BLOG_SLOW_QUERY_PARAMS', 'False') == 'True'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
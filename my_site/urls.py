@@ -19,7 +19,15 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from blog.media import serve_media
+from blog.metrics import metrics_view
+from blog.profiler import profile_download, profile_list
+
 urlpatterns = [
+    path('admin/profiles/', admin.site.admin_view(profile_list), name='profile_list'),
+    path('admin/profiles/<str:capture_id>.folded', admin.site.admin_view(profile_download), name='profile_download'),
     path('admin/', admin.site.urls),
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", serve_media, name='media'),
+    path('metrics', metrics_view, name='metrics'),
     path('', include('blog.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)